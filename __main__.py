@@ -1,37 +1,94 @@
 import os
-from fastapi import FastAPI, APIRouter, HTTPException, status, Depends
+import asyncio
+from contextlib import asynccontextmanager
+from fastapi import FastAPI, HTTPException, status, Depends
 from dotenv import load_dotenv
-from typing import Annotated, Optional
+from typing import Annotated
 
 load_dotenv()
 
-from users_service.users import Users
-from news_service.news import News
+if not os.path.exists("data"):
+    os.mkdir("data")
 
-from models.models import *
-from security.api_key import AdminSecurity
-from security.admin import Admin
+from utils.profiler import startup, FirstRequestMiddleware
+from utils.compression import CompressionMiddleware
+from utils.singleflight import SingleFlight
 
-from configs.routers import config as CONFIG
+with startup.phase("imports"):
+    from users_service.users import Users
+    from news_service.news import News
 
-if not os.path.exists("data"):
-    os.mkdir("data")
+    from models.models import *
+    from security.api_key import AdminSecurity
+    from security.admin import Admin
+    from security.scoped_keys import ApiKeys
+    from security.auth import authorizer, require_admin, Principal
+    from logger.darky_logger import DarkyLogger
+    from audit_service.audit import Audit
+    from backup_service.backup import Backups
+    from system_service.system import System, DrainMiddleware, DrainingServer
+    from security.hashing import hasher
+    from storage.engine import create_storage
+    from storage.maintenance import Maintenance
+
+    from configs.routers import config as CONFIG
+    from configs.logger import config as LOGGER_CONFIG
+
+with startup.phase("storage"):
+    storage = create_storage()
+    maintenance = Maintenance(storage,
+                              DarkyLogger("darky.maintenance", configuration=LOGGER_CONFIG.LOGGER),
+                              interval=float(os.getenv("MAINTENANCE_INTERVAL", 6)) * 60 * 60,
+                              idle=float(os.getenv("MAINTENANCE_IDLE", 30)),
+                              budget=float(os.getenv("MAINTENANCE_TIME_BUDGET", 5)),
+                              vacuum_pages=int(os.getenv("MAINTENANCE_VACUUM_PAGES", 256)))
+
+@asynccontextmanager
+async def lifespan(api: FastAPI):
+    maintenance.start()
+    yield
+    # the routers are stopped by now: the requests are drained, the audit and API key usage buffers are written
+    await maintenance.stop()
+    await storage.checkpoint()
+    await storage.close()
+    await asyncio.to_thread(DarkyLogger.flush)
 
 app = FastAPI(
     title=os.getenv("API_NAME", "DARKY User & News Service"),
     description="Custom User and News API",
-    version=os.getenv("API_VERSION", "0.0.1")
+    version=os.getenv("API_VERSION", "0.0.1"),
+    lifespan=lifespan
 )
+app.add_middleware(CompressionMiddleware, minimum_size=int(os.getenv("COMPRESSION_MIN_SIZE", 1024)))
+app.add_middleware(FirstRequestMiddleware, profiler=startup)
 
-admin = Admin()
-users = Users(admin)
-news = News(admin)
+with startup.phase("services"):
+    audit = Audit(storage)
+    admin = Admin(storage, audit)
+    api_keys = ApiKeys(storage, audit)
+    users = Users(admin, storage, audit)
+    news = News(admin, storage, audit)
+    backups = Backups(storage, audit)
+    authorizer.configure(admin.keys, api_keys)
+    system = System(storage, hasher,
+                    writers={"audit": audit.writer},
+                    caches={"users": users.cache, "users_status": users.status_cache},
+                    streams={"news": news.hub})
+
+app.add_middleware(DrainMiddleware, system=system)
 
 security = AdminSecurity(os.getenv("JWT_SECRET_KEY"))
 
-app.include_router(users.router)
-app.include_router(news.router)
-app.include_router(admin.router)
+with startup.phase("routers"):
+    # included first, so the buffered entries are written after the other services stop
+    app.include_router(audit.router)
+    app.include_router(users.router)
+    app.include_router(news.router)
+    app.include_router(admin.router)
+    app.include_router(api_keys.router)
+    app.include_router(backups.router)
+    # included last, so the requests are drained before the other services stop
+    app.include_router(system.router)
 
 @app.get(path=CONFIG.PING.route, 
          tags=CONFIG.PING.tags, 
@@ -57,8 +114,74 @@ async def whoami(current_user: Annotated[str, Depends(security.get_user)]):
         "IsValid": keyValid
     }
 
+@app.get(path=CONFIG.COALESCING.route,
+         tags=CONFIG.COALESCING.tags,
+         name=CONFIG.COALESCING.name,
+         description=CONFIG.COALESCING.description)
+async def coalescing(principal: Annotated[Principal, Depends(require_admin)]):
+    return SingleFlight.all_stats()
+
+@app.get(path=CONFIG.AUTH_METRICS.route,
+         tags=CONFIG.AUTH_METRICS.tags,
+         name=CONFIG.AUTH_METRICS.name,
+         description=CONFIG.AUTH_METRICS.description)
+async def auth_metrics(principal: Annotated[Principal, Depends(require_admin)]):
+    return authorizer.stats()
+
+@app.get(path=CONFIG.MAINTENANCE.route,
+         tags=CONFIG.MAINTENANCE.tags,
+         name=CONFIG.MAINTENANCE.name,
+         description=CONFIG.MAINTENANCE.description)
+async def maintenance_stats(principal: Annotated[Principal, Depends(require_admin)]):
+    return maintenance.stats()
+
+@app.get(path=CONFIG.STARTUP.route,
+         tags=CONFIG.STARTUP.tags,
+         name=CONFIG.STARTUP.name,
+         description=CONFIG.STARTUP.description)
+async def startup_stats(principal: Annotated[Principal, Depends(require_admin)]):
+    return startup.profile()
+
+@app.get(path=CONFIG.LOG_LEVELS.route,
+         tags=CONFIG.LOG_LEVELS.tags,
+         name=CONFIG.LOG_LEVELS.name,
+         description=CONFIG.LOG_LEVELS.description,
+         response_model=LogLevelsResponse)
+async def log_levels(principal: Annotated[Principal, Depends(require_admin)]):
+    return {
+        "Levels": DarkyLogger.levels(),
+        "Message": "Текущие уровни логгеров"
+    }
+
+@app.post(path=CONFIG.SET_LOG_LEVEL.route,
+          tags=CONFIG.SET_LOG_LEVEL.tags,
+          name=CONFIG.SET_LOG_LEVEL.name,
+          description=CONFIG.SET_LOG_LEVEL.description,
+          response_model=LogLevelsResponse)
+async def set_log_level(data: LogLevelRequest, principal: Annotated[Principal, Depends(require_admin)]):
+    if data.Logger not in DarkyLogger.levels():
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail={"Message": f"Логгер {data.Logger} не найден"}
+        )
+    try:
+        DarkyLogger.set_level(data.Logger, data.Level)
+    except ValueError:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail={"Message": f"Неизвестный уровень {data.Level}"}
+        )
+    audit.record(principal, "logging.set_level", data.Logger, after={"level": data.Level.upper()})
+    return {
+        "Levels": DarkyLogger.levels(),
+        "Message": f"Уровень логгера {data.Logger} изменен на {data.Level.upper()}"
+    }
+
 if __name__ == "__main__":
     import uvicorn
     host = os.getenv("HOST", "127.0.0.1")
     port = int(os.getenv("PORT", 8000))
-    uvicorn.run(app, host=host, port=port)
\ No newline at end of file
+    # uvicorn waits for the open requests first, the rest is drained by the System service
+    server = DrainingServer(uvicorn.Config(app, host=host, port=port,
+                                           timeout_graceful_shutdown=int(system.timeout)), system)
+    server.run()
\ No newline at end of file
@@ -0,0 +1,153 @@
+import json
+import os
+from datetime import datetime
+from typing import Annotated, Optional
+
+import dotenv
+from fastapi import APIRouter, HTTPException, status, Depends, Query
+
+from models.models import *
+from logger.darky_logger import DarkyLogger
+from configs.logger import config
+from security.auth import Principal, require_admin
+from storage.base import Storage
+from utils.batch_writer import BatchWriter
+from utils.responses import FastJSONResponse, dumps
+from utils.timestamps import now_ms, to_epoch_ms, format_iso, parse_offset
+
+dotenv.load_dotenv()
+
+class Audit:
+
+    '''
+    Structured trail of the admin actions.
+
+    ``record`` never touches the database, the entries are written by
+    a ``BatchWriter`` in batched transactions
+    '''
+
+    def __init__(self,
+                 storage: Storage):
+        self.logger = DarkyLogger("darky.audit", configuration=config.LOGGER)
+
+        self.logger.info(f"Initializing Audit service...")
+
+        self.storage = storage
+        self.init_database()
+        self.writer = BatchWriter(
+            storage,
+            "INSERT INTO audit_log (created_at, actor_type, actor, action, target, before, after) VALUES (?, ?, ?, ?, ?, ?, ?)",
+            self.logger,
+            batch_size=int(os.getenv("AUDIT_BATCH_SIZE", 100)),
+            interval=float(os.getenv("AUDIT_FLUSH_INTERVAL", 1))
+        )
+        self.tz = parse_offset(os.getenv("NEWS_UTC_OFFSET", "+03:00"))
+
+        self.logger.debug(f"Inititalizing routers...")
+        self.router = APIRouter(
+            prefix="/audit",
+            tags=["Audit"],
+            lifespan=self.lifespan
+        )
+        self.router.add_api_route("/get", self.get_entries, methods=["GET"],
+                                  name="Get audit log",
+                                  description="Getting admin actions filtered by actor, action, target and time, newest first",
+                                  response_model=AuditListResponse,
+                                  response_class=FastJSONResponse)
+        self.logger.debug(f"Successful")
+
+        self.logger.info(f"Audit service is initialized!")
+
+    async def lifespan(self, api: APIRouter):
+        self.writer.start()
+        self.logger.info("Hello")
+        yield
+        await self.writer.stop()
+        self.logger.info("Bye")
+
+    def init_database(self):
+        self.logger.debug(f"Registering database tables...")
+        self.storage.register_tables(['''
+                CREATE TABLE IF NOT EXISTS audit_log (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    created_at INTEGER NOT NULL,
+                    actor_type TEXT NOT NULL,
+                    actor TEXT NOT NULL,
+                    action TEXT NOT NULL,
+                    target TEXT,
+                    before TEXT,
+                    after TEXT
+                )
+            ''',
+            "CREATE INDEX IF NOT EXISTS audit_log_created_at ON audit_log (created_at)",
+            "CREATE INDEX IF NOT EXISTS audit_log_actor ON audit_log (actor, created_at)",
+            "CREATE INDEX IF NOT EXISTS audit_log_action ON audit_log (action, created_at)",
+            "CREATE INDEX IF NOT EXISTS audit_log_target ON audit_log (target, created_at)"])
+        self.logger.debug(f"Successful")
+
+    def record(self,
+               principal: Principal,
+               action: str,
+               target: str | int | None = None,
+               before: dict | None = None,
+               after: dict | None = None) -> None:
+        '''
+        Queues the entry, it's written with the next batch
+        '''
+        self.writer.add((
+            now_ms(),
+            principal.type,
+            principal.login,
+            action,
+            None if target is None else str(target),
+            None if before is None else dumps(before).decode("utf-8"),
+            None if after is None else dumps(after).decode("utf-8")
+        ))
+
+    async def get_entries(self,
+                          principal: Annotated[Principal, Depends(require_admin)],
+                          actor: Optional[str] = None,
+                          action: Optional[str] = None,
+                          target: Optional[str] = None,
+                          since: Optional[datetime] = None,
+                          until: Optional[datetime] = None,
+                          limit: Annotated[int, Query(ge=1, le=500)] = 100):
+        conditions, params = [], []
+        for column, value in (("actor", actor), ("action", action), ("target", target)):
+            if value is not None:
+                conditions.append(f"{column} = ?")
+                params.append(value)
+        if since is not None:
+            conditions.append("created_at >= ?")
+            params.append(to_epoch_ms(since))
+        if until is not None:
+            conditions.append("created_at < ?")
+            params.append(to_epoch_ms(until))
+        where = f"WHERE {' AND '.join(conditions)}" if conditions else ""
+
+        # the fresh entries could still be in the buffer
+        await self.writer.flush()
+        try:
+            rows = await self.storage.fetchall(
+                f"SELECT id, created_at, actor_type, actor, action, target, before, after FROM audit_log {where} "
+                f"ORDER BY created_at DESC, id DESC LIMIT ?", (*params, limit))
+        except Exception as e:
+            self.logger.error(f"Error with getting audit log", exc_info=True)
+            raise HTTPException(
+                status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+                detail={"Message": f"Ошибка при получении журнала аудита: {str(e)}"}
+            )
+
+        return FastJSONResponse({
+            "Entries": [{
+                "Id": row["id"],
+                "Date": format_iso(row["created_at"], self.tz),
+                "ActorType": row["actor_type"],
+                "Actor": row["actor"],
+                "Action": row["action"],
+                "Target": row["target"],
+                "Before": json.loads(row["before"]) if row["before"] else None,
+                "After": json.loads(row["after"]) if row["after"] else None
+            } for row in rows],
+            "Message": f"Найдено {len(rows)} записей"
+        })
@@ -0,0 +1,134 @@
+import asyncio
+import os
+from typing import Annotated
+
+import dotenv
+from fastapi import APIRouter, HTTPException, status, Depends
+
+from models.models import *
+from logger.darky_logger import DarkyLogger
+from configs.logger import config
+from security.auth import Principal, require_admin
+from storage.base import Storage
+from storage.backup import create_backup, list_backups
+from utils.timestamps import parse_offset
+
+dotenv.load_dotenv()
+
+class Backups:
+
+    '''
+    Online backups of the SQLite database, on demand and every ``BACKUP_INTERVAL`` hours.
+    The copying runs on its own thread and connection, see ``storage.backup.create_backup``
+    '''
+
+    def __init__(self,
+                 storage: Storage,
+                 audit):
+        self.logger = DarkyLogger("darky.backup", configuration=config.LOGGER)
+
+        self.logger.info(f"Initializing Backup service...")
+
+        self.storage = storage
+        self.audit = audit
+        self.directory = os.getenv("BACKUP_DIR", "data/backups")
+        self.interval = float(os.getenv("BACKUP_INTERVAL", 24)) * 60 * 60
+        self.keep = int(os.getenv("BACKUP_KEEP", 7))
+        self.chunk_size = int(os.getenv("BACKUP_CHUNK_SIZE", 1024 * 1024))
+        self.step_sleep = float(os.getenv("BACKUP_STEP_SLEEP", 0.01))
+        self.tz = parse_offset(os.getenv("NEWS_UTC_OFFSET", "+03:00"))
+        self.__lock__ = asyncio.Lock()
+        self.__task__: asyncio.Task | None = None
+
+        self.logger.debug(f"Inititalizing routers...")
+        self.router = APIRouter(
+            prefix="/backup",
+            tags=["Backup"],
+            lifespan=self.lifespan
+        )
+        self.router.add_api_route("/create", self.create, methods=["POST"],
+                                  name="Create backup",
+                                  description="Creating the online backup of the database without stopping the service",
+                                  response_model=BackupResponse)
+        self.router.add_api_route("/list", self.get_backups, methods=["GET"],
+                                  name="Get backups",
+                                  description="Getting the existing backups with their checksums",
+                                  response_model=BackupListResponse)
+        self.logger.debug(f"Successful")
+
+        self.logger.info(f"Backup service is initialized!")
+
+    async def lifespan(self, api: APIRouter):
+        if self.storage.dialect == "sqlite" and self.interval > 0:
+            self.__task__ = asyncio.create_task(self.run())
+        self.logger.info("Hello")
+        yield
+        if self.__task__ is not None:
+            self.__task__.cancel()
+            try:
+                await self.__task__
+            except asyncio.CancelledError:
+                pass
+        self.logger.info("Bye")
+
+    async def run(self):
+        while True:
+            await asyncio.sleep(self.interval)
+            try:
+                await self.backup()
+            except Exception:
+                self.logger.error(f"Error while creating the scheduled backup", exc_info=True)
+
+    async def backup(self) -> dict:
+        async with self.__lock__:
+            self.logger.info(f"Creating backup of {self.storage.path}...")
+            info = await asyncio.to_thread(create_backup, self.storage.path, self.directory,
+                                           self.chunk_size, self.step_sleep, self.keep)
+            self.logger.info(f"Backup {info['file']} is created: {info['size']} bytes in {info['elapsed']:.2f} s, {info['steps']} chunks compressed")
+            return info
+
+    def present(self, info: dict) -> dict:
+        return {
+            "File": info["file"],
+            "Size": info["size"],
+            "Sha256": info["sha256"],
+            "Date": info["created_at"].astimezone(self.tz).isoformat() if info["created_at"] else None
+        }
+
+    def check_backend(self):
+        if self.storage.dialect != "sqlite":
+            self.logger.error(f"Backups are supported only for SQLite")
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail={"Message": "Резервное копирование поддерживается только для SQLite. Для PostgreSQL используйте pg_dump"}
+            )
+
+    async def create(self, principal: Annotated[Principal, Depends(require_admin)]):
+        self.check_backend()
+        if self.__lock__.locked():
+            self.logger.error(f"Backup is already running")
+            raise HTTPException(
+                status_code=status.HTTP_409_CONFLICT,
+                detail={"Message": "Резервная копия уже создается"}
+            )
+        try:
+            info = await self.backup()
+        except Exception as e:
+            self.logger.error(f"Error while creating backup", exc_info=True)
+            raise HTTPException(
+                status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+                detail={"Message": f"Ошибка при создании резервной копии: {str(e)}"}
+            )
+        self.audit.record(principal, "backup.create", info["file"], after={"size": info["size"], "sha256": info["sha256"]})
+        return {
+            "Backup": self.present(info),
+            "Message": "Резервная копия создана"
+        }
+
+    async def get_backups(self, principal: Annotated[Principal, Depends(require_admin)]):
+        self.check_backend()
+        backups = await asyncio.to_thread(list_backups, self.directory)
+        return {
+            "Backups": [self.present(info) for info in backups],
+            "Message": f"Найдено {len(backups)} резервных копий"
+        }
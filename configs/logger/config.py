@@ -1,4 +1,11 @@
-from logger.formatters import DarkyConsoleFormatter, DarkyFileFormatter
+import os
+
+from logger.formatters import DarkyConsoleFormatter, DarkyFileFormatter, DarkyJsonFormatter
+from logger.filters import SamplingFilter
+
+# "json" writes data/darky.log as one JSON object per line
+LOG_FORMAT = os.getenv("LOG_FORMAT", "text")
+LOG_LEVEL = os.getenv("LOG_LEVEL", "DEBUG").upper()
 
 LOGGER = {
     "version": 1,
@@ -12,15 +19,30 @@ LOGGER = {
             "()": DarkyConsoleFormatter,
             "fmt": "%(name)s | %(asctime)s | %(levelname)s | %(message)s",
             "colored": True
+        },
+        "json": {
+            "()": DarkyJsonFormatter
+        }
+    },
+    "filters": {
+        # request path debug messages
+        "sampling": {
+            "()": SamplingFilter,
+            "max_level": "DEBUG",
+            "sample_rate": float(os.getenv("LOG_DEBUG_SAMPLE_RATE", 1)),
+            "per_second": float(os.getenv("LOG_DEBUG_PER_SECOND", 0))
         }
     },
     "handlers": {
         "file": {
             "level": "DEBUG",
-            "class": "logging.handlers.RotatingFileHandler",
-            "formatter": "file",
+            "class": "logger.handlers.DarkyRotatingFileHandler",
+            "formatter": "json" if LOG_FORMAT == "json" else "file",
             "filename": "data/darky.log",
-            "backupCount": 1,
+            # rotated segments are gzipped in background, only backupCount newest are kept
+            "maxBytes": int(os.getenv("LOG_MAX_BYTES", 10 * 1024 * 1024)),
+            "interval": float(os.getenv("LOG_ROTATE_INTERVAL", 24 * 60 * 60)),
+            "backupCount": int(os.getenv("LOG_BACKUP_COUNT", 14)),
             "encoding": "utf-8"
         },
         "console": {
@@ -30,20 +52,22 @@ LOGGER = {
         }
     },
     "loggers": {
-        "darky.users": {
+        # the only logger with handlers, "darky.*" loggers propagate to it,
+        # so a new service logger needs no entry here
+        "darky": {
             "handlers": ["console", "file"],
-            "level": "DEBUG",
+            "level": LOG_LEVEL,
             "propagate": False
         },
+        # request path loggers
+        "darky.users": {
+            "filters": ["sampling"]
+        },
         "darky.news": {
-            "handlers": ["console", "file"],
-            "level": "DEBUG",
-            "propagate": False
+            "filters": ["sampling"]
         },
         "darky.admins": {
-            "handlers": ["console", "file"],
-            "level": "DEBUG",
-            "propagate": False
+            "filters": ["sampling"]
         }
     }
-}
\ No newline at end of file
+}
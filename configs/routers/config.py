@@ -10,6 +10,52 @@ class WHOAMI:
     tags=["System"]
     route="/whoami"
 
+class COALESCING:
+    name="Статистика объединения запросов"
+    description="Показывает сколько одинаковых конкурентных чтений было объединено в одно (single-flight)"
+    tags=["System"]
+    route="/stats/coalescing"
+
+class AUTH_METRICS:
+    name="Статистика авторизации"
+    description="Показывает сколько проверок авторизации было выполнено, их среднее и максимальное время и состояние кэша ключей администраторов"
+    tags=["System"]
+    route="/stats/auth"
+
+class MAINTENANCE:
+    name="Обслуживание базы данных"
+    description="Показывает результаты последнего обслуживания SQLite (PRAGMA optimize, incremental vacuum, WAL checkpoint)"
+    tags=["System"]
+    route="/stats/maintenance"
+
+class STARTUP:
+    name="Профиль запуска"
+    description="Показывает длительность этапов запуска и время до первого обработанного запроса"
+    tags=["System"]
+    route="/stats/startup"
+
+class HEALTH_LIVE:
+    name="Проверка жизни"
+    description="Отвечает пока процесс API работает, даже во время остановки. Используется для перезапуска зависшего контейнера"
+    route="/live"
+
+class HEALTH_READY:
+    name="Проверка готовности"
+    description="Проверяет задержку базы данных, очереди записи и хеширования паролей. Отвечает 503 когда экземпляр перегружен (degraded) или останавливается (draining) и не должен получать новые запросы от балансировщика"
+    route="/ready"
+
+class LOG_LEVELS:
+    name="Уровни логгеров"
+    description="Показывает текущие уровни логгеров сервиса"
+    tags=["System"]
+    route="/logging/levels"
+
+class SET_LOG_LEVEL:
+    name="Изменить уровень логгера"
+    description="Меняет уровень логгера (DEBUG, INFO, WARNING, ERROR, CRITICAL) без перезапуска сервиса"
+    tags=["System"]
+    route="/logging/level"
+
 class SIGNUP_ADMIN:
     name="Добавить администратора"
     description="Добавляет новый администратоский аккаунт с собственным JWT ключем"
@@ -18,4 +64,19 @@ class SIGNUP_ADMIN:
 class GET_JWT:
     name="Получить JWT"
     description="Выдает JWT указанного аккаунта для авторизации в API и получения доступа к некоторым функциям"
-    route="/getJwt"
\ No newline at end of file
+    route="/getJwt"
+
+class CREATE_API_KEY:
+    name="Создать API ключ"
+    description="Выдает API ключ для игрового сервера или панели с указанными правами (users:read, news:write). Ключ показывается только один раз"
+    route="/create"
+
+class GET_API_KEYS:
+    name="Список API ключей"
+    description="Показывает все выданные API ключи, их права и статистику использования"
+    route="/getAll"
+
+class REVOKE_API_KEY:
+    name="Отозвать API ключ"
+    description="Отзывает API ключ, после чего он перестает приниматься API"
+    route="/revoke"
@@ -2,8 +2,11 @@ import logging.config, logging
 from collections.abc import Mapping
 
 from .darky_visual import Visual
+from .handlers import compressor
 
 class DarkyLogger:
+    configured = []
+    registry: dict[str, logging.Logger] = {}
     config = {
         "version": 1,
         "disable_existing_loggers": False,
@@ -38,7 +41,10 @@ class DarkyLogger:
         :type logger_name: str 
         
         :param configuration: позволяет гибко настроить конфигурацию логгера
-        (см. https://docs.python.org/3/library/logging.config.html#configuration-dictionary-schema)
+        (см. https://docs.python.org/3/library/logging.config.html#configuration-dictionary-schema).
+        Одна и та же конфигурация применяется только один раз, последующие логгеры её переиспользуют.
+        Обработчики достаточно описать у родительского логгера (например ``darky``),
+        дочерние ``darky.*`` логгеры используют их через propagate
         :type configuration: dict
 
         Не смотря на то что некоторые методы не отображаются, класс поддерживает следующие методы логгирования:
@@ -48,7 +54,10 @@ class DarkyLogger:
         - error()
         - critical()
 
-        Работающих по аналогии со стандартным logging
+        Работающих по аналогии со стандартным logging.
+        Аргументы сообщения форматируются лениво, только если уровень включен::
+
+            >>> test_logger.debug("Selecting %s...", login)
 
         Пример::
 
@@ -79,41 +88,50 @@ class DarkyLogger:
         if ansi:
             Visual.ansi()
 
-        logging.config.dictConfig(configuration)
-        self.__logger__ = logging.getLogger(logger_name)
+        if not any(applied is configuration for applied in DarkyLogger.configured):
+            logging.config.dictConfig(configuration)
+            DarkyLogger.configured.append(configuration)
+        self.__logger__ = DarkyLogger.registry.get(logger_name)
+        if self.__logger__ is None:
+            self.__logger__ = DarkyLogger.registry[logger_name] = logging.getLogger(logger_name)
         if not silent:
             self.__logger__.debug(f"DarkyLogger initiated")
     
     def debug(self,
               msg:str,
+              *args,
               exc_info:bool=False,
               stack_info:bool=False,
               extra: Mapping[str, object] | None = None):
-        self.__logger__.debug(msg, exc_info=exc_info, stack_info=stack_info, extra=extra)
+        self.__logger__.debug(msg, *args, exc_info=exc_info, stack_info=stack_info, extra=extra)
     def info(self,
               msg:str,
+              *args,
               exc_info:bool=False,
               stack_info:bool=False,
               extra: Mapping[str, object] | None = None):
-        self.__logger__.info(msg, exc_info=exc_info, stack_info=stack_info, extra=extra)
+        self.__logger__.info(msg, *args, exc_info=exc_info, stack_info=stack_info, extra=extra)
     def warning(self,
               msg:str,
+              *args,
               exc_info:bool=False,
               stack_info:bool=False,
               extra: Mapping[str, object] | None = None):
-        self.__logger__.warning(msg, exc_info=exc_info, stack_info=stack_info, extra=extra)
+        self.__logger__.warning(msg, *args, exc_info=exc_info, stack_info=stack_info, extra=extra)
     def error(self,
               msg:str,
+              *args,
               exc_info:bool=False,
               stack_info:bool=False,
               extra: Mapping[str, object] | None = None):
-        self.__logger__.error(msg, exc_info=exc_info, stack_info=stack_info, extra=extra)
+        self.__logger__.error(msg, *args, exc_info=exc_info, stack_info=stack_info, extra=extra)
     def critical(self,
               msg:str,
+              *args,
               exc_info:bool=False,
               stack_info:bool=False,
               extra: Mapping[str, object] | None = None):
-        self.__logger__.critical(msg, exc_info=exc_info, stack_info=stack_info, extra=extra)
+        self.__logger__.critical(msg, *args, exc_info=exc_info, stack_info=stack_info, extra=extra)
     
     def __getattr__(self, name):
 
@@ -123,6 +141,45 @@ class DarkyLogger:
         attr = getattr(self.__logger__, name)
         return attr
     
+    @staticmethod
+    def levels(prefix: str = "darky") -> dict[str, str]:
+
+        '''
+        Возвращает текущие уровни логгеров, имя которых начинается с ``prefix``
+        '''
+
+        return {name: logging.getLevelName(logger.getEffectiveLevel())
+                for name, logger in sorted(logging.Logger.manager.loggerDict.items())
+                if isinstance(logger, logging.Logger) and name.startswith(prefix)}
+
+    @staticmethod
+    def set_level(logger_name: str, level: str) -> None:
+
+        '''
+        Меняет уровень логгера во время работы, без перезапуска.
+        ``ValueError`` если такого уровня не существует
+        '''
+
+        level = level.upper()
+        if not isinstance(logging.getLevelName(level), int):
+            raise ValueError(f"Unknown logging level: {level}")
+        logging.getLogger(logger_name).setLevel(level)
+
+    @staticmethod
+    def flush(timeout: float = 5.0) -> bool:
+
+        '''
+        Сбрасывает буферы обработчиков ``darky`` логгеров и ждет сжатия ротированных логов
+        не дольше ``timeout`` секунд. ``False`` если сжатие не успело закончиться
+        '''
+
+        for logger in DarkyLogger.registry.values():
+            while logger is not None:
+                for handler in logger.handlers:
+                    handler.flush()
+                logger = logger.parent if logger.propagate else None
+        return compressor.join(timeout)
+
     def get_logger(self) -> logging.Logger:
 
         '''
@@ -1,18 +1,19 @@
 import os
 import logging
+from functools import lru_cache
 
 logger = logging.getLogger(__name__)
 logger.setLevel("DEBUG")
 
 class VisualMeta(type):
 
-    '''Automatic attribute formatting'''
+    '''Automatic attribute formatting, the codes are rendered once at class creation'''
 
-    def __getattribute__(cls, name):
-        attr = super().__getattribute__(name)
-        if name != 'prefix' and isinstance(attr, str) and attr.isdigit():
-            return f"{cls.prefix}{attr}m"
-        return attr
+    def __init__(cls, name, bases, namespace):
+        super().__init__(name, bases, namespace)
+        for key, value in namespace.items():
+            if key != 'prefix' and isinstance(value, str) and value.isdigit():
+                type.__setattr__(cls, key, f"{cls.prefix}{value}m")
 
     def __getattr__(cls, name):
         logger.warning(f"Attribute '{name}' not found in '{cls.__name__}'")
@@ -32,6 +33,7 @@ class Visual(metaclass=VisualMeta):
                 logger.info(f"ANSI support initiated!")
 
     @staticmethod
+    @lru_cache(maxsize=256)
     def hex_to_rgb(hex:str) -> tuple[int, int, int]:
         '''
         Converts HEX code to RGB
@@ -64,6 +66,7 @@ class STYLE(Visual):
     CROSS = "9"
 
     @staticmethod
+    @lru_cache(maxsize=256)
     def CUSTOM_COLOR(color:str="#FFFFFF", mode:str="FG") -> str:
         r, g, b = Visual.hex_to_rgb(color)
         return f"{Visual.prefix}{mode.replace("FG", "3").replace("BG", "4")}8;2;{r};{g};{b}m"
@@ -90,39 +93,47 @@ class STYLE(Visual):
             return text
 
         if len(colors) == 1:
-            return f"{STYLE.CUSTOM_COLOR(mode, colors[0])}{text}{STYLE.RESET}"
+            return f"{STYLE.CUSTOM_COLOR(colors[0], mode)}{text}{STYLE.RESET}"
         
         #handling multilined text(ansii art support)
-        if "\n" in text or isinstance(text, list):
-            if not isinstance(text, list):
-                lines = text.split('\n')
-            else:
-                lines = text.copy()
-            for line in range(len(lines)):
-                lines[line] = STYLE.GRADIENT(lines[line], colors, mode)
-            return f"{'\n'.join(lines)}{STYLE.RESET}"
+        if isinstance(text, list) or "\n" in text:
+            lines = text if isinstance(text, list) else text.split('\n')
+            return f"{'\n'.join(STYLE.GRADIENT(line, colors, mode) for line in lines)}{STYLE.RESET}"
+
+        return STYLE.__render_gradient__(text, tuple(colors), mode)
+
+    @staticmethod
+    @lru_cache(maxsize=512)
+    def __render_gradient__(text:str, colors:tuple[str, ...], mode:str) -> str:
+
+        '''
+        Renders the single line gradient, cached by (text, colors, mode)
+        '''
 
         rgb = [Visual.hex_to_rgb(color) for color in colors]
+        channel = f"{Visual.prefix}{mode.replace('FG', '3').replace('BG', '4')}8;2;"
 
         segment = len(text) // (len(colors)-1) #HelloWorld (RED to BLUE) segment = 10 // (2-1) 10
 
-        result = ""
+        parts = []
         for i in range(len(colors) - 1): #grabs the pair of colors even if there as more of them
 
             start_r, start_g, start_b = rgb[i]
             end_r, end_g, end_b = rgb[i+1]
 
             for step in range(segment):
-                if i * segment + step >= len(text):
-                    break
-                char = text[i * segment + step]
                 r = int(start_r + (end_r - start_r) * (step / segment))
                 g = int(start_g + (end_g - start_g) * (step / segment))
                 b = int(start_b + (end_b - start_b) * (step / segment))
-                color_code = f"{Visual.prefix}{mode.replace('FG', '3').replace('BG', '4')}8;2;{r};{g};{b}m"
-                result += f"{color_code}{char}"
+                parts.append(f"{channel}{r};{g};{b}m{text[i * segment + step]}")
+
+        #the rest of the text which doesn't fit the segments gets the last color
+        rest = text[segment * (len(colors) - 1):]
+        if rest:
+            r, g, b = rgb[-1]
+            parts.append(f"{channel}{r};{g};{b}m{rest}")
 
-        return f"{result}{STYLE.RESET}"
+        return f"{''.join(parts)}{STYLE.RESET}"
 
 class FG(STYLE):
     BLACK = "30"
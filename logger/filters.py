@@ -0,0 +1,62 @@
+import logging
+import time
+from collections import OrderedDict
+
+
+class SamplingFilter(logging.Filter):
+
+    '''
+    Thins out the chatty records at or below ``max_level``.
+
+    ``sample_rate`` keeps the given share of them (``0.1`` keeps every 10th
+    record of each message), ``per_second`` caps how many records of the same
+    message pass per second. The records above ``max_level`` always pass.
+    Messages are told apart by their template, so lazily formatted records
+    with different arguments share one counter. At most ``max_keys`` counters
+    are kept, the least recently logged messages are forgotten first
+    '''
+
+    def __init__(self,
+                 name: str = "",
+                 max_level: str = "DEBUG",
+                 sample_rate: float = 1.0,
+                 per_second: float = 0,
+                 max_keys: int = 1024):
+        super().__init__(name)
+        self.max_level = logging.getLevelName(max_level.upper())
+        self.every = max(1, round(1 / sample_rate)) if sample_rate > 0 else 0
+        self.per_second = per_second
+        self.max_keys = max_keys
+        self.__seen__: OrderedDict[tuple, int] = OrderedDict()
+        self.__windows__: OrderedDict[tuple, list] = OrderedDict()
+        self.suppressed = 0
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if record.levelno > self.max_level:
+            return True
+        key = (record.name, record.msg)
+
+        if self.every != 1:
+            seen = self.__seen__.get(key, 0)
+            self.remember(self.__seen__, key, seen + 1)
+            if not self.every or seen % self.every:
+                self.suppressed += 1
+                return False
+
+        if self.per_second:
+            now = time.monotonic()
+            window = self.__windows__.get(key)
+            if window is None or now - window[0] >= 1:
+                window = [now, 0]
+            self.remember(self.__windows__, key, window)
+            if window[1] >= self.per_second:
+                self.suppressed += 1
+                return False
+            window[1] += 1
+        return True
+
+    def remember(self, counters: OrderedDict, key: tuple, value) -> None:
+        counters[key] = value
+        counters.move_to_end(key)
+        if len(counters) > self.max_keys:
+            counters.popitem(last=False)
@@ -1,5 +1,7 @@
 import re
+import json
 import logging
+from datetime import datetime, timezone
 from typing import Literal
 from copy import copy
 
@@ -131,5 +133,36 @@ class DarkyFileFormatter(logging.Formatter):
 
         return super().format(record_copy)
 
+class DarkyJsonFormatter(logging.Formatter):
+
+    # attributes every LogRecord has, everything else came through ``extra``
+    reserved = set(vars(logging.LogRecord("", 0, "", 0, "", (), None))) | {"message", "asctime", "color_message"}
+
+    def __init__(self, fmt: str | None = None, datefmt: str | None = None, style: Literal["%", "{", "$"] = "%"):
+        '''
+        Initializes the JSON formatter writing one object per line:
+        ``{"time", "level", "logger", "message", ...extra, "exc_info"}``
+        '''
+        super().__init__(fmt=fmt, datefmt=datefmt, style=style)
+
+    def format(self, record):
+        '''
+        Builds the JSON line, the message is formatted with its arguments only here
+        '''
+        entry = {
+            "time": datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec="milliseconds"),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": re.sub(r'\033\[.*?m', '', record.getMessage())
+        }
+        for key, value in record.__dict__.items():
+            if key not in self.reserved and not key.startswith("_"):
+                entry[key] = value
+        if record.exc_info:
+            entry["exc_info"] = self.formatException(record.exc_info)
+        if record.stack_info:
+            entry["stack_info"] = self.formatStack(record.stack_info)
+        return json.dumps(entry, ensure_ascii=False, default=str)
+
 class UvicornAccessFormatter(DarkyConsoleFormatter, AccessFormatter):
     pass
\ No newline at end of file
@@ -0,0 +1,135 @@
+import os
+import re
+import glob
+import gzip
+import time
+import queue
+import shutil
+import threading
+from logging.handlers import BaseRotatingHandler
+
+
+class Compressor:
+
+    '''
+    Background thread gzipping the rotated log segments,
+    so the thread which writes the log never waits for the compression
+    '''
+
+    def __init__(self):
+        self.__queue__: queue.Queue = queue.Queue()
+        self.__thread__: threading.Thread | None = None
+        self.__lock__ = threading.Lock()
+
+    def submit(self, path: str, on_done) -> None:
+        with self.__lock__:
+            if self.__thread__ is None or not self.__thread__.is_alive():
+                self.__thread__ = threading.Thread(target=self.run, name="darky-log-compressor", daemon=True)
+                self.__thread__.start()
+        self.__queue__.put((path, on_done))
+
+    def run(self) -> None:
+        while True:
+            path, on_done = self.__queue__.get()
+            try:
+                if os.path.exists(path):
+                    with open(path, "rb") as source, gzip.open(f"{path}.gz", "wb") as target:
+                        shutil.copyfileobj(source, target)
+                    os.remove(path)
+                on_done()
+            except Exception:
+                # logging from here could rotate again, the raw segment is just kept
+                pass
+            finally:
+                self.__queue__.task_done()
+
+    def join(self, timeout: float | None = None) -> bool:
+        '''
+        Waits for the queued segments, False if the timeout expired first
+        '''
+        with self.__queue__.all_tasks_done:
+            return self.__queue__.all_tasks_done.wait_for(lambda: not self.__queue__.unfinished_tasks, timeout)
+
+
+compressor = Compressor()
+
+
+class DarkyRotatingFileHandler(BaseRotatingHandler):
+
+    '''
+    File handler rotating the log when it grows above ``maxBytes``
+    or every ``interval`` seconds, whichever comes first.
+
+    Rotated segments are renamed to ``<filename>.<YYYYmmdd-HHMMSS>`` and
+    gzipped by the background compressor, only ``backupCount`` newest
+    archives are kept. ``0`` disables the corresponding policy
+    '''
+
+    def __init__(self,
+                 filename: str,
+                 maxBytes: int = 10 * 1024 * 1024,
+                 interval: float = 24 * 60 * 60,
+                 backupCount: int = 14,
+                 encoding: str | None = "utf-8",
+                 delay: bool = False):
+        super().__init__(filename, "a", encoding=encoding, delay=delay)
+        self.maxBytes = maxBytes
+        self.interval = interval
+        self.backupCount = backupCount
+        started = os.path.getmtime(self.baseFilename) if os.path.exists(self.baseFilename) else time.time()
+        self.rolloverAt = started + interval if interval else None
+
+        # segments left uncompressed by the previous run
+        for segment in self.segments(archived=False):
+            compressor.submit(segment, self.prune)
+
+    def segments(self, archived: bool) -> list[str]:
+        '''
+        Rotated segments from the oldest to the newest
+        '''
+        pattern = re.compile(re.escape(os.path.basename(self.baseFilename)) + r"\.(\d{8}-\d{6})(?:-(\d+))?" + (r"\.gz" if archived else "") + "$")
+        found = []
+        for path in glob.glob(f"{glob.escape(self.baseFilename)}.*"):
+            match = pattern.match(os.path.basename(path))
+            if match:
+                found.append(((match.group(1), int(match.group(2) or 0)), path))
+        return [path for _, path in sorted(found)]
+
+    def shouldRollover(self, record) -> bool:
+        if self.rolloverAt is not None and time.time() >= self.rolloverAt:
+            return True
+        if self.maxBytes:
+            if self.stream is None:
+                self.stream = self._open()
+            return self.stream.tell() >= self.maxBytes
+        return False
+
+    def doRollover(self) -> None:
+        if self.stream:
+            self.stream.close()
+            self.stream = None
+
+        base = f"{self.baseFilename}.{time.strftime('%Y%m%d-%H%M%S')}"
+        segment, suffix = base, 0
+        while os.path.exists(segment) or os.path.exists(f"{segment}.gz"):
+            suffix += 1
+            segment = f"{base}-{suffix}"
+
+        if os.path.exists(self.baseFilename) and os.path.getsize(self.baseFilename):
+            os.rename(self.baseFilename, segment)
+            compressor.submit(segment, self.prune)
+
+        if self.interval:
+            self.rolloverAt = time.time() + self.interval
+        if not self.delay:
+            self.stream = self._open()
+
+    def prune(self) -> None:
+        '''
+        Removes the oldest archives above ``backupCount``
+        '''
+        if self.backupCount <= 0:
+            return
+        archives = self.segments(archived=True)
+        for path in archives[:-self.backupCount]:
+            os.remove(path)
@@ -1,5 +1,6 @@
 from pydantic import BaseModel
 from typing import Optional
+from datetime import datetime
 
 
 class JwtRequest(BaseModel):
@@ -37,6 +38,13 @@ class UserAuthRequest(UserRequest):
 class UserDeleteRequest(UserRequest):
     pass
 
+class UsersResolveRequest(BaseModel):
+    Uuids: list[str] = []
+    Logins: list[str] = []
+
+class UsersStatusRequest(UsersResolveRequest):
+    pass
+
 
 class UserResponse(BaseModel):
     Message: str
@@ -61,6 +69,29 @@ class EditUuidResponse(UserResponse):
     NewUuid: str
     Message: str
 
+class UserInfo(BaseModel):
+    Login: str
+    Uuid: str
+    IsBlocked: bool
+    BlockReason: Optional[str] = None
+
+class UserInfoResponse(UserResponse):
+    User: UserInfo
+
+class UsersResolveResponse(UserResponse):
+    Users: list[UserInfo]
+    Missing: list[str]
+
+class UserStatus(BaseModel):
+    Query: str
+    Exists: bool
+    Uuid: Optional[str] = None
+    IsBlocked: bool = False
+    BlockReason: Optional[str] = None
+
+class UsersStatusResponse(UserResponse):
+    Statuses: list[UserStatus]
+
 
 
 class NewsEditRequest(BaseModel):
@@ -69,11 +100,15 @@ class NewsEditRequest(BaseModel):
 class NewsAddRequest(NewsEditRequest):
     Title: str
     Content: str
+    PublishAt: Optional[datetime] = None
+    ExpireAt: Optional[datetime] = None
 
 class NewsEditingRequest(NewsEditRequest):
     Id: int
     NewTitle: Optional[str] = None
     NewContent: Optional[str] = None
+    NewPublishAt: Optional[datetime] = None
+    NewExpireAt: Optional[datetime] = None
 
 class NewsDeleteRequest(NewsEditRequest):
     Id: int
@@ -90,6 +125,12 @@ class NewsListResponse(BaseModel):
     success: bool
     data: list[NewsResponse]
 
+class NewsChangesResponse(BaseModel):
+    success: bool
+    version: int
+    changed: list[NewsResponse]
+    deleted: list[int]
+
 class NewsEditResponse(BaseModel):
     id: int
     message: str
@@ -97,3 +138,90 @@ class NewsEditResponse(BaseModel):
 class NewsEditedResponse(NewsEditResponse):
     title: str
     content: str
+
+
+
+class ApiKeyCreateRequest(BaseModel):
+    Name: str
+    Scopes: list[str]
+
+class ApiKeyRevokeRequest(BaseModel):
+    Id: int
+
+
+class ApiKeyCreateResponse(BaseModel):
+    Id: int
+    Name: str
+    Key: str
+    Scopes: list[str]
+    Message: str
+
+class ApiKeyInfo(BaseModel):
+    Id: int
+    Name: str
+    Prefix: str
+    Scopes: list[str]
+    CreatedAt: str
+    RevokedAt: Optional[str] = None
+    LastUsedAt: Optional[str] = None
+    Uses: int
+
+class ApiKeyListResponse(BaseModel):
+    Keys: list[ApiKeyInfo]
+    Message: str
+
+class ApiKeyRevokeResponse(BaseModel):
+    Id: int
+    Message: str
+
+
+
+class AuditEntry(BaseModel):
+    Id: int
+    Date: str
+    ActorType: str
+    Actor: str
+    Action: str
+    Target: Optional[str] = None
+    Before: Optional[dict] = None
+    After: Optional[dict] = None
+
+class AuditListResponse(BaseModel):
+    Entries: list[AuditEntry]
+    Message: str
+
+
+
+class LogLevelRequest(BaseModel):
+    Logger: str
+    Level: str
+
+class LogLevelsResponse(BaseModel):
+    Levels: dict[str, str]
+    Message: str
+
+
+
+class BackupInfo(BaseModel):
+    File: str
+    Size: int
+    Sha256: Optional[str] = None
+    Date: Optional[str] = None
+
+class BackupResponse(BaseModel):
+    Backup: BackupInfo
+    Message: str
+
+class BackupListResponse(BaseModel):
+    Backups: list[BackupInfo]
+    Message: str
+
+
+
+class HealthResponse(BaseModel):
+    Status: str
+    InFlight: int
+    HashPending: int
+    Checks: Optional[dict[str, dict]] = None
+    ProbeMs: Optional[float] = None
+    Age: Optional[float] = None
@@ -0,0 +1,98 @@
+import asyncio
+from collections import deque
+
+from utils.responses import dumps
+
+
+class Subscriber:
+
+    '''
+    Connected client with a bounded buffer of pending events
+    '''
+
+    __slots__ = ("buffer", "wakeup", "evicted")
+
+    def __init__(self, buffer_size: int):
+        self.buffer: deque[bytes] = deque(maxlen=buffer_size)
+        self.wakeup = asyncio.Event()
+        self.evicted = False
+
+    async def next(self, timeout: float) -> bytes | None:
+        '''
+        Returns the next pending event or None if nothing came within the timeout
+        '''
+        if not self.buffer:
+            self.wakeup.clear()
+            try:
+                await asyncio.wait_for(self.wakeup.wait(), timeout)
+            except asyncio.TimeoutError:
+                return None
+        return self.buffer.popleft() if self.buffer else None
+
+
+class NewsHub:
+
+    '''
+    Fan-out hub broadcasting news events to the connected launchers.
+
+    Idle subscribers cost only a small deque and an Event, no task per
+    client is created by the hub. A subscriber whose buffer is already full
+    when a new event arrives is a slow consumer and gets evicted, the client
+    is expected to reconnect and resync through ``/news/changes``
+    '''
+
+    def __init__(self, buffer_size: int = 16):
+        self.buffer_size = buffer_size
+        self.subscribers: set[Subscriber] = set()
+        self.published = 0
+        self.evicted = 0
+        self.closed = False
+
+    def subscribe(self) -> Subscriber:
+        subscriber = Subscriber(self.buffer_size)
+        if self.closed:
+            subscriber.evicted = True
+            return subscriber
+        self.subscribers.add(subscriber)
+        return subscriber
+
+    def unsubscribe(self, subscriber: Subscriber) -> None:
+        self.subscribers.discard(subscriber)
+
+    def publish(self, event: str, data: dict, event_id: int | None = None) -> None:
+        '''
+        Serializes the event once and queues it for every subscriber
+        '''
+        self.published += 1
+        message = b"event: " + event.encode() + b"\ndata: " + dumps(data) + b"\n\n"
+        if event_id is not None:
+            message = f"id: {event_id}\n".encode() + message
+        for subscriber in list(self.subscribers):
+            if len(subscriber.buffer) >= self.buffer_size:
+                self.evict(subscriber)
+                continue
+            subscriber.buffer.append(message)
+            subscriber.wakeup.set()
+
+    def evict(self, subscriber: Subscriber) -> None:
+        self.evicted += 1
+        subscriber.evicted = True
+        subscriber.wakeup.set()
+        self.unsubscribe(subscriber)
+
+    def close(self) -> None:
+        '''
+        Disconnects every subscriber
+        '''
+        self.closed = True
+        for subscriber in list(self.subscribers):
+            subscriber.evicted = True
+            subscriber.wakeup.set()
+        self.subscribers.clear()
+
+    def stats(self) -> dict:
+        return {
+            "subscribers": len(self.subscribers),
+            "published": self.published,
+            "evicted": self.evicted
+        }
@@ -1,44 +1,63 @@
 import os
+import time
 from typing import Annotated
 
-import sqlite3
 import dotenv
-from datetime import datetime
-from fastapi import APIRouter, HTTPException, status, Depends
+from fastapi import APIRouter, HTTPException, status, Depends, Header, Request, Response
+from fastapi.responses import StreamingResponse
 
 from models.models import *
 from logger.darky_logger import DarkyLogger
 from configs.logger import config
-from security.admin import AdminSecurity
+from security.auth import Principal, require_scope
+from storage.base import Storage, Transaction
+from utils.profiler import startup
+from utils.compression import CompressedPayload
+from utils.idempotency import IdempotencyStore, IdempotentCall
+from utils.responses import FastJSONResponse, dumps
+from utils.singleflight import SingleFlight
+from utils.timestamps import now_ms, to_epoch_ms, format_iso, parse_legacy_iso, parse_offset
+from news_service.hub import NewsHub
+from news_service.scheduler import NewsScheduler
 
 dotenv.load_dotenv()
-security = AdminSecurity(os.getenv("JWT_SECRET_KEY"))
+
+# posts visible at the moment passed twice as parameter
+VISIBLE = "publish_at <= ? AND (expire_at IS NULL OR expire_at > ?)"
+# the last action logged for the post, 'delete' if the launchers never saw it
+LAST_ACTION = "COALESCE((SELECT action FROM news_changes WHERE post_id = news.id ORDER BY version DESC LIMIT 1), 'delete')"
 
 class News:
 
     def __init__(self,
-                 admin):
+                 admin,
+                 storage: Storage,
+                 audit):
         self.logger = DarkyLogger("darky.news", configuration=config.LOGGER)
 
         self.logger.info(f"Initializing News service...")
 
-        self.logger.debug(f"Initializing database...")
-        conn = self.__db__()
-        cursor = conn.cursor()
-        cursor.execute('''
-                CREATE TABLE IF NOT EXISTS news (
-                    id INTEGER PRIMARY KEY AUTOINCREMENT,
-                    title TEXT NOT NULL,
-                    content TEXT NOT NULL,
-                    date TEXT UNIQUE NOT NULL,
-                    type TEXT NOT NULL
-                )
-            ''')
-        conn.commit()
-        conn.close()
-        self.logger.debug(f"Successful")
+        self.storage = storage
+        self.audit = audit
+        self.init_database()
+
+        self.__cache__: CompressedPayload | None = None
+        self.__cache_time__ = 0.0
+        self.__cache_version__ = 0
+        self.flight = SingleFlight("news")
+        self.hub = NewsHub(buffer_size=int(os.getenv("NEWS_STREAM_BUFFER", 16)))
+        self.stream_heartbeat = float(os.getenv("NEWS_STREAM_HEARTBEAT", 15))
+        self.scheduler = NewsScheduler(storage, "news", self.next_due, self.publish_due, self.logger)
+        self.cache_ttl = float(os.getenv("NEWS_CACHE_TTL", 0))
+        self.compact_every = int(os.getenv("NEWS_CHANGES_COMPACT_EVERY", 1000))
+        self.tz = parse_offset(os.getenv("NEWS_UTC_OFFSET", "+03:00"))
+        self.compression_min_size = int(os.getenv("COMPRESSION_MIN_SIZE", 1024))
+        self.idempotency = IdempotencyStore(storage, "news", os.getenv("JWT_SECRET_KEY", ""),
+                                            ttl=float(os.getenv("IDEMPOTENCY_TTL", 86400)),
+                                            cache_size=int(os.getenv("IDEMPOTENCY_CACHE_SIZE", 1024)),
+                                            max_rows=int(os.getenv("IDEMPOTENCY_MAX_ROWS", 100000)))
 
-        self.logger.debug(f"Inititalizing routers...")
+        self.logger.debug("Inititalizing routers...")
         self.router = APIRouter(
             prefix="/news",
             tags=["News"],
@@ -55,12 +74,22 @@ class News:
         self.router.add_api_route("/get", self.get_posts, methods=["GET"],
                                   name="Get all news",
                                   description="Getting all news posts",
-                                  response_model=NewsListResponse)
+                                  response_model=NewsListResponse,
+                                  response_class=FastJSONResponse)
         self.router.add_api_route("/edit", self.edit_post, methods=["POST"],
                                   name="Edit the post",
                                   description="Editing the post's content from the News service",
                                   response_model=NewsEditedResponse)
-        self.logger.debug(f"Successful")
+        self.router.add_api_route("/changes", self.get_changes, methods=["GET"],
+                                  name="Get news changes",
+                                  description="Getting posts added, edited or deleted after the given change version",
+                                  response_model=NewsChangesResponse,
+                                  response_class=FastJSONResponse)
+        self.router.add_api_route("/stream", self.stream, methods=["GET"],
+                                  name="News stream",
+                                  description="Server-Sent Events stream of added, edited and deleted posts",
+                                  response_class=StreamingResponse)
+        self.logger.debug("Successful")
 
         self.admin = admin
 
@@ -68,23 +97,119 @@ class News:
     
 
     async def lifespan(self, api: APIRouter):
-        await self.correct_database()
+        with startup.phase("news correction"):
+            await self.migrate_schedule()
+            await self.migrate_timestamps()
+            await self.create_indexes()
+            # seeded first, the correction logs its edits through the version counter
+            await self.seed_changes()
+            await self.correct_database()
+        await self.scheduler.start()
         self.logger.info("Hello")
         yield
+        await self.scheduler.stop()
+        self.hub.close()
         self.logger.info("Bye")
 
 
-    def __db__(self):
-        conn = sqlite3.connect("data/data.db")
-        conn.row_factory = sqlite3.Row
-        return conn
+    def init_database(self):
+        self.logger.debug("Registering database tables...")
+        self.storage.register_tables(['''
+                CREATE TABLE IF NOT EXISTS news (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    title TEXT NOT NULL,
+                    content TEXT NOT NULL,
+                    created_at INTEGER NOT NULL,
+                    type TEXT NOT NULL,
+                    publish_at INTEGER NOT NULL DEFAULT 0,
+                    expire_at INTEGER
+                )
+            ''', '''
+                CREATE TABLE IF NOT EXISTS news_changes (
+                    version INTEGER PRIMARY KEY AUTOINCREMENT,
+                    post_id INTEGER NOT NULL,
+                    action TEXT NOT NULL
+                )
+            ''', '''
+                CREATE TABLE IF NOT EXISTS news_version (
+                    id INTEGER PRIMARY KEY,
+                    version INTEGER NOT NULL
+                )
+            '''])
+        self.logger.debug("Successful")
     
-    @staticmethod
-    async def get_timestamp():
-        current_time = datetime.now()
-        msec = current_time.microsecond // 1000
-        tz="+03:00"
-        return f"{current_time.strftime('%Y-%m-%dT%H:%M:%S')}.{msec}{tz}"
+    async def migrate_schedule(self):
+        '''
+        Adds the publication and expiry columns (UTC epoch ms) to the old tables and indexes them
+        '''
+        columns = await self.storage.columns("news")
+        async with self.storage.transaction() as tx:
+            if "publish_at" not in columns:
+                self.logger.info(f"Adding publish_at column to the news table...")
+                await tx.execute("ALTER TABLE news ADD COLUMN publish_at INTEGER NOT NULL DEFAULT 0")
+            if "expire_at" not in columns:
+                self.logger.info(f"Adding expire_at column to the news table...")
+                await tx.execute("ALTER TABLE news ADD COLUMN expire_at INTEGER")
+
+    async def migrate_timestamps(self):
+        '''
+        Rebuilds the old table with the ``date TEXT UNIQUE`` column into ``created_at``
+        (UTC epoch ms), so posts created in the same millisecond don't collide
+        '''
+        if "date" not in await self.storage.columns("news"):
+            return
+        self.logger.info(f"Converting news dates to epoch milliseconds...")
+        async with self.storage.transaction() as tx:
+            posts = await tx.fetchall("SELECT id, title, content, date, type, publish_at, expire_at FROM news ORDER BY id")
+            # left over by an interrupted conversion, the old table is still intact
+            await tx.execute("DROP TABLE IF EXISTS news_migrated")
+            await tx.execute('''
+                CREATE TABLE news_migrated (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    title TEXT NOT NULL,
+                    content TEXT NOT NULL,
+                    created_at INTEGER NOT NULL,
+                    type TEXT NOT NULL,
+                    publish_at INTEGER NOT NULL DEFAULT 0,
+                    expire_at INTEGER
+                )
+            ''')
+            await tx.executemany(
+                "INSERT INTO news_migrated (id, title, content, created_at, type, publish_at, expire_at) VALUES (?, ?, ?, ?, ?, ?, ?)",
+                [(post["id"], post["title"], post["content"], self.legacy_date(post),
+                  post["type"], post["publish_at"], post["expire_at"]) for post in posts]
+            )
+            await tx.execute("DROP TABLE news")
+            await tx.execute("ALTER TABLE news_migrated RENAME TO news")
+            if self.storage.dialect == "postgres":
+                await tx.execute("SELECT setval(pg_get_serial_sequence('news', 'id'), COALESCE(MAX(id), 1)) FROM news")
+        self.logger.info(f"Converted {len(posts)} posts")
+
+    def legacy_date(self, post: dict) -> int:
+        try:
+            return parse_legacy_iso(post["date"], self.tz)
+        except ValueError:
+            self.logger.warning(f"Post ID:{post['id']} has invalid date {post['date']}. Current time is used instead")
+            return now_ms()
+
+    async def create_indexes(self):
+        async with self.storage.transaction() as tx:
+            await tx.execute("CREATE INDEX IF NOT EXISTS news_created_at ON news (created_at DESC, id DESC)")
+            await tx.execute("CREATE INDEX IF NOT EXISTS news_publish_at ON news (publish_at, expire_at)")
+            await tx.execute("CREATE INDEX IF NOT EXISTS news_expire_at ON news (expire_at)")
+            await tx.execute("CREATE INDEX IF NOT EXISTS news_changes_post_id ON news_changes (post_id, version)")
+
+    def present(self, post: dict) -> dict:
+        '''
+        Converts the row to the API representation with the formatted date
+        '''
+        return {
+            "id": post["id"],
+            "title": post["title"],
+            "content": post["content"],
+            "date": format_iso(post["created_at"], self.tz),
+            "type": post["type"]
+        }
     
     @staticmethod
     async def get_listener():
@@ -95,87 +220,194 @@ class News:
 
         self.logger.info("Correcting database...")
         
-        conn = self.__db__()
-        cursor = conn.cursor()
-        
         try:
-            cursor.execute("SELECT id, date, type FROM news")
-            posts = cursor.fetchall()
-
-            for post in posts:
-                post_id = post["id"]
-                new_date = post["date"].replace("Z", "+03:00")
-                new_type = await self.get_listener()
-                    
-                cursor.execute(
-                    "UPDATE news SET date = ?, type = ? WHERE id = ?",
-                    (new_date, new_type, post_id)
+            new_type = await self.get_listener()
+            async with self.storage.transaction() as tx:
+                corrected = await tx.fetchall(
+                    "UPDATE news SET type = ? WHERE type <> ? RETURNING id",
+                    (new_type, new_type)
                 )
-                self.logger.debug(f"Updated post ID:{post_id} - date: {new_date}, type: {new_type}")
-                
-            conn.commit()
-            self.logger.info("Database correction completed successfully")
+                for post in corrected:
+                    await self.log_change(tx, post["id"], "edit")
+            self.invalidate_cache()
+            self.logger.info(f"Database correction completed successfully. Corrected posts: {len(corrected)}")
             
         except Exception as e:
-            conn.rollback()
             self.logger.error(f"Error during database correction: {str(e)}", exc_info=True)
             raise Exception("Failed to correct database")
-            
-        finally:
-            conn.close()
     
 
-    async def add_post(self, data: NewsAddRequest, authorized: Annotated[str, Depends(security.get_user)]):
-        if authorized["type"] != "admin" or not await self.admin.key_is_valid(authorized["data"]["login"], authorized["data"]["secret_key"]):
-            self.logger.error(f"You're not authorized or not an admin")
+    async def seed_changes(self):
+        '''
+        Creates the version counter and, the first time, logs the visible posts
+        missing in the change log, so launchers syncing from version 0 receive all of them.
+        The scheduled ones are announced by the scheduler when they are published
+        '''
+        async with self.storage.transaction() as tx:
+            # the counter row is the marker, the nodes starting together seed the log only once
+            created = await tx.execute(
+                "INSERT INTO news_version (id, version) SELECT 1, COALESCE(MAX(version), 0) FROM news_changes "
+                "WHERE TRUE ON CONFLICT (id) DO NOTHING"
+            )
+            if not created:
+                return
+            version = (await tx.fetchone("SELECT version FROM news_version WHERE id = 1"))["version"]
+            now = now_ms()
+            seeded = await tx.execute(
+                "INSERT INTO news_changes (version, post_id, action) "
+                f"SELECT ? + ROW_NUMBER() OVER (ORDER BY id), id, 'add' FROM news WHERE {VISIBLE} "
+                "AND NOT EXISTS (SELECT 1 FROM news_changes WHERE news_changes.post_id = news.id)",
+                (version, now, now)
+            )
+            await tx.execute("UPDATE news_version SET version = ? WHERE id = 1", (version + seeded,))
+        if seeded:
+            self.logger.info(f"Change log is seeded with {seeded} posts")
+    
+
+    async def log_change(self, tx: Transaction, post_id: int, action: str) -> int:
+        '''
+        Appends the change of the post to the change log.
+
+        The version comes from the locked counter row, not from the sequence, so the
+        concurrent transactions commit their versions in order and a client never
+        skips a version committed after the one it has already seen
+
+        :returns: version of the change
+        '''
+        change = await tx.fetchone("UPDATE news_version SET version = version + 1 WHERE id = 1 RETURNING version")
+        version = change["version"]
+        await tx.execute("INSERT INTO news_changes (version, post_id, action) VALUES (?, ?, ?)", (version, post_id, action))
+        if self.compact_every and version % self.compact_every == 0:
+            await self.compact_changes(tx)
+        return version
+
+    async def compact_changes(self, tx: Transaction) -> int:
+        '''
+        Removes the changes followed by a newer change of the same post.
+        ``/news/changes`` returns only the last action of every post, so its answers stay the same
+        '''
+        removed = await tx.execute(
+            "DELETE FROM news_changes WHERE version < "
+            "(SELECT MAX(later.version) FROM news_changes AS later WHERE later.post_id = news_changes.post_id)"
+        )
+        if removed:
+            self.logger.info(f"Change log is compacted, {removed} superseded changes removed")
+        return removed
+
+
+    @staticmethod
+    def is_visible(publish_at: int, expire_at: int | None, now: int) -> bool:
+        return publish_at <= now and (expire_at is None or expire_at > now)
+
+    def check_schedule(self, publish_at: int, expire_at: int | None):
+        if expire_at is not None and expire_at <= publish_at:
+            self.logger.error(f"Post expires before it's published!")
             raise HTTPException(
-                status_code=status.HTTP_401_UNAUTHORIZED,
-                detail={"Message": "Вы не авторизованы или не являетесь администратором!"}
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail={"Message": "Время окончания показа поста должно быть позже времени публикации"}
             )
+
+    async def next_due(self, now: int) -> int | None:
+        '''
+        Returns the nearest moment after ``now`` when a post is published or expires
+        '''
+        publish = await self.storage.fetchone("SELECT MIN(publish_at) AS due FROM news WHERE publish_at > ?", (now,))
+        expire = await self.storage.fetchone("SELECT MIN(expire_at) AS due FROM news WHERE expire_at > ?", (now,))
+        moments = [moment for moment in (publish["due"], expire["due"]) if moment is not None]
+        return min(moments) if moments else None
+
+    async def publish_due(self, since: int, now: int):
+        '''
+        Announces the posts published or expired in ``(since, now]``. The posts already
+        announced by the handlers (created visible, edited) or by a replayed pass are skipped
+        '''
+        async with self.storage.transaction() as tx:
+            published = await tx.fetchall(
+                f"SELECT id, title, content, created_at, type FROM news WHERE publish_at > ? AND {VISIBLE} "
+                f"AND {LAST_ACTION} = 'delete' ORDER BY id",
+                (since, now, now)
+            )
+            expired = await tx.fetchall(
+                f"SELECT id FROM news WHERE expire_at > ? AND expire_at <= ? AND {LAST_ACTION} <> 'delete' ORDER BY id",
+                (since, now)
+            )
+            events = [("add", await self.log_change(tx, post["id"], "add"), post) for post in published]
+            events += [("delete", await self.log_change(tx, post["id"], "delete"), post) for post in expired]
+
+        if not events:
+            return
+        self.invalidate_cache()
+        for action, version, post in events:
+            if action == "add":
+                self.hub.publish("add", {"version": version, "post": self.present(post)}, version)
+            else:
+                self.hub.publish("delete", {"version": version, "id": post["id"]}, version)
+        self.logger.info(f"Scheduled posts are announced. Published: {len(published)}, expired: {len(expired)}")
+
+
+    async def add_post(self,
+                       data: NewsAddRequest,
+                       response: Response,
+                       principal: Annotated[Principal, Depends(require_scope("news:write"))],
+                       idempotency_key: Annotated[str | None, Header()] = None):
+        # the keys of different admins and API keys never collide
+        return await self.idempotency.run(f"add:{principal.type}:{principal.login}", idempotency_key, data, response,
+                                          self.create_post, data, principal)
+
+    async def create_post(self, data: NewsAddRequest, principal: Principal, idempotent: IdempotentCall | None):
         if not data.Title or not data.Content:
             self.logger.error(f"Content required!")
             raise HTTPException(
                 status_code=status.HTTP_400_BAD_REQUEST,
                 detail={"Message": "Необходимо указать заголовок и сам контент для нового поста"}
             )
+        now = now_ms()
+        publish_at = to_epoch_ms(data.PublishAt) if data.PublishAt else now
+        expire_at = to_epoch_ms(data.ExpireAt) if data.ExpireAt else None
+        self.check_schedule(publish_at, expire_at)
+        visible = self.is_visible(publish_at, expire_at, now)
         self.logger.info(f"Adding new post {data.Title}...")
         
-        self.logger.debug(f"Accesssing to the database...")
-        conn = self.__db__()
-        cursor = conn.cursor()
-        
-        self.logger.debug(f"Inserting new post to the database...")
+        self.logger.debug("Inserting new post to the database...")
         try:
-            cursor.execute(
-                "INSERT INTO news (title, content, date, type) VALUES (?, ?, ?, ?)",
-                (data.Title, data.Content, await self.get_timestamp(), await self.get_listener())
-            )
-            conn.commit()
-            post_id = cursor.lastrowid
+            post = {
+                "title": data.Title,
+                "content": data.Content,
+                "date": format_iso(now, self.tz),
+                "type": await self.get_listener()
+            }
+            async with self.storage.transaction() as tx:
+                inserted = await tx.fetchone(
+                    "INSERT INTO news (title, content, created_at, type, publish_at, expire_at) VALUES (?, ?, ?, ?, ?, ?) RETURNING id",
+                    (post["title"], post["content"], now, post["type"], publish_at, expire_at)
+                )
+                post_id = inserted["id"]
+                version = await self.log_change(tx, post_id, "add") if visible else None
+                result = {
+                    "id": post_id,
+                    "message": "Пост успешно добавлен"
+                }
+                if idempotent is not None:
+                    await idempotent.save(tx, result)
         except Exception as e:
-            conn.close()
             self.logger.error(f"Error while posting", exc_info=True)
             raise HTTPException(
                 status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
                 detail={"Message": "Ошибка при добавлении поста"}
             )
-        finally:
-            conn.close()
 
+        self.audit.record(principal, "news.add", post_id,
+                          after={"title": data.Title, "content": data.Content, "publish_at": publish_at, "expire_at": expire_at})
+        if visible:
+            self.invalidate_cache()
+            self.hub.publish("add", {"version": version, "post": {"id": post_id, **post}}, version)
+        if not visible or expire_at is not None:
+            self.scheduler.reschedule()
         self.logger.info(f"New post was successfully added with ID: {post_id}")
-        return {
-            "id": post_id,
-            "message": "Пост успешно добавлен"
-        }
+        return result
 
     
-    async def delete_post(self, data: NewsDeleteRequest, authorized: Annotated[str, Depends(security.get_user)]):
-        if authorized["type"] != "admin" or not await self.admin.key_is_valid(authorized["data"]["login"], authorized["data"]["secret_key"]):
-            self.logger.error(f"You're not authorized or not an admin")
-            raise HTTPException(
-                status_code=status.HTTP_401_UNAUTHORIZED,
-                detail={"Message": "Вы не авторизованы или не являетесь администратором!"}
-            )
+    async def delete_post(self, data: NewsDeleteRequest, principal: Annotated[Principal, Depends(require_scope("news:write"))]):
         if not data.Id:
             self.logger.error(f"Post's ID required!")
             raise HTTPException(
@@ -184,35 +416,34 @@ class News:
             )
         self.logger.info(f"Deleting the post ID:{data.Id}...")
 
-        self.logger.debug(f"Accesssing to the database...")
-        conn = self.__db__()
-        cursor = conn.cursor()
-        self.logger.debug(f"Selecting {data.Id} in database...")
-        cursor.execute("SELECT id FROM news WHERE id = ?", (data.Id,))
-        existing_post = cursor.fetchone()
+        self.logger.debug("Selecting %s in database...", data.Id)
+        existing_post = await self.storage.fetchone("SELECT id, title, content, publish_at, expire_at FROM news WHERE id = ?", (data.Id,))
 
         if not existing_post:
-            conn.close()
             self.logger.error(f"Post {data.Id} was not found!")
             raise HTTPException(
                 status_code=status.HTTP_404_NOT_FOUND,
                 detail={"Message": "Пост с указанным идентификатором не был найден"}
             )
         
-        self.logger.debug(f"Deleting {data.Id} from database...")
+        self.logger.debug("Deleting %s from database...", data.Id)
         try:
-            cursor.execute("DELETE FROM news WHERE id = ?", (data.Id,))
-            conn.commit()
+            async with self.storage.transaction() as tx:
+                rowcount = await tx.execute("DELETE FROM news WHERE id = ?", (data.Id,))
+                if rowcount:
+                    version = await self.log_change(tx, data.Id, "delete")
             
-            if cursor.rowcount == 0:
-                conn.close()
+            if rowcount == 0:
                 self.logger.error(f"Error while deleting", exc_info=True)
                 raise HTTPException(
                     status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
                     detail={"Message": "Ошибка при удалении поста"}
                 )
                 
-            conn.close()
+            self.audit.record(principal, "news.delete", data.Id,
+                              before={key: existing_post[key] for key in ("title", "content", "publish_at", "expire_at")})
+            self.invalidate_cache()
+            self.hub.publish("delete", {"version": version, "id": data.Id}, version)
             self.logger.info(f"Post {data.Id} succesfully deleted!")
             return {
                 "id": existing_post["id"],
@@ -220,7 +451,6 @@ class News:
             }
             
         except Exception as e:
-            conn.close()
             self.logger.error(f"Error while deleting", exc_info=True)
             raise HTTPException(
                 status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
@@ -229,28 +459,44 @@ class News:
         
     
 
-    async def get_posts(self):
+    def invalidate_cache(self):
+        self.__cache__ = None
+        self.__cache_version__ += 1
+
+    def cache_is_valid(self) -> bool:
+        if self.__cache__ is None:
+            return False
+        return not self.cache_ttl or time.monotonic() - self.__cache_time__ < self.cache_ttl
+
+    async def build_cache(self, version: int) -> CompressedPayload:
+        cache = CompressedPayload(dumps(await self.read_posts()), minimum_size=self.compression_min_size)
+        # the list could be changed while it was read, such a result is served but not cached
+        if version == self.__cache_version__:
+            self.__cache__ = cache
+            self.__cache_time__ = time.monotonic()
+        return cache
+
+    async def get_posts(self, request: Request):
+        if self.cache_is_valid():
+            self.logger.debug("Serving cached news list...")
+            cache = self.__cache__
+        else:
+            version = self.__cache_version__
+            cache = await self.flight.do(("posts", version), self.build_cache, version)
+        return cache.response(request.headers.get("accept-encoding"))
+
+    async def read_posts(self):
         self.logger.info(f"Getting news list...")
 
-        self.logger.debug(f"Accesssing to the database...")
-        conn = self.__db__()
-        cursor = conn.cursor()
-        self.logger.debug(f"Preparing news list...")
+        self.logger.debug("Preparing news list...")
         try:
-            cursor.execute("SELECT id, title, content, date, type FROM news ORDER BY id")
-            posts = cursor.fetchall()
-            
-            news = [{
-                "id": post["id"],
-                "title": post["title"],
-                "content": post["content"],
-                "date": post["date"],
-                "type": post["type"]
-            } for post in posts]
+            now = now_ms()
+            posts = await self.storage.read_fetchall(
+                f"SELECT id, title, content, created_at, type FROM news WHERE {VISIBLE} ORDER BY created_at DESC, id DESC",
+                (now, now)
+            )
             
-            news.reverse()
-                
-            conn.close()
+            news = [self.present(post) for post in posts]
                 
             self.logger.info(f"News list is ready. Total: {len(news)} posts")
             return {
@@ -259,7 +505,6 @@ class News:
             }
             
         except Exception as e:
-            conn.close()
             self.logger.error(f"Error with getting news list", exc_info=True)
             raise HTTPException(
                 status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
@@ -267,13 +512,72 @@ class News:
             )
 
 
-    async def edit_post(self, data: NewsEditingRequest, authorized: Annotated[str, Depends(security.get_user)]):
-        if authorized["type"] != "admin" or not await self.admin.key_is_valid(authorized["data"]["login"], authorized["data"]["secret_key"]):
-            self.logger.error(f"You're not authorized or not an admin")
+    async def get_changes(self, since: int = 0):
+        self.logger.debug("Getting news changes since version %s...", since)
+        try:
+            latest = await self.storage.fetchone("SELECT MAX(version) AS version FROM news_changes")
+            version = latest["version"] or 0
+
+            # the client is ahead of the log (e.g. the database was recreated), resync it from scratch
+            if since > version:
+                since = 0
+
+            changes = await self.storage.fetchall(
+                "SELECT version, post_id, action FROM news_changes WHERE version > ? ORDER BY version",
+                (since,)
+            )
+            last_actions = {change["post_id"]: change["action"] for change in changes}
+
+            deleted = [post_id for post_id, action in last_actions.items() if action == "delete"]
+            changed_ids = [post_id for post_id, action in last_actions.items() if action != "delete"]
+
+            changed = []
+            if changed_ids:
+                placeholders = ", ".join("?" for _ in changed_ids)
+                now = now_ms()
+                rows = await self.storage.fetchall(
+                    f"SELECT id, title, content, created_at, type FROM news WHERE id IN ({placeholders}) AND {VISIBLE} "
+                    f"ORDER BY created_at DESC, id DESC",
+                    [*changed_ids, now, now]
+                )
+                changed = [self.present(row) for row in rows]
+
+            self.logger.debug("News changes are ready. Changed: %s, deleted: %s", len(changed), len(deleted))
+            return FastJSONResponse({
+                "success": True,
+                "version": version,
+                "changed": changed,
+                "deleted": deleted
+            })
+
+        except Exception as e:
+            self.logger.error(f"Error with getting news changes", exc_info=True)
             raise HTTPException(
-                status_code=status.HTTP_401_UNAUTHORIZED,
-                detail={"Message": "Вы не авторизованы или не являетесь администратором!"}
+                status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+                detail={"Message": f"Ошибка при получении изменений новостей: {str(e)}"}
             )
+
+
+    async def stream(self):
+        subscriber = self.hub.subscribe()
+        self.logger.debug("News stream subscriber connected. Total: %s", len(self.hub.subscribers))
+
+        async def events():
+            try:
+                yield b"retry: 5000\n\n"
+                while not subscriber.evicted:
+                    message = await subscriber.next(self.stream_heartbeat)
+                    if subscriber.evicted:
+                        break
+                    yield message if message is not None else b": ping\n\n"
+            finally:
+                self.hub.unsubscribe(subscriber)
+
+        return StreamingResponse(events(), media_type="text/event-stream",
+                                 headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
+
+    async def edit_post(self, data: NewsEditingRequest, principal: Annotated[Principal, Depends(require_scope("news:write"))]):
         if not data.Id:
             self.logger.error(f"Post's ID and new content are required!")
             raise HTTPException(
@@ -282,22 +586,17 @@ class News:
             )
         self.logger.info(f"Editing the post ID:{data.Id}...")
 
-        self.logger.debug(f"Accesssing to the database...")
-        conn = self.__db__()
-        cursor = conn.cursor()
-        self.logger.debug(f"Selecting {data.Id} in database...")
-        cursor.execute("SELECT title, content FROM news WHERE id = ?", (data.Id,))
-        existing_post = cursor.fetchone()
+        self.logger.debug("Selecting %s in database...", data.Id)
+        existing_post = await self.storage.fetchone("SELECT title, content, created_at, type, publish_at, expire_at FROM news WHERE id = ?", (data.Id,))
 
         if not existing_post:
-            conn.close()
             self.logger.error(f"Post {data.Id} was not found!")
             raise HTTPException(
                 status_code=status.HTTP_404_NOT_FOUND,
                 detail={"Message": "Пост с указанным идентификатором не был найден"}
             )
         
-        self.logger.debug(f"Setting new content for {data.Id}...")
+        self.logger.debug("Setting new content for %s...", data.Id)
         new_title = f"{data.NewTitle}"
         new_content = f"{data.NewContent}"
         
@@ -309,29 +608,54 @@ class News:
             self.logger.warning(f"Content won't be changed")
             new_content = existing_post["content"]
 
-        self.logger.debug(f"Updating content for post {data.Id} in database...")
+        new_publish_at = to_epoch_ms(data.NewPublishAt) if data.NewPublishAt else existing_post["publish_at"]
+        new_expire_at = to_epoch_ms(data.NewExpireAt) if data.NewExpireAt else existing_post["expire_at"]
+        self.check_schedule(new_publish_at, new_expire_at)
+
+        # launchers see an edit of a visible post, the appearance or the disappearance of the post
+        now = now_ms()
+        was_visible = self.is_visible(existing_post["publish_at"], existing_post["expire_at"], now)
+        is_visible = self.is_visible(new_publish_at, new_expire_at, now)
+        action = {(True, True): "edit", (False, True): "add", (True, False): "delete"}.get((was_visible, is_visible))
+
+        self.logger.debug("Updating content for post %s in database...", data.Id)
         try:
-            cursor.execute(
-                "UPDATE news SET title = ?, content = ? WHERE id = ?",
-                (new_title, new_content, data.Id)
-            )
-            conn.commit()
-            if cursor.rowcount == 0:
+            async with self.storage.transaction() as tx:
+                rowcount = await tx.execute(
+                    "UPDATE news SET title = ?, content = ?, publish_at = ?, expire_at = ? WHERE id = ?",
+                    (new_title, new_content, new_publish_at, new_expire_at, data.Id)
+                )
+                if rowcount and action:
+                    version = await self.log_change(tx, data.Id, action)
+            if rowcount == 0:
                 self.logger.error(f"Failed to update content for post {data.Id}")
                 raise HTTPException(
                     status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
                     detail={"Message": "Ошибка при обновлении содержимого поста"}
                 )
         except Exception as e:
-            conn.rollback()
             self.logger.error(f"Error while updating content for post", exc_info=True)
             raise HTTPException(
                 status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
                 detail={"Message": f"Ошибка при обновлении содержимого поста: {str(e)}"}
             )
-        finally:
-            conn.close()
 
+        self.audit.record(principal, "news.edit", data.Id,
+                          before={key: existing_post[key] for key in ("title", "content", "publish_at", "expire_at")},
+                          after={"title": new_title, "content": new_content, "publish_at": new_publish_at, "expire_at": new_expire_at})
+        if action == "delete":
+            self.invalidate_cache()
+            self.hub.publish("delete", {"version": version, "id": data.Id}, version)
+        elif action:
+            self.invalidate_cache()
+            self.hub.publish(action, {"version": version,
+                                      "post": {"id": data.Id,
+                                               "title": new_title,
+                                               "content": new_content,
+                                               "date": format_iso(existing_post["created_at"], self.tz),
+                                               "type": existing_post["type"]}}, version)
+        if data.NewPublishAt or data.NewExpireAt:
+            self.scheduler.reschedule()
         self.logger.info(f"Content for post {data.Id} successfully updated!")
         return {
             "id": data.Id,
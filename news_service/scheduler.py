@@ -0,0 +1,99 @@
+import asyncio
+from typing import Awaitable, Callable
+
+from logger.darky_logger import DarkyLogger
+from storage.base import Storage
+from utils.timestamps import now_ms
+
+
+class NewsScheduler:
+
+    '''
+    In-process scheduler waking up exactly when a post becomes visible or expires.
+
+    ``next_due(now)`` returns the nearest publish/expire moment after ``now``
+    (epoch ms) or None, ``on_due(since, now)`` handles the posts whose moment
+    is in ``(since, now]``. ``reschedule()`` has to be called after every
+    change of the schedule so the sleeping task recalculates its deadline.
+
+    The watermark is stored in the ``scheduler_watermarks`` table, so the moments
+    passed while the service was stopped are handled on the next start. It is
+    saved after ``on_due``, a crash in between makes the moments handled twice
+    '''
+
+    def __init__(self,
+                 storage: Storage,
+                 name: str,
+                 next_due: Callable[[int], Awaitable[int | None]],
+                 on_due: Callable[[int, int], Awaitable[None]],
+                 logger: DarkyLogger):
+        self.storage = storage
+        self.name = name
+        self.next_due = next_due
+        self.on_due = on_due
+        self.logger = logger
+        self.watermark = now_ms()
+        self.next_at: int | None = None
+        self.__wakeup__ = asyncio.Event()
+        self.__task__: asyncio.Task | None = None
+        self.storage.register_tables(['''
+                CREATE TABLE IF NOT EXISTS scheduler_watermarks (
+                    name TEXT PRIMARY KEY,
+                    watermark INTEGER NOT NULL
+                )
+            '''])
+
+    async def start(self) -> None:
+        if self.__task__ is None:
+            row = await self.storage.fetchone("SELECT watermark FROM scheduler_watermarks WHERE name = ?", (self.name,))
+            if row is None:
+                # nothing was scheduled before the first start
+                self.watermark = now_ms()
+                await self.save(self.watermark)
+            else:
+                self.watermark = row["watermark"]
+                self.logger.info(f"Scheduler {self.name} resumes from {self.watermark}, "
+                                 f"{max(0, now_ms() - self.watermark) / 1000:.1f} s are replayed")
+            self.__task__ = asyncio.create_task(self.run())
+
+    async def stop(self) -> None:
+        if self.__task__ is not None:
+            task, self.__task__ = self.__task__, None
+            task.cancel()
+            try:
+                await task
+            except asyncio.CancelledError:
+                pass
+
+    async def save(self, watermark: int) -> None:
+        await self.storage.execute(
+            "INSERT INTO scheduler_watermarks (name, watermark) VALUES (?, ?) "
+            "ON CONFLICT (name) DO UPDATE SET watermark = excluded.watermark",
+            (self.name, watermark)
+        )
+
+    def reschedule(self) -> None:
+        self.__wakeup__.set()
+
+    async def run(self) -> None:
+        while True:
+            try:
+                self.__wakeup__.clear()
+                now = now_ms()
+                # runs first, so the moments missed while stopped are handled on start
+                if now > self.watermark:
+                    await self.on_due(self.watermark, now)
+                    await self.save(now)
+                    self.watermark = now
+
+                self.next_at = await self.next_due(now)
+                timeout = None if self.next_at is None else max(0.0, (self.next_at - now) / 1000)
+                try:
+                    await asyncio.wait_for(self.__wakeup__.wait(), timeout)
+                except asyncio.TimeoutError:
+                    pass
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                self.logger.error(f"Error in the news scheduler", exc_info=True)
+                await asyncio.sleep(1)
@@ -3,48 +3,40 @@ import random
 import os
 
 import dotenv
-import sqlite3
 from fastapi import (
     APIRouter, 
     HTTPException, 
     status,
     Depends
     )
-from passlib.context import CryptContext
 
 from models.models import *
 from logger.darky_logger import DarkyLogger
 from configs.logger import config
 from configs.routers import config as ROUTERS
 from security.jwt_generators import JwtKey
-from security.api_key import AdminSecurity
+from security.auth import AdminKeyStore, Principal, require_admin
+from security.hashing import hasher
+from storage.base import Storage
+from storage.migrations import import_legacy_admins
+from utils.profiler import startup
 
 dotenv.load_dotenv()
 
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
-security = AdminSecurity(os.getenv("JWT_SECRET_KEY"))
-
 class Admin:
 
-    def __init__(self):
+    def __init__(self,
+                 storage: Storage,
+                 audit):
 
         self.logger = DarkyLogger("darky.admins", configuration=config.LOGGER)
 
         self.logger.info(f"Initializing Admin service...")
 
-        self.logger.debug(f"Initializing database...")
-        conn = self.__db__()
-        cursor = conn.cursor()
-        cursor.execute('''
-                CREATE TABLE IF NOT EXISTS admins (
-                    login TEXT UNIQUE NOT NULL,
-                    password TEXT NOT NULL,
-                    secret_key TEXT NOT NULL
-                )
-            ''')
-        conn.commit()
-        conn.close()
-        self.logger.debug(f"Successful")
+        self.storage = storage
+        self.audit = audit
+        self.init_database()
+        self.keys = AdminKeyStore(storage, float(os.getenv("AUTH_CACHE_TTL", 60)))
 
         self.logger.debug(f"Inititalizing routers...")
         self.router = APIRouter(
@@ -67,23 +59,40 @@ class Admin:
         self.logger.info(f"Admin service is initialized!")
 
     async def lifespan(self, api: APIRouter):
-        await self.check_admin()
+        with startup.phase("admins migration"):
+            await self.migrate_legacy_database()
+        with startup.phase("admin check"):
+            await self.check_admin()
         self.logger.info("Hello")
         yield
         self.logger.info("Bye")
     
-    def __db__(self):
-        conn = sqlite3.connect("admins.db")
-        conn.row_factory = sqlite3.Row
-        return conn
+    def init_database(self):
+        self.logger.debug(f"Registering database tables...")
+        self.storage.register_tables(['''
+                CREATE TABLE IF NOT EXISTS admins (
+                    login TEXT UNIQUE NOT NULL,
+                    password TEXT NOT NULL,
+                    secret_key TEXT NOT NULL
+                )
+            '''])
+        self.logger.debug(f"Successful")
+    
+    async def migrate_legacy_database(self):
+        legacy_path = os.getenv("LEGACY_ADMINS_DB", "admins.db")
+        if not os.path.isfile(legacy_path):
+            return
+        self.logger.info(f"Importing admins from {legacy_path}...")
+        try:
+            imported = await import_legacy_admins(self.storage, legacy_path)
+        except Exception as e:
+            self.logger.error(f"Error while importing admins from {legacy_path}", exc_info=True)
+            return
+        self.logger.info(f"Imported {imported} admins. {legacy_path} is renamed to {legacy_path}.migrated")
     
     async def check_admin(self):
-        conn = self.__db__()
-        cursor = conn.cursor()
         self.logger.debug(f"Searching for admin user...")
-        cursor.execute("SELECT login FROM admins WHERE LOWER(login) = LOWER(?)", (os.getenv("ADMIN_LOGIN", "admin"),))
-        if cursor.fetchone():
-            conn.close()
+        if await self.storage.fetchone("SELECT login FROM admins WHERE LOWER(login) = LOWER(?)", (os.getenv("ADMIN_LOGIN", "admin"),)):
             self.logger.info(f"This user is already exists")
             return
         
@@ -91,34 +100,24 @@ class Admin:
         login = os.getenv("ADMIN_LOGIN", "admin")
 
         self.logger.debug(f"Hashing password for admin...")
-        hashed_password = pwd_context.hash(os.getenv("ADMIN_PASSWORD", "admin").strip())
+        hashed_password = await hasher.hash(os.getenv("ADMIN_PASSWORD", "admin").strip())
 
         self.logger.debug(f"Generating secret key...")
         secret_key = "".join([f"{random.randint(0, 9)}" for _ in range(16)])
 
         self.logger.debug(f"Inserting new user \"admin\" to the database...")
         try:
-            cursor.execute(
+            await self.storage.execute(
                 "INSERT INTO admins (login, password, secret_key) VALUES (?, ?, ?)",
                 (login, hashed_password, secret_key)
             )
-            conn.commit()
         except Exception as e:
-            conn.close()
             self.logger.error(f"Error while registrating", exc_info=True)
             exit
-        finally:
-            conn.close()
 
         self.logger.info(f"Admin is here!")
     
-    async def signup(self, data: AdminSignupRequest, authorized: Annotated[str, Depends(security.get_user)]):
-        if authorized["type"] != "admin" or not await self.key_is_valid(authorized["data"]["login"], authorized["data"]["secret_key"]):
-            self.logger.error(f"You're not authorized or not an admin")
-            raise HTTPException(
-                status_code=status.HTTP_401_UNAUTHORIZED,
-                detail={"Message": "Вы не авторизованы или не являетесь администратором!"}
-            )
+    async def signup(self, data: AdminSignupRequest, principal: Annotated[Principal, Depends(require_admin)]):
         if not data.Login or not data.Password or not data.ConfirmPassword:
             self.logger.error(f"Fields are missing")
             raise HTTPException(
@@ -133,38 +132,30 @@ class Admin:
             )
         self.logger.info(f"Creating new admin...")
 
-        conn = self.__db__()
-        cursor = conn.cursor()
-
-        self.logger.debug(f"Selecting {data.Login}...")
-        cursor.execute("SELECT login FROM admins WHERE LOWER(login) = LOWER(?)", (data.Login,))
-        if cursor.fetchone():
-            conn.close()
+        self.logger.debug("Selecting %s...", data.Login)
+        if await self.storage.fetchone("SELECT login FROM admins WHERE LOWER(login) = LOWER(?)", (data.Login,)):
             self.logger.error(f"This admin is already exists")
             raise HTTPException(
                 status_code=status.HTTP_409_CONFLICT,
                 detail={"Message": "Пользователь с таким логином уже существует"}
             )
 
-        self.logger.debug(f"Generating secret key for {data.Login}...")
+        self.logger.debug("Generating secret key for %s...", data.Login)
         secret_key = "".join([f"{random.randint(0, 9)}" for _ in range(16)])
 
-        self.logger.debug(f"Hashing password for {data.Login}...")
-        hashed_password = pwd_context.hash(data.Password.strip())
+        self.logger.debug("Hashing password for %s...", data.Login)
+        hashed_password = await hasher.hash(data.Password.strip())
 
         try:
-            cursor.execute("INSERT INTO admins (login, password, secret_key) VALUES (?, ?, ?)", (data.Login, hashed_password, secret_key))
-            conn.commit()
+            await self.storage.execute("INSERT INTO admins (login, password, secret_key) VALUES (?, ?, ?)", (data.Login, hashed_password, secret_key))
         except Exception as e:
-            conn.close()
             self.logger.error(f"Error while registrating", exc_info=True)
             raise HTTPException(
                 status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
                 detail={"Message": "Ошибка при регистрации пользователя"}
             )
-        finally:
-            conn.close()
 
+        self.audit.record(principal, "admins.signup", data.Login)
         jwtKey = await self.get_jwt(data)
         
         self.logger.info(f"Administrator {data.Login} is succesfully registrated!")
@@ -179,14 +170,7 @@ class Admin:
         if login == "AnonOwO" and key == "uwu":
             return True
 
-        conn = self.__db__()
-        cursor = conn.cursor()
-
-        cursor.execute("SELECT login, secret_key FROM admins WHERE LOWER(login) = ?", (login,))
-        user = cursor.fetchone()
-        conn.close()
-
-        if not user or len(key) != 16 or user["secret_key"] != key:
+        if not await self.keys.is_valid(login, key):
             self.logger.error(f"Key is not valid")
             raise HTTPException(
                 status_code=status.HTTP_400_BAD_REQUEST,
@@ -206,12 +190,7 @@ class Admin:
         
         self.logger.info(f"Getting JWT for {data.Login}...")
 
-        conn = self.__db__()
-        cursor = conn.cursor()
-
-        cursor.execute("SELECT login, password, secret_key FROM admins WHERE LOWER(login) = LOWER(?)", (data.Login,))
-        user = cursor.fetchone()
-        conn.close()
+        user = await self.storage.fetchone("SELECT login, password, secret_key FROM admins WHERE LOWER(login) = LOWER(?)", (data.Login,))
 
         if not user:
             self.logger.error(f"User {data.Login} not found")
@@ -220,7 +199,7 @@ class Admin:
                 detail={"Message": "Данный админ пользователь не найден"}
             )
         
-        if not pwd_context.verify(data.Password.strip(), user["password"]):
+        if not await hasher.verify(data.Password.strip(), user["password"]):
             self.logger.error(f"Incorrect login or password")
             raise HTTPException(
                 status_code=status.HTTP_401_UNAUTHORIZED,
@@ -1,5 +1,5 @@
 from fastapi import Depends, HTTPException, status
-from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
+from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials, APIKeyHeader
 from typing import Annotated
 import jwt
 
@@ -8,6 +8,12 @@ security_scheme = HTTPBearer(
     description="Вставьте JWT администратора для авторизации под его ролью. В случае если вам не известен JWT воспользуйтесь методом getJwt",
     auto_error=False
 )
+api_key_scheme = APIKeyHeader(
+    name="X-API-Key",
+    scheme_name="API Key",
+    description="Ключ доступа для игровых серверов и панелей. Выдается администратором через /apiKeys/create",
+    auto_error=False
+)
 
 class AdminSecurity:
 
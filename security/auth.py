@@ -0,0 +1,156 @@
+import os
+import time
+from typing import Annotated
+
+import dotenv
+from fastapi import HTTPException, status, Depends
+from fastapi.security import HTTPAuthorizationCredentials
+
+from logger.darky_logger import DarkyLogger
+from configs.logger import config
+from security.api_key import AdminSecurity, security_scheme, api_key_scheme
+from storage.base import Storage
+from utils.cache import LRUCache
+from utils.singleflight import SingleFlight
+
+dotenv.load_dotenv()
+
+
+class Principal:
+
+    '''
+    Authorized caller: an administrator or a machine client with an API key
+    '''
+
+    __slots__ = ("type", "login", "scopes")
+
+    def __init__(self, type: str, login: str, scopes: frozenset[str] = frozenset()):
+        self.type = type
+        self.login = login
+        self.scopes = scopes
+
+    @property
+    def is_admin(self) -> bool:
+        return self.type == "admin"
+
+
+class AdminKeyStore:
+
+    '''
+    Cached admin secret keys, so a valid JWT doesn't cost a DB round trip per request.
+    Entries expire after ``ttl`` seconds to pick up admins removed directly in the database
+    '''
+
+    def __init__(self, storage: Storage, ttl: float = 60):
+        self.storage = storage
+        self.cache = LRUCache(256, ttl)
+        self.flight = SingleFlight("admin_keys")
+
+    async def secret_key(self, login: str) -> str | None:
+        # only the cache key is lowered in Python, the database compares with its own LOWER
+        key = login.lower()
+        secret_key = self.cache.get(key)
+        if secret_key is None:
+            user = await self.flight.do(("key", login), self.storage.fetchone,
+                                        "SELECT secret_key FROM admins WHERE LOWER(login) = LOWER(?)", (login,))
+            if not user:
+                return None
+            secret_key = user["secret_key"]
+            self.cache.set(key, secret_key)
+        return secret_key
+
+    async def is_valid(self, login: str, key: str) -> bool:
+        secret_key = await self.secret_key(login)
+        return secret_key is not None and len(key) == 16 and secret_key == key
+
+    def forget(self, login: str) -> None:
+        self.cache.pop(login.lower())
+
+
+class Authorizer:
+
+    '''
+    Single place where the admin JWTs and the scoped API keys are checked.
+
+    ``require_admin`` and ``require_scope(scope)`` are FastAPI dependencies,
+    FastAPI resolves them once per request and the handlers get a ``Principal``.
+    The key store and the API keys are attached on startup with ``configure``
+    '''
+
+    def __init__(self, jwt_secret: str):
+        self.logger = DarkyLogger("darky.admins", configuration=config.LOGGER)
+        self.security = AdminSecurity(jwt_secret)
+        self.keys: AdminKeyStore | None = None
+        self.api_keys = None
+
+        self.checks = 0
+        self.failures = 0
+        self.total_time = 0.0
+        self.max_time = 0.0
+
+    def configure(self, keys: AdminKeyStore, api_keys) -> None:
+        self.keys = keys
+        self.api_keys = api_keys
+
+    async def admin(self, credentials: HTTPAuthorizationCredentials | None) -> Principal:
+        authorized = self.security.decode(credentials)
+        if authorized["type"] != "admin":
+            self.logger.error(f"You're not authorized or not an admin")
+            raise HTTPException(
+                status_code=status.HTTP_401_UNAUTHORIZED,
+                detail={"Message": "Вы не авторизованы или не являетесь администратором!"}
+            )
+
+        login, key = authorized["data"]["login"], authorized["data"]["secret_key"]
+        if not await self.keys.is_valid(login, key):
+            self.logger.error(f"Key is not valid")
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail={"Message": "JWT не прошел валидацию",
+                        "Admin": "Пытаемся взломать API, не так ли?)"}
+            )
+        return Principal("admin", login)
+
+    async def measure(self, check) -> Principal:
+        started = time.perf_counter()
+        try:
+            return await check
+        except HTTPException:
+            self.failures += 1
+            raise
+        finally:
+            elapsed = time.perf_counter() - started
+            self.checks += 1
+            self.total_time += elapsed
+            self.max_time = max(self.max_time, elapsed)
+
+    async def require_admin(self, credentials: Annotated[HTTPAuthorizationCredentials | None, Depends(security_scheme)]) -> Principal:
+        return await self.measure(self.admin(credentials))
+
+    def require_scope(self, scope: str):
+        '''
+        Dependency accepting an API key with the given scope or an admin JWT
+        '''
+        async def dependency(credentials: Annotated[HTTPAuthorizationCredentials | None, Depends(security_scheme)],
+                             raw_key: Annotated[str | None, Depends(api_key_scheme)]) -> Principal:
+            async def check() -> Principal:
+                key = await self.api_keys.check_scope(raw_key, scope)
+                if key:
+                    return Principal("api_key", key["name"], key["scopes"])
+                return await self.admin(credentials)
+            return await self.measure(check())
+        return dependency
+
+    def stats(self) -> dict:
+        return {
+            "checks": self.checks,
+            "failures": self.failures,
+            "avg_ms": round(self.total_time / self.checks * 1000, 3) if self.checks else 0.0,
+            "max_ms": round(self.max_time * 1000, 3),
+            "key_cache": self.keys.cache.stats() if self.keys else None
+        }
+
+
+authorizer = Authorizer(os.getenv("JWT_SECRET_KEY"))
+require_admin = authorizer.require_admin
+require_scope = authorizer.require_scope
@@ -0,0 +1,73 @@
+import os
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+
+import dotenv
+from passlib.context import CryptContext
+
+dotenv.load_dotenv()
+
+# Конфигурация для хеширования паролей
+pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+
+
+class Hasher:
+
+    '''
+    bcrypt hashing and verification on a pool of ``workers`` threads,
+    so the event loop keeps serving requests while the passwords are hashed.
+
+    The calls in flight are tracked, ``drain`` waits for them on shutdown
+    and ``pending`` shows how loaded the pool is
+    '''
+
+    def __init__(self, workers: int = 4):
+        self.workers = workers
+        self.completed = 0
+        self.peak = 0
+        self.__executor__ = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="darky-hash")
+        self.__running__: set[asyncio.Future] = set()
+
+    @property
+    def pending(self) -> int:
+        '''
+        Calls queued or running in the pool
+        '''
+        return len(self.__running__)
+
+    async def run(self, func, *args):
+        future = asyncio.get_running_loop().run_in_executor(self.__executor__, func, *args)
+        self.__running__.add(future)
+        self.peak = max(self.peak, len(self.__running__))
+        future.add_done_callback(self.__done__)
+        return await future
+
+    def __done__(self, future: asyncio.Future) -> None:
+        self.__running__.discard(future)
+        self.completed += 1
+
+    async def hash(self, password: str) -> str:
+        return await self.run(pwd_context.hash, password)
+
+    async def verify(self, password: str, hashed: str) -> bool:
+        return await self.run(pwd_context.verify, password, hashed)
+
+    async def drain(self, timeout: float) -> bool:
+        '''
+        Waits up to ``timeout`` seconds for the calls in flight, False if some are left
+        '''
+        if not self.__running__:
+            return True
+        _, left = await asyncio.wait(set(self.__running__), timeout=timeout)
+        return not left
+
+    def stats(self) -> dict:
+        return {
+            "workers": self.workers,
+            "pending": self.pending,
+            "peak": self.peak,
+            "completed": self.completed
+        }
+
+
+hasher = Hasher(int(os.getenv("HASH_WORKERS", 4)))
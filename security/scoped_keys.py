@@ -0,0 +1,287 @@
+import asyncio
+import hashlib
+import hmac
+import os
+import secrets
+from typing import Annotated
+
+import dotenv
+from fastapi import APIRouter, HTTPException, status, Depends
+
+from models.models import *
+from logger.darky_logger import DarkyLogger
+from configs.logger import config
+from configs.routers import config as ROUTERS
+from security.auth import Principal, require_admin
+from storage.base import Storage
+from utils.cache import LRUCache
+from utils.singleflight import SingleFlight
+from utils.timestamps import now_ms, format_iso
+
+dotenv.load_dotenv()
+
+SCOPES = {"users:read", "news:write"}
+KEY_PREFIX = "dk"
+
+class ApiKeys:
+
+    '''
+    Scoped API keys for machine clients.
+
+    A key looks like ``dk_<prefix>_<secret>``. Only the prefix and the SHA-256
+    of the secret are stored, the active keys are indexed in memory by prefix,
+    so verification is a dict lookup and a constant-time digest comparison.
+    Usage counters are accumulated in memory and flushed in one batch,
+    the index is reloaded on every flush to pick up keys revoked on other nodes.
+    Unknown prefixes are remembered for ``API_KEYS_MISSING_TTL`` seconds,
+    so a client retrying with a bad key doesn't cost a query per request
+    '''
+
+    def __init__(self,
+                 storage: Storage,
+                 audit):
+        self.logger = DarkyLogger("darky.keys", configuration=config.LOGGER)
+
+        self.logger.info(f"Initializing API keys service...")
+
+        self.storage = storage
+        self.audit = audit
+        self.init_database()
+        self.flight = SingleFlight("api_keys")
+        self.flush_interval = float(os.getenv("API_KEYS_FLUSH_INTERVAL", 10))
+        self.missing = LRUCache(4096, float(os.getenv("API_KEYS_MISSING_TTL", 5)))
+
+        self.__index__: dict[str, dict] = {}
+        self.__usage__: dict[int, list[int]] = {}
+        self.__flusher__: asyncio.Task | None = None
+
+        self.logger.debug(f"Inititalizing routers...")
+        self.router = APIRouter(
+            prefix="/apiKeys",
+            tags=["API Keys"],
+            lifespan=self.lifespan
+        )
+        self.router.add_api_route(ROUTERS.CREATE_API_KEY.route, self.create_key, methods=["POST"],
+                                  name=ROUTERS.CREATE_API_KEY.name,
+                                  description=ROUTERS.CREATE_API_KEY.description,
+                                  response_model=ApiKeyCreateResponse)
+        self.router.add_api_route(ROUTERS.GET_API_KEYS.route, self.get_keys, methods=["GET"],
+                                  name=ROUTERS.GET_API_KEYS.name,
+                                  description=ROUTERS.GET_API_KEYS.description,
+                                  response_model=ApiKeyListResponse)
+        self.router.add_api_route(ROUTERS.REVOKE_API_KEY.route, self.revoke_key, methods=["POST"],
+                                  name=ROUTERS.REVOKE_API_KEY.name,
+                                  description=ROUTERS.REVOKE_API_KEY.description,
+                                  response_model=ApiKeyRevokeResponse)
+        self.logger.debug(f"Successful")
+
+        self.logger.info(f"API keys service is initialized!")
+
+    async def lifespan(self, api: APIRouter):
+        await self.load_index()
+        self.__flusher__ = asyncio.create_task(self.flush_loop())
+        self.logger.info("API keys are loaded")
+        yield
+        self.__flusher__.cancel()
+        try:
+            await self.__flusher__
+        except asyncio.CancelledError:
+            pass
+        await self.flush_usage()
+
+    def init_database(self):
+        self.logger.debug(f"Registering database tables...")
+        self.storage.register_tables(['''
+                CREATE TABLE IF NOT EXISTS api_keys (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    name TEXT NOT NULL,
+                    prefix TEXT UNIQUE NOT NULL,
+                    secret_hash TEXT NOT NULL,
+                    scopes TEXT NOT NULL,
+                    created_at INTEGER NOT NULL,
+                    revoked_at INTEGER,
+                    last_used_at INTEGER,
+                    uses INTEGER NOT NULL DEFAULT 0
+                )
+            '''])
+        self.logger.debug(f"Successful")
+
+    @staticmethod
+    def hash_secret(secret: str) -> str:
+        return hashlib.sha256(secret.encode()).hexdigest()
+
+    @staticmethod
+    def index_entry(row: dict) -> dict:
+        return {
+            "id": row["id"],
+            "name": row["name"],
+            "secret_hash": row["secret_hash"],
+            "scopes": frozenset(row["scopes"].split())
+        }
+
+    async def load_index(self):
+        rows = await self.storage.fetchall(
+            "SELECT id, name, prefix, secret_hash, scopes FROM api_keys WHERE revoked_at IS NULL")
+        self.__index__ = {row["prefix"]: self.index_entry(row) for row in rows}
+
+    async def find_key(self, prefix: str) -> dict | None:
+        '''
+        Looks up the key missing in the index, it could be created on another node
+        '''
+        if self.missing.get(prefix):
+            return None
+        row = await self.flight.do(("prefix", prefix), self.storage.fetchone,
+                                   "SELECT id, name, prefix, secret_hash, scopes FROM api_keys WHERE prefix = ? AND revoked_at IS NULL", (prefix,))
+        if not row:
+            self.missing.set(prefix, True)
+            return None
+        entry = self.index_entry(row)
+        self.__index__[prefix] = entry
+        return entry
+
+    async def verify(self, raw_key: str) -> dict | None:
+        '''
+        Returns the index entry of the valid key or None
+        '''
+        parts = raw_key.strip().split("_")
+        if len(parts) != 3 or parts[0] != KEY_PREFIX:
+            return None
+        _, prefix, secret = parts
+
+        entry = self.__index__.get(prefix) or await self.find_key(prefix)
+        if not entry or not hmac.compare_digest(entry["secret_hash"], self.hash_secret(secret)):
+            return None
+
+        usage = self.__usage__.setdefault(entry["id"], [0, 0])
+        usage[0] += 1
+        usage[1] = now_ms()
+        return entry
+
+    async def check_scope(self, raw_key: str | None, scope: str) -> dict | None:
+        '''
+        Returns the key entry if it has the given scope.
+        Returns None when the request has no API key, so the handler can fall back to the admin JWT
+        '''
+        if not raw_key:
+            return None
+        entry = await self.verify(raw_key)
+        if not entry:
+            self.logger.error(f"API key is not valid")
+            raise HTTPException(
+                status_code=status.HTTP_401_UNAUTHORIZED,
+                detail={"Message": "Неверный или отозванный API ключ"}
+            )
+        if scope not in entry["scopes"]:
+            self.logger.error(f"API key {entry['name']} has no {scope} scope")
+            raise HTTPException(
+                status_code=status.HTTP_403_FORBIDDEN,
+                detail={"Message": f"API ключу не выдано право {scope}"}
+            )
+        return entry
+
+    async def flush_usage(self):
+        if not self.__usage__:
+            return
+        usage, self.__usage__ = self.__usage__, {}
+        try:
+            await self.storage.executemany(
+                "UPDATE api_keys SET uses = uses + ?, last_used_at = ? WHERE id = ?",
+                [(uses, last_used_at, key_id) for key_id, (uses, last_used_at) in usage.items()])
+        except Exception:
+            self.logger.error(f"Error while flushing API keys usage", exc_info=True)
+            # kept for the next flush together with the uses counted meanwhile
+            for key_id, (uses, last_used_at) in usage.items():
+                pending = self.__usage__.setdefault(key_id, [0, 0])
+                pending[0] += uses
+                pending[1] = max(pending[1], last_used_at)
+
+    async def flush_loop(self):
+        while True:
+            await asyncio.sleep(self.flush_interval)
+            await self.flush_usage()
+            try:
+                await self.load_index()
+            except Exception:
+                self.logger.error(f"Error while reloading API keys", exc_info=True)
+
+    async def create_key(self, data: ApiKeyCreateRequest, principal: Annotated[Principal, Depends(require_admin)]):
+        if not data.Name or not data.Scopes:
+            self.logger.error(f"Name and scopes are required!")
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail={"Message": "Название и права ключа обязательны"}
+            )
+        unknown = set(data.Scopes) - SCOPES
+        if unknown:
+            self.logger.error(f"Unknown scopes: {', '.join(sorted(unknown))}")
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail={"Message": f"Неизвестные права: {', '.join(sorted(unknown))}. Доступные: {', '.join(sorted(SCOPES))}"}
+            )
+
+        self.logger.info(f"Creating API key {data.Name}...")
+        prefix = secrets.token_hex(4)
+        secret = secrets.token_urlsafe(24).replace("_", "-")
+        scopes = " ".join(sorted(set(data.Scopes)))
+
+        try:
+            row = await self.storage.fetchone(
+                "INSERT INTO api_keys (name, prefix, secret_hash, scopes, created_at) VALUES (?, ?, ?, ?, ?) RETURNING id, name, prefix, secret_hash, scopes",
+                (data.Name, prefix, self.hash_secret(secret), scopes, now_ms())
+            )
+        except Exception as e:
+            self.logger.error(f"Error while creating API key", exc_info=True)
+            raise HTTPException(
+                status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+                detail={"Message": "Ошибка при создании API ключа"}
+            )
+        self.__index__[prefix] = self.index_entry(row)
+        self.missing.pop(prefix)
+        self.audit.record(principal, "api_keys.create", row["id"], after={"name": data.Name, "scopes": scopes.split()})
+
+        self.logger.info(f"API key {data.Name} is created")
+        return {
+            "Id": row["id"],
+            "Name": data.Name,
+            "Key": f"{KEY_PREFIX}_{prefix}_{secret}",
+            "Scopes": scopes.split(),
+            "Message": "API ключ создан. Сохраните его, повторно он показан не будет"
+        }
+
+    async def get_keys(self, principal: Annotated[Principal, Depends(require_admin)]):
+        await self.flush_usage()
+        rows = await self.storage.fetchall(
+            "SELECT id, name, prefix, scopes, created_at, revoked_at, last_used_at, uses FROM api_keys ORDER BY id")
+        return {
+            "Keys": [{
+                "Id": row["id"],
+                "Name": row["name"],
+                "Prefix": f"{KEY_PREFIX}_{row['prefix']}",
+                "Scopes": row["scopes"].split(),
+                "CreatedAt": format_iso(row["created_at"]),
+                "RevokedAt": format_iso(row["revoked_at"]) if row["revoked_at"] else None,
+                "LastUsedAt": format_iso(row["last_used_at"]) if row["last_used_at"] else None,
+                "Uses": row["uses"]
+            } for row in rows],
+            "Message": f"Найдено {len(rows)} ключей"
+        }
+
+    async def revoke_key(self, data: ApiKeyRevokeRequest, principal: Annotated[Principal, Depends(require_admin)]):
+        self.logger.info(f"Revoking API key ID:{data.Id}...")
+        row = await self.storage.fetchone(
+            "UPDATE api_keys SET revoked_at = ? WHERE id = ? AND revoked_at IS NULL RETURNING prefix",
+            (now_ms(), data.Id))
+        if not row:
+            self.logger.error(f"API key ID:{data.Id} not found or already revoked")
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND,
+                detail={"Message": "API ключ не найден или уже отозван"}
+            )
+        self.__index__.pop(row["prefix"], None)
+        self.audit.record(principal, "api_keys.revoke", data.Id)
+
+        self.logger.info(f"API key ID:{data.Id} is revoked")
+        return {
+            "Id": data.Id,
+            "Message": "API ключ отозван"
+        }
@@ -0,0 +1,182 @@
+import os
+import re
+import gzip
+import time
+import shutil
+import sqlite3
+import hashlib
+from datetime import datetime, timezone
+
+# data-20240131-120000.db.gz
+ARCHIVE = re.compile(r"^data-(\d{8}-\d{6})\.db\.gz$")
+
+
+def sha256_file(path: str) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as file:
+        for chunk in iter(lambda: file.read(1024 * 1024), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def archive_info(path: str) -> dict:
+    match = ARCHIVE.match(os.path.basename(path))
+    created = datetime.strptime(match.group(1), "%Y%m%d-%H%M%S").replace(tzinfo=timezone.utc) if match else None
+    checksum_path = f"{path}.sha256"
+    checksum = None
+    if os.path.exists(checksum_path):
+        with open(checksum_path, encoding="utf-8") as file:
+            checksum = file.read().split()[0]
+    return {
+        "file": os.path.basename(path),
+        "path": path,
+        "size": os.path.getsize(path),
+        "sha256": checksum,
+        "created_at": created
+    }
+
+
+def list_backups(directory: str) -> list[dict]:
+    '''
+    Backups in the directory from the newest to the oldest
+    '''
+    if not os.path.isdir(directory):
+        return []
+    names = sorted((name for name in os.listdir(directory) if ARCHIVE.match(name)), reverse=True)
+    return [archive_info(os.path.join(directory, name)) for name in names]
+
+
+def create_backup(source: str,
+                  directory: str,
+                  chunk_size: int = 1024 * 1024,
+                  step_sleep: float = 0.01,
+                  keep: int = 7) -> dict:
+    '''
+    Copies the live SQLite database without stopping the service.
+
+    The snapshot is taken with ``VACUUM INTO`` on a read-only connection in one
+    read transaction, with WAL the writers keep committing meanwhile and the
+    copy is never restarted. The snapshot is gzipped in chunks of ``chunk_size``
+    bytes with ``step_sleep`` seconds between them, so the compression doesn't
+    hog the disk and the CPU. The SHA-256 of the archive goes to
+    ``<archive>.sha256`` and only ``keep`` newest backups are left
+    '''
+    os.makedirs(directory, exist_ok=True)
+    stamp = datetime.now(timezone.utc).strftime("%Y%m%d-%H%M%S")
+    archive = os.path.join(directory, f"data-{stamp}.db.gz")
+    snapshot = f"{archive[:-3]}.tmp"
+    started = time.monotonic()
+    steps = 0
+
+    if os.path.exists(snapshot):
+        os.remove(snapshot)
+    source_conn = sqlite3.connect(f"file:{source}?mode=ro", uri=True)
+    try:
+        source_conn.execute("PRAGMA busy_timeout=5000")
+        source_conn.execute("VACUUM INTO ?", (snapshot,))
+    finally:
+        source_conn.close()
+
+    try:
+        with open(snapshot, "rb") as raw, gzip.open(archive, "wb", compresslevel=6) as compressed:
+            for chunk in iter(lambda: raw.read(chunk_size), b""):
+                compressed.write(chunk)
+                steps += 1
+                if step_sleep:
+                    time.sleep(step_sleep)
+    finally:
+        os.remove(snapshot)
+
+    checksum = sha256_file(archive)
+    with open(f"{archive}.sha256", "w", encoding="utf-8") as file:
+        file.write(f"{checksum}  {os.path.basename(archive)}\n")
+
+    if keep > 0:
+        for old in list_backups(directory)[keep:]:
+            os.remove(old["path"])
+            if os.path.exists(f"{old['path']}.sha256"):
+                os.remove(f"{old['path']}.sha256")
+
+    info = archive_info(archive)
+    info["steps"] = steps
+    info["elapsed"] = time.monotonic() - started
+    return info
+
+
+def verify_backup(archive: str) -> bool:
+    '''
+    Compares the archive with its checksum file
+    '''
+    checksum = archive_info(archive)["sha256"]
+    return checksum is not None and checksum == sha256_file(archive)
+
+
+def restore_backup(archive: str, target: str) -> str | None:
+    '''
+    Replaces the database with the backup. The service has to be stopped.
+
+    The archive is verified and unpacked next to the target first, the current
+    database is kept as ``<target>.before-restore``, its path is returned
+    '''
+    if not verify_backup(archive):
+        raise ValueError(f"Checksum mismatch or missing checksum file for {archive}")
+
+    unpacked = f"{target}.restore"
+    with gzip.open(archive, "rb") as compressed, open(unpacked, "wb") as raw:
+        shutil.copyfileobj(compressed, raw, 1024 * 1024)
+
+    conn = sqlite3.connect(unpacked)
+    try:
+        result = conn.execute("PRAGMA integrity_check").fetchone()[0]
+    finally:
+        conn.close()
+    if result != "ok":
+        os.remove(unpacked)
+        raise ValueError(f"Integrity check failed for {archive}: {result}")
+
+    previous = None
+    if os.path.exists(target):
+        previous = f"{target}.before-restore"
+        os.replace(target, previous)
+    for suffix in ("-wal", "-shm"):
+        if os.path.exists(target + suffix):
+            os.remove(target + suffix)
+    os.replace(unpacked, target)
+    return previous
+
+
+if __name__ == "__main__":
+    import argparse
+
+    import dotenv
+
+    dotenv.load_dotenv()
+
+    parser = argparse.ArgumentParser(prog="python -m storage.backup", description="SQLite backups of the service database")
+    parser.add_argument("--database", default=os.getenv("SQLITE_PATH", "data/data.db"))
+    parser.add_argument("--directory", default=os.getenv("BACKUP_DIR", "data/backups"))
+    commands = parser.add_subparsers(dest="command", required=True)
+    commands.add_parser("create", help="create a backup of the running database")
+    commands.add_parser("list", help="list the backups")
+    verify = commands.add_parser("verify", help="check the backup checksum")
+    verify.add_argument("archive")
+    restore = commands.add_parser("restore", help="replace the database with the backup, the service has to be stopped")
+    restore.add_argument("archive")
+    args = parser.parse_args()
+
+    if args.command == "create":
+        info = create_backup(args.database, args.directory,
+                             chunk_size=int(os.getenv("BACKUP_CHUNK_SIZE", 1024 * 1024)),
+                             step_sleep=float(os.getenv("BACKUP_STEP_SLEEP", 0.01)),
+                             keep=int(os.getenv("BACKUP_KEEP", 7)))
+        print(f"{info['path']} {info['size']} bytes sha256 {info['sha256']} in {info['elapsed']:.2f} s")
+    elif args.command == "list":
+        for info in list_backups(args.directory):
+            print(f"{info['file']}  {info['size']:>12}  {info['sha256']}")
+    elif args.command == "verify":
+        ok = verify_backup(args.archive)
+        print("OK" if ok else "CHECKSUM MISMATCH")
+        raise SystemExit(0 if ok else 1)
+    elif args.command == "restore":
+        previous = restore_backup(args.archive, args.database)
+        print(f"{args.database} is restored from {args.archive}" + (f", the previous database is kept as {previous}" if previous else ""))
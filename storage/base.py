@@ -0,0 +1,129 @@
+from abc import ABC, abstractmethod
+from typing import Any, AsyncContextManager, Iterable, Sequence
+
+
+class Transaction(ABC):
+
+    '''
+    Set of queries executed atomically on a single connection.
+    Queries use the qmark (``?``) parameter style on every backend
+    '''
+
+    @abstractmethod
+    async def execute(self, query: str, params: Sequence[Any] = ()) -> int:
+        '''
+        Executes the query and returns the number of affected rows
+        '''
+
+    @abstractmethod
+    async def executemany(self, query: str, params: Iterable[Sequence[Any]]) -> None:
+        '''
+        Executes the query for every parameter set
+        '''
+
+    @abstractmethod
+    async def fetchone(self, query: str, params: Sequence[Any] = ()) -> dict | None:
+        '''
+        Returns the first row of the result as a dict or None
+        '''
+
+    @abstractmethod
+    async def fetchall(self, query: str, params: Sequence[Any] = ()) -> list[dict]:
+        '''
+        Returns all the rows of the result as dicts
+        '''
+
+
+class Storage(ABC):
+
+    '''
+    Base class for the database backends used by the services
+
+    Every single call outside of ``transaction()`` is committed on its own
+    '''
+
+    dialect: str = ""
+
+    def __init__(self):
+        self.tables: list[str] = []
+
+    @abstractmethod
+    def transaction(self) -> AsyncContextManager[Transaction]:
+        '''
+        Async context manager yielding a Transaction.
+        Commits on exit and rolls back if an exception was raised
+        '''
+
+    @abstractmethod
+    async def connect(self) -> None:
+        '''
+        Opens the connection(s) of the backend
+        '''
+
+    @abstractmethod
+    async def close(self) -> None:
+        '''
+        Closes the connection(s) of the backend
+        '''
+
+    async def execute(self, query: str, params: Sequence[Any] = ()) -> int:
+        async with self.transaction() as tx:
+            return await tx.execute(query, params)
+
+    async def executemany(self, query: str, params: Iterable[Sequence[Any]]) -> None:
+        async with self.transaction() as tx:
+            await tx.executemany(query, params)
+
+    async def fetchone(self, query: str, params: Sequence[Any] = ()) -> dict | None:
+        async with self.transaction() as tx:
+            return await tx.fetchone(query, params)
+
+    async def fetchall(self, query: str, params: Sequence[Any] = ()) -> list[dict]:
+        async with self.transaction() as tx:
+            return await tx.fetchall(query, params)
+
+    async def read_fetchone(self, query: str, params: Sequence[Any] = ()) -> dict | None:
+        '''
+        Read-only query, the backend may serve it from a snapshot
+        without waiting for the running write transactions
+        '''
+        return await self.fetchone(query, params)
+
+    async def read_fetchall(self, query: str, params: Sequence[Any] = ()) -> list[dict]:
+        '''
+        Read-only query, the backend may serve it from a snapshot
+        without waiting for the running write transactions
+        '''
+        return await self.fetchall(query, params)
+
+    async def checkpoint(self) -> None:
+        '''
+        Makes the committed data durable in the main database file before the shutdown,
+        nothing to do for most of the backends
+        '''
+
+    def stats(self) -> dict:
+        '''
+        Load of the backend's connections for the health checks
+        '''
+        return {}
+
+    @abstractmethod
+    async def columns(self, table: str) -> set[str]:
+        '''
+        Returns the column names of the table, used by the schema migrations
+        '''
+
+    def register_tables(self, statements: Iterable[str]) -> None:
+        '''
+        Registers the DDL statements (``CREATE ... IF NOT EXISTS``) of a service.
+        They are applied lazily with the first query, so no connection is opened on startup
+        '''
+        self.tables.extend(statements)
+
+    def pending_tables(self) -> list[str]:
+        '''
+        Returns and forgets the registered DDL statements which are not applied yet
+        '''
+        statements, self.tables = self.tables, []
+        return statements
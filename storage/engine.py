@@ -0,0 +1,35 @@
+import os
+
+import dotenv
+
+from .base import Storage
+
+dotenv.load_dotenv()
+
+
+def create_storage() -> Storage:
+    '''
+    Creates the storage backend selected by ``DB_BACKEND`` in the .env file
+
+    - ``sqlite`` (default) uses ``SQLITE_PATH`` with ``SQLITE_READERS``
+      read-only connections for the list endpoints
+    - ``postgres`` uses ``POSTGRES_DSN`` with a pool of
+      ``POSTGRES_POOL_MIN``..``POSTGRES_POOL_MAX`` connections
+    '''
+    backend = os.getenv("DB_BACKEND", "sqlite").strip().lower()
+
+    if backend == "sqlite":
+        from .sqlite import SQLiteStorage
+        return SQLiteStorage(os.getenv("SQLITE_PATH", "data/data.db"),
+                             readers=int(os.getenv("SQLITE_READERS", 4)))
+
+    if backend in ("postgres", "postgresql"):
+        from .postgres import PostgresStorage
+        dsn = os.getenv("POSTGRES_DSN")
+        if not dsn:
+            raise RuntimeError("POSTGRES_DSN is required for the PostgreSQL backend")
+        return PostgresStorage(dsn,
+                               min_size=int(os.getenv("POSTGRES_POOL_MIN", 1)),
+                               max_size=int(os.getenv("POSTGRES_POOL_MAX", 10)))
+
+    raise RuntimeError(f"Unknown DB_BACKEND: {backend}")
@@ -0,0 +1,193 @@
+import asyncio
+import time
+
+from logger.darky_logger import DarkyLogger
+from utils.timestamps import now_ms
+from .base import Storage
+
+AUTO_VACUUM = {0: "none", 1: "full", 2: "incremental"}
+
+
+class Maintenance:
+
+    '''
+    Periodic upkeep of the SQLite database: ``PRAGMA optimize``, incremental
+    vacuum of the free pages and a passive WAL checkpoint.
+
+    A pass starts every ``interval`` seconds once nothing was written for
+    ``idle`` seconds (or anyway after another ``interval``) and stops after
+    ``budget`` seconds. Every step is a short transaction of its own, so
+    the requests are served between them
+    '''
+
+    def __init__(self,
+                 storage: Storage,
+                 logger: DarkyLogger,
+                 interval: float = 6 * 60 * 60,
+                 idle: float = 30.0,
+                 budget: float = 5.0,
+                 vacuum_pages: int = 256):
+        self.storage = storage
+        self.logger = logger
+        self.interval = interval
+        self.idle = idle
+        self.budget = budget
+        self.vacuum_pages = vacuum_pages
+
+        self.runs = 0
+        self.last: dict | None = None
+        self.__lock__ = asyncio.Lock()
+        self.__task__: asyncio.Task | None = None
+
+    @property
+    def enabled(self) -> bool:
+        return self.storage.dialect == "sqlite" and self.interval > 0
+
+    def start(self) -> None:
+        if self.enabled and self.__task__ is None:
+            self.__task__ = asyncio.create_task(self.run())
+
+    async def stop(self) -> None:
+        if self.__task__ is not None:
+            task, self.__task__ = self.__task__, None
+            task.cancel()
+            try:
+                await task
+            except asyncio.CancelledError:
+                pass
+
+    async def run(self) -> None:
+        while True:
+            await asyncio.sleep(self.interval)
+            await self.wait_idle()
+            try:
+                await self.run_once()
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                self.logger.error(f"Error during the database maintenance", exc_info=True)
+
+    async def wait_idle(self) -> None:
+        '''
+        Waits until nothing was written for ``idle`` seconds, at most ``interval`` seconds
+        '''
+        deadline = time.monotonic() + self.interval
+        while True:
+            quiet = time.monotonic() - self.storage.last_activity
+            if quiet >= self.idle:
+                return
+            if time.monotonic() >= deadline:
+                self.logger.warning(f"Database was not idle for {self.idle} s, maintenance runs anyway")
+                return
+            await asyncio.sleep(self.idle - quiet)
+
+    async def pragma(self, statement: str) -> list[dict]:
+        async with self.storage.transaction() as tx:
+            return await tx.fetchall(statement)
+
+    async def run_once(self) -> dict:
+        async with self.__lock__:
+            started = time.monotonic()
+            deadline = started + self.budget
+            result = {
+                "started_at": now_ms(),
+                "optimized": False,
+                "auto_vacuum": None,
+                "freed_pages": 0,
+                "free_pages": 0,
+                "wal_pages": 0,
+                "checkpointed_pages": 0,
+                "checkpoint_busy": False,
+                "size_before": 0,
+                "size_after": 0,
+                "timed_out": False,
+                "elapsed": 0.0
+            }
+            self.logger.info(f"Running database maintenance...")
+
+            page_size = (await self.pragma("PRAGMA page_size"))[0]["page_size"]
+            result["size_before"] = (await self.pragma("PRAGMA page_count"))[0]["page_count"] * page_size
+
+            # the statistics are refreshed only for the tables where the query planner needs them
+            await self.pragma("PRAGMA analysis_limit=400")
+            await self.pragma("PRAGMA optimize")
+            result["optimized"] = True
+
+            mode = (await self.pragma("PRAGMA auto_vacuum"))[0]["auto_vacuum"]
+            result["auto_vacuum"] = AUTO_VACUUM.get(mode, str(mode))
+            free = (await self.pragma("PRAGMA freelist_count"))[0]["freelist_count"]
+            if mode == 2:
+                while free > 0:
+                    if time.monotonic() >= deadline:
+                        result["timed_out"] = True
+                        break
+                    await self.pragma(f"PRAGMA incremental_vacuum({self.vacuum_pages})")
+                    left = (await self.pragma("PRAGMA freelist_count"))[0]["freelist_count"]
+                    result["freed_pages"] += free - left
+                    free = left
+            result["free_pages"] = free
+
+            if self.storage.journal_mode == "wal":
+                if time.monotonic() < deadline:
+                    # PASSIVE never waits for the readers and the writer, the rest is left for the next pass
+                    checkpoint = (await self.pragma("PRAGMA wal_checkpoint(PASSIVE)"))[0]
+                    busy, wal, checkpointed = checkpoint.values()
+                    result["checkpoint_busy"] = bool(busy)
+                    result["wal_pages"] = wal
+                    result["checkpointed_pages"] = checkpointed
+                else:
+                    result["timed_out"] = True
+
+            result["size_after"] = (await self.pragma("PRAGMA page_count"))[0]["page_count"] * page_size
+            result["elapsed"] = round(time.monotonic() - started, 3)
+            self.runs += 1
+            self.last = result
+
+            self.logger.info(f"Database maintenance is done in {result['elapsed']} s: "
+                             f"{result['size_before']} -> {result['size_after']} bytes, {result['freed_pages']} pages freed, "
+                             f"{result['free_pages']} free pages left, WAL {result['checkpointed_pages']}/{result['wal_pages']} pages checkpointed"
+                             + (", time budget exceeded" if result["timed_out"] else ""))
+            if result["auto_vacuum"] != "incremental" and free:
+                self.logger.warning(f"{free} free pages can't be released with auto_vacuum={result['auto_vacuum']}, "
+                                    f"run python -m storage.maintenance --vacuum once while the service is stopped")
+            return result
+
+    def stats(self) -> dict:
+        return {
+            "enabled": self.enabled,
+            "interval": self.interval,
+            "idle": self.idle,
+            "budget": self.budget,
+            "running": self.__lock__.locked(),
+            "runs": self.runs,
+            "last": self.last
+        }
+
+
+if __name__ == "__main__":
+    import os
+    import sqlite3
+    import argparse
+
+    import dotenv
+
+    dotenv.load_dotenv()
+
+    parser = argparse.ArgumentParser(prog="python -m storage.maintenance", description="Maintenance of the service SQLite database")
+    parser.add_argument("--database", default=os.getenv("SQLITE_PATH", "data/data.db"))
+    parser.add_argument("--vacuum", action="store_true",
+                        help="rebuild the database with auto_vacuum=INCREMENTAL, blocks the writes, stop the service first")
+    args = parser.parse_args()
+
+    conn = sqlite3.connect(args.database)
+    try:
+        before = os.path.getsize(args.database)
+        if args.vacuum:
+            conn.execute("PRAGMA auto_vacuum=INCREMENTAL")
+            conn.execute("VACUUM")
+        conn.execute("PRAGMA optimize")
+        conn.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+        mode = conn.execute("PRAGMA auto_vacuum").fetchone()[0]
+        print(f"{args.database}: {before} -> {os.path.getsize(args.database)} bytes, auto_vacuum={AUTO_VACUUM.get(mode, mode)}")
+    finally:
+        conn.close()
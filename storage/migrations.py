@@ -0,0 +1,40 @@
+import os
+import asyncio
+import sqlite3
+
+from .base import Storage
+
+
+def _read_legacy_admins(path: str) -> list[tuple[str, str, str]]:
+    conn = sqlite3.connect(path)
+    try:
+        return conn.execute("SELECT login, password, secret_key FROM admins").fetchall()
+    except sqlite3.OperationalError:
+        return []
+    finally:
+        conn.close()
+
+
+async def import_legacy_admins(storage: Storage, path: str = "admins.db") -> int:
+    '''
+    One-shot import of the standalone ``admins.db`` into the main storage.
+
+    Already existing logins are kept untouched. After the import the legacy
+    file is renamed to ``<path>.migrated`` so the import never runs twice
+
+    :returns: number of imported admins
+    '''
+    if not os.path.isfile(path):
+        return 0
+
+    rows = await asyncio.to_thread(_read_legacy_admins, path)
+    imported = 0
+    async with storage.transaction() as tx:
+        for row in rows:
+            imported += await tx.execute(
+                "INSERT INTO admins (login, password, secret_key) VALUES (?, ?, ?) ON CONFLICT (login) DO NOTHING",
+                row
+            )
+
+    os.replace(path, f"{path}.migrated")
+    return imported
@@ -0,0 +1,132 @@
+import re
+import asyncio
+from contextlib import asynccontextmanager
+from functools import lru_cache
+from typing import Any, Iterable, Sequence
+
+from .base import Storage, Transaction
+
+try:
+    import asyncpg
+except ImportError:
+    asyncpg = None
+
+
+_DDL_REPLACEMENTS = (
+    (re.compile(r"INTEGER PRIMARY KEY AUTOINCREMENT", re.IGNORECASE), "BIGSERIAL PRIMARY KEY"),
+    # SQLite INTEGER is 64-bit, the epoch milliseconds don't fit into PostgreSQL int4
+    (re.compile(r"\bINTEGER\b", re.IGNORECASE), "BIGINT"),
+)
+
+
+@lru_cache(maxsize=512)
+def translate(query: str) -> str:
+    '''
+    Converts the qmark query used by the services to the asyncpg dialect
+    (``?`` -> ``$1``, ``$2``...) and replaces the SQLite-only DDL
+    '''
+    for pattern, replacement in _DDL_REPLACEMENTS:
+        query = pattern.sub(replacement, query)
+
+    parts = query.split("?")
+    if len(parts) == 1:
+        return query
+    result = [parts[0]]
+    for index, part in enumerate(parts[1:], start=1):
+        result.append(f"${index}{part}")
+    return "".join(result)
+
+
+def _rowcount(status: str) -> int:
+    last = status.rsplit(" ", 1)[-1]
+    return int(last) if last.isdigit() else 0
+
+
+class PostgresTransaction(Transaction):
+
+    def __init__(self, conn):
+        self.__conn__ = conn
+
+    async def execute(self, query: str, params: Sequence[Any] = ()) -> int:
+        return _rowcount(await self.__conn__.execute(translate(query), *params))
+
+    async def executemany(self, query: str, params: Iterable[Sequence[Any]]) -> None:
+        await self.__conn__.executemany(translate(query), [tuple(p) for p in params])
+
+    async def fetchone(self, query: str, params: Sequence[Any] = ()) -> dict | None:
+        row = await self.__conn__.fetchrow(translate(query), *params)
+        return dict(row) if row is not None else None
+
+    async def fetchall(self, query: str, params: Sequence[Any] = ()) -> list[dict]:
+        return [dict(row) for row in await self.__conn__.fetch(translate(query), *params)]
+
+
+class PostgresStorage(Storage):
+
+    '''
+    PostgreSQL backend on top of an asyncpg connection pool.
+    Lets several API nodes share the same users and news
+    '''
+
+    dialect = "postgres"
+
+    def __init__(self, dsn: str, min_size: int = 1, max_size: int = 10):
+        if asyncpg is None:
+            raise RuntimeError("PostgreSQL backend requires 'asyncpg' to be installed")
+        super().__init__()
+        self.dsn = dsn
+        self.min_size = min_size
+        self.max_size = max_size
+        self.__pool__ = None
+        self.__lock__ = asyncio.Lock()
+
+    async def connect(self) -> None:
+        if self.__pool__ is not None and not self.tables:
+            return
+        async with self.__lock__:
+            if self.__pool__ is None:
+                self.__pool__ = await asyncpg.create_pool(self.dsn,
+                                                          min_size=self.min_size,
+                                                          max_size=self.max_size)
+            statements = self.pending_tables()
+            if statements:
+                async with self.__pool__.acquire() as conn:
+                    async with conn.transaction():
+                        for statement in statements:
+                            await conn.execute(translate(statement))
+
+    async def close(self) -> None:
+        if self.__pool__ is not None:
+            pool, self.__pool__ = self.__pool__, None
+            await pool.close()
+
+    def stats(self) -> dict:
+        if self.__pool__ is None:
+            return {}
+        return {
+            "size": self.__pool__.get_size(),
+            "idle": self.__pool__.get_idle_size()
+        }
+
+    async def columns(self, table: str) -> set[str]:
+        rows = await self.fetchall(
+            "SELECT column_name FROM information_schema.columns WHERE table_schema = current_schema() AND table_name = ?",
+            (table,)
+        )
+        return {row["column_name"] for row in rows}
+
+    @asynccontextmanager
+    async def transaction(self):
+        await self.connect()
+        async with self.__pool__.acquire() as conn:
+            async with conn.transaction():
+                yield PostgresTransaction(conn)
+
+    async def fetchone(self, query: str, params: Sequence[Any] = ()) -> dict | None:
+        await self.connect()
+        row = await self.__pool__.fetchrow(translate(query), *params)
+        return dict(row) if row is not None else None
+
+    async def fetchall(self, query: str, params: Sequence[Any] = ()) -> list[dict]:
+        await self.connect()
+        return [dict(row) for row in await self.__pool__.fetch(translate(query), *params)]
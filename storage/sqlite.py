@@ -0,0 +1,201 @@
+import os
+import asyncio
+import sqlite3
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import asynccontextmanager
+from typing import Any, Iterable, Sequence
+
+from .base import Storage, Transaction
+
+
+class SQLiteTransaction(Transaction):
+
+    def __init__(self, storage: "SQLiteStorage", conn: sqlite3.Connection):
+        self.__storage__ = storage
+        self.__conn__ = conn
+
+    async def execute(self, query: str, params: Sequence[Any] = ()) -> int:
+        cursor = await self.__storage__.run(self.__conn__.execute, query, tuple(params))
+        return cursor.rowcount
+
+    async def executemany(self, query: str, params: Iterable[Sequence[Any]]) -> None:
+        await self.__storage__.run(self.__conn__.executemany, query, [tuple(p) for p in params])
+
+    async def fetchone(self, query: str, params: Sequence[Any] = ()) -> dict | None:
+        def fetch():
+            row = self.__conn__.execute(query, tuple(params)).fetchone()
+            return dict(row) if row is not None else None
+        return await self.__storage__.run(fetch)
+
+    async def fetchall(self, query: str, params: Sequence[Any] = ()) -> list[dict]:
+        def fetch():
+            cursor = self.__conn__.execute(query, tuple(params))
+            rows = cursor.fetchall()
+            # statements like PRAGMA incremental_vacuum are stepped through but have no columns
+            return [dict(row) for row in rows] if cursor.description else []
+        return await self.__storage__.run(fetch)
+
+
+class SQLiteStorage(Storage):
+
+    '''
+    SQLite backend.
+
+    The connection lives on a single worker thread, so the blocking sqlite3
+    calls never run on the event loop. Transactions are serialized with a lock.
+
+    The database is switched to WAL, so ``read_fetchone``/``read_fetchall`` are
+    served by ``readers`` read-only connections on their own threads. Each query
+    reads the last committed snapshot and never waits for the writer
+    '''
+
+    dialect = "sqlite"
+    journal_size_limit = 64 * 1024 * 1024
+
+    def __init__(self, path: str = "data/data.db", readers: int = 4):
+        super().__init__()
+        self.path = path
+        self.readers = readers
+        self.journal_mode: str | None = None
+        # monotonic time of the last committed write
+        self.last_activity = 0.0
+        # transactions waiting for the writer connection
+        self.waiting = 0
+        self.__conn__: sqlite3.Connection | None = None
+        self.__executor__ = ThreadPoolExecutor(max_workers=1, thread_name_prefix="darky-sqlite")
+        self.__lock__ = asyncio.Lock()
+        self.__readers__ = ThreadPoolExecutor(max_workers=readers, thread_name_prefix="darky-sqlite-reader") if readers > 0 else None
+        self.__local__ = threading.local()
+        self.__reader_conns__: list[sqlite3.Connection] = []
+        self.__reader_lock__ = threading.Lock()
+        self.__generation__ = 0
+
+    async def run(self, func, *args):
+        '''
+        Runs the callable on the connection's thread
+        '''
+        return await asyncio.get_running_loop().run_in_executor(self.__executor__, func, *args)
+
+    def __open__(self) -> sqlite3.Connection:
+        directory = os.path.dirname(self.path)
+        if directory and not os.path.exists(directory):
+            os.makedirs(directory, exist_ok=True)
+        conn = sqlite3.connect(self.path, check_same_thread=False)
+        conn.row_factory = sqlite3.Row
+        # takes effect only for a new database, the old ones are converted with ``python -m storage.maintenance --vacuum``
+        conn.execute("PRAGMA auto_vacuum=INCREMENTAL")
+        self.journal_mode = conn.execute("PRAGMA journal_mode=WAL").fetchone()[0]
+        # with WAL a commit is durable after the checkpoint, the database can't be corrupted
+        conn.execute("PRAGMA synchronous=NORMAL")
+        # the WAL file is truncated to this size after the checkpoints
+        conn.execute(f"PRAGMA journal_size_limit={self.journal_size_limit}")
+        return conn
+
+    def __reader__(self) -> sqlite3.Connection:
+        '''
+        Read-only connection of the current reader thread
+        '''
+        local = self.__local__
+        if getattr(local, "generation", None) != self.__generation__:
+            conn = sqlite3.connect(f"file:{self.path}?mode=ro", uri=True, check_same_thread=False)
+            conn.row_factory = sqlite3.Row
+            conn.execute("PRAGMA busy_timeout=5000")
+            with self.__reader_lock__:
+                self.__reader_conns__.append(conn)
+            local.conn, local.generation = conn, self.__generation__
+        return local.conn
+
+    async def read(self, func, *args):
+        '''
+        Runs the callable with a reader connection on one of the reader threads
+        '''
+        return await asyncio.get_running_loop().run_in_executor(self.__readers__, lambda: func(self.__reader__(), *args))
+
+    def snapshot_ready(self) -> bool:
+        '''
+        The readers are used once the writer opened the database in WAL
+        and the registered tables are created
+        '''
+        return self.__readers__ is not None and self.__conn__ is not None and self.journal_mode == "wal" and not self.tables
+
+    async def read_fetchone(self, query: str, params: Sequence[Any] = ()) -> dict | None:
+        if not self.snapshot_ready():
+            return await self.fetchone(query, params)
+        def fetch(conn):
+            row = conn.execute(query, tuple(params)).fetchone()
+            return dict(row) if row is not None else None
+        return await self.read(fetch)
+
+    async def read_fetchall(self, query: str, params: Sequence[Any] = ()) -> list[dict]:
+        if not self.snapshot_ready():
+            return await self.fetchall(query, params)
+        def fetch(conn):
+            return [dict(row) for row in conn.execute(query, tuple(params)).fetchall()]
+        return await self.read(fetch)
+
+    async def connect(self) -> None:
+        if self.__conn__ is None:
+            self.__conn__ = await self.run(self.__open__)
+
+    async def close(self) -> None:
+        if self.__readers__ is not None:
+            with self.__reader_lock__:
+                self.__generation__ += 1
+                readers, self.__readers__ = self.__readers__, ThreadPoolExecutor(max_workers=self.readers, thread_name_prefix="darky-sqlite-reader")
+                conns, self.__reader_conns__ = self.__reader_conns__, []
+            # the queries running on the old reader threads finish before their connections are closed
+            await asyncio.to_thread(readers.shutdown, True)
+            for conn in conns:
+                conn.close()
+        if self.__conn__ is not None:
+            conn, self.__conn__ = self.__conn__, None
+            await self.run(conn.close)
+
+    async def checkpoint(self) -> None:
+        '''
+        Moves the whole WAL into the database file and truncates it
+        '''
+        if self.__conn__ is None or self.journal_mode != "wal":
+            return
+        async with self.transaction() as tx:
+            await tx.fetchall("PRAGMA wal_checkpoint(TRUNCATE)")
+
+    async def columns(self, table: str) -> set[str]:
+        rows = await self.fetchall(f"PRAGMA table_info({table})")
+        return {row["name"] for row in rows}
+
+    def stats(self) -> dict:
+        return {
+            "waiting": self.waiting,
+            "readers": len(self.__reader_conns__),
+            "journal_mode": self.journal_mode
+        }
+
+    @asynccontextmanager
+    async def transaction(self):
+        self.waiting += 1
+        try:
+            await self.__lock__.acquire()
+        finally:
+            self.waiting -= 1
+        try:
+            await self.connect()
+            conn = self.__conn__
+            changes = conn.total_changes
+            try:
+                tx = SQLiteTransaction(self, conn)
+                for statement in self.pending_tables():
+                    await tx.execute(statement)
+                yield tx
+            except BaseException:
+                await self.run(conn.rollback)
+                raise
+            else:
+                await self.run(conn.commit)
+                # only the writes count, the reads and health probes leave the database idle
+                if conn.total_changes != changes:
+                    self.last_activity = time.monotonic()
+        finally:
+            self.__lock__.release()
@@ -0,0 +1,338 @@
+import os
+import asyncio
+import threading
+import time
+
+import dotenv
+import uvicorn
+from fastapi import APIRouter
+from fastapi.responses import JSONResponse
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from models.models import *
+from logger.darky_logger import DarkyLogger
+from configs.logger import config
+from configs.routers import config as ROUTERS
+from security.hashing import Hasher
+from news_service.hub import NewsHub
+from storage.base import Storage
+from utils.batch_writer import BatchWriter
+from utils.cache import LRUCache
+from utils.singleflight import SingleFlight
+
+dotenv.load_dotenv()
+
+class System:
+
+    '''
+    Liveness, readiness and the graceful shutdown of the instance.
+
+    On SIGTERM the instance reports itself not ready for ``SHUTDOWN_DELAY``
+    seconds while still serving, so the load balancer routes the new requests
+    away. The event streams are closed right away, their clients reconnect to
+    another instance. Then the server stops accepting connections, and the router's
+    lifespan waits up to ``SHUTDOWN_TIMEOUT`` seconds for the requests
+    and password hashes in flight before the other services stop.
+
+    ``/health/ready`` probes the database latency and the queues, the probes
+    are shared by the concurrent checks and reused for ``HEALTH_CACHE_TTL``
+    seconds. An overloaded instance answers ``degraded`` with
+    ``HEALTH_DEGRADED_CODE``
+    '''
+
+    def __init__(self,
+                 storage: Storage,
+                 hasher: Hasher,
+                 writers: dict[str, BatchWriter],
+                 caches: dict[str, LRUCache],
+                 streams: dict[str, NewsHub]):
+        self.logger = DarkyLogger("darky.system", configuration=config.LOGGER)
+
+        self.logger.info(f"Initializing System service...")
+
+        self.storage = storage
+        self.hasher = hasher
+        self.writers = writers
+        self.caches = caches
+        self.streams = streams
+        self.delay = float(os.getenv("SHUTDOWN_DELAY", 5))
+        self.timeout = float(os.getenv("SHUTDOWN_TIMEOUT", 30))
+        self.draining = False
+        self.in_flight = 0
+        self.__idle__: asyncio.Event | None = None
+        self.__loop__: asyncio.AbstractEventLoop | None = None
+
+        self.cache_ttl = float(os.getenv("HEALTH_CACHE_TTL", 1))
+        self.db_timeout = float(os.getenv("HEALTH_DB_TIMEOUT", 1))
+        self.db_slow_ms = float(os.getenv("HEALTH_DB_SLOW_MS", 250))
+        self.writer_queue = int(os.getenv("HEALTH_WRITER_QUEUE", 50))
+        self.buffer_pending = int(os.getenv("HEALTH_BUFFER_PENDING", 5000))
+        self.hash_queue = int(os.getenv("HEALTH_HASH_QUEUE", 32))
+        self.degraded_code = int(os.getenv("HEALTH_DEGRADED_CODE", 503))
+        self.flight = SingleFlight("health")
+        self.__checks__: dict | None = None
+        self.__checked_at__ = 0.0
+
+        self.logger.debug(f"Inititalizing routers...")
+        self.router = APIRouter(
+            prefix="/health",
+            tags=["System"],
+            lifespan=self.lifespan
+        )
+        self.router.add_api_route(ROUTERS.HEALTH_LIVE.route, self.live, methods=["GET"],
+                                  name=ROUTERS.HEALTH_LIVE.name,
+                                  description=ROUTERS.HEALTH_LIVE.description,
+                                  response_model=HealthResponse)
+        self.router.add_api_route(ROUTERS.HEALTH_READY.route, self.ready, methods=["GET"],
+                                  name=ROUTERS.HEALTH_READY.name,
+                                  description=ROUTERS.HEALTH_READY.description,
+                                  response_model=HealthResponse)
+        self.logger.debug(f"Successful")
+
+        self.logger.info(f"System service is initialized!")
+
+    async def lifespan(self, api: APIRouter):
+        self.__idle__ = asyncio.Event()
+        self.__idle__.set()
+        self.__loop__ = asyncio.get_running_loop()
+        self.logger.info("Hello")
+        yield
+        # included last, so this runs before the other services stop
+        self.begin_drain()
+        started = time.monotonic()
+        if not await self.wait_requests(self.timeout):
+            self.logger.warning(f"{self.in_flight} requests are still running after {self.timeout} s")
+        if not await self.hasher.drain(max(0.0, self.timeout - (time.monotonic() - started))):
+            self.logger.warning(f"{self.hasher.pending} password hashes are still running, they are abandoned")
+        self.logger.info(f"Requests are drained in {time.monotonic() - started:.2f} s")
+        self.logger.info("Bye")
+
+    def begin_drain(self) -> None:
+        if not self.draining:
+            self.draining = True
+            self.logger.info(f"Draining: {self.in_flight} requests and {self.hasher.pending} password hashes in flight")
+            # called from the signal handler too, the hubs are touched only on the event loop
+            if self.__loop__ is not None:
+                self.__loop__.call_soon_threadsafe(self.close_streams)
+            else:
+                self.close_streams()
+
+    def close_streams(self) -> None:
+        '''
+        Disconnects the event stream subscribers, uvicorn would wait for them until the timeout otherwise
+        '''
+        for name, hub in self.streams.items():
+            subscribers = len(hub.subscribers)
+            hub.close()
+            if subscribers:
+                self.logger.info(f"{subscribers} {name} stream subscribers are disconnected")
+
+    def request_started(self) -> None:
+        self.in_flight += 1
+        if self.__idle__ is not None:
+            self.__idle__.clear()
+
+    def request_finished(self) -> None:
+        self.in_flight -= 1
+        if self.in_flight == 0 and self.__idle__ is not None:
+            self.__idle__.set()
+
+    async def wait_requests(self, timeout: float) -> bool:
+        '''
+        Waits up to ``timeout`` seconds until no request is in flight
+        '''
+        if self.in_flight == 0 or self.__idle__ is None:
+            return True
+        try:
+            await asyncio.wait_for(self.__idle__.wait(), timeout)
+            return True
+        except asyncio.TimeoutError:
+            return False
+
+    def state(self) -> dict:
+        return {
+            "InFlight": self.in_flight,
+            "HashPending": self.hasher.pending
+        }
+
+    async def live(self):
+        return {
+            "Status": "alive",
+            **self.state()
+        }
+
+    async def timed(self, query) -> tuple[str, float | None, str | None]:
+        started = time.perf_counter()
+        try:
+            await asyncio.wait_for(query("SELECT 1 AS ok"), self.db_timeout)
+        except asyncio.TimeoutError:
+            return "timeout", None, f"No answer in {self.db_timeout} s"
+        except Exception as e:
+            return "error", None, str(e)
+        latency = round((time.perf_counter() - started) * 1000, 2)
+        return ("slow" if latency > self.db_slow_ms else "ok"), latency, None
+
+    async def probe_database(self) -> dict:
+        '''
+        Latency of a snapshot read and of a query through the writer connection,
+        the latter includes the wait for the running transactions
+        '''
+        (read, read_ms, read_error), (write, write_ms, write_error) = await asyncio.gather(
+            self.timed(self.storage.read_fetchone), self.timed(self.storage.fetchone))
+        status = next((state for state in ("error", "timeout", "slow") if state in (read, write)), "ok")
+        return {
+            "Status": status,
+            "ReadMs": read_ms,
+            "WriteMs": write_ms,
+            "Error": read_error or write_error
+        }
+
+    def probe_writers(self) -> dict:
+        waiting = self.storage.stats().get("waiting", 0)
+        pending = {name: writer.pending for name, writer in self.writers.items()}
+        overloaded = waiting > self.writer_queue or any(count > self.buffer_pending for count in pending.values())
+        return {
+            "Status": "overloaded" if overloaded else "ok",
+            "Waiting": waiting,
+            "Buffered": pending
+        }
+
+    def probe_hashing(self) -> dict:
+        return {
+            "Status": "overloaded" if self.hasher.pending > self.hash_queue else "ok",
+            "Pending": self.hasher.pending,
+            "Workers": self.hasher.workers
+        }
+
+    def probe_caches(self) -> dict:
+        caches = {}
+        for name, cache in self.caches.items():
+            stats = cache.stats()
+            lookups = stats["hits"] + stats["misses"]
+            caches[name] = {
+                "Size": stats["size"],
+                "MaxSize": stats["maxsize"],
+                "HitRate": round(stats["hits"] / lookups, 3) if lookups else None
+            }
+        # the caches only speed up the reads, they never make the instance unready
+        return {
+            "Status": "ok",
+            **caches
+        }
+
+    async def run_checks(self) -> dict:
+        started = time.perf_counter()
+        checks = {
+            "Database": await self.probe_database(),
+            "Writers": self.probe_writers(),
+            "Hashing": self.probe_hashing(),
+            "Caches": self.probe_caches()
+        }
+        failed = [name for name, check in checks.items() if check["Status"] != "ok"]
+        was_degraded = self.__checks__ is not None and self.__checks__["Status"] == "degraded"
+        # only the changes are logged, the probes run every second under the balancer
+        if failed and not was_degraded:
+            self.logger.warning(f"Instance is degraded: {', '.join(f'{name} {checks[name]['Status']}' for name in failed)}")
+        elif not failed and was_degraded:
+            self.logger.info(f"Instance is ready again")
+        self.__checks__ = {
+            "Status": "degraded" if failed else "ready",
+            "Checks": checks,
+            "ProbeMs": round((time.perf_counter() - started) * 1000, 2)
+        }
+        self.__checked_at__ = time.monotonic()
+        return self.__checks__
+
+    async def ready(self):
+        if self.draining:
+            return JSONResponse({
+                "Status": "draining",
+                **self.state()
+            }, status_code=503)
+
+        if self.__checks__ is not None and time.monotonic() - self.__checked_at__ < self.cache_ttl:
+            checks = self.__checks__
+        else:
+            checks = await self.flight.do("ready", self.run_checks)
+        content = {
+            **checks,
+            **self.state(),
+            "Age": round(time.monotonic() - self.__checked_at__, 3)
+        }
+        if checks["Status"] != "ready":
+            return JSONResponse(content, status_code=self.degraded_code)
+        return content
+
+
+class DrainMiddleware:
+
+    '''
+    Counts the requests in flight for the ``System`` service. While the instance
+    is draining the responses carry ``Connection: close``, so the keep-alive
+    clients reconnect to another instance. The event streams are counted only
+    until their headers are sent, ``System.begin_drain`` closes them
+    '''
+
+    def __init__(self, app: ASGIApp, system: System):
+        self.app = app
+        self.system = system
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        finished = False
+        def finish():
+            nonlocal finished
+            if not finished:
+                finished = True
+                self.system.request_finished()
+
+        async def send_wrapper(message: Message) -> None:
+            if message["type"] == "http.response.start":
+                headers = message.get("headers", [])
+                if self.system.draining:
+                    message["headers"] = headers = [(k, v) for k, v in headers if k.lower() != b"connection"] + [(b"connection", b"close")]
+                if any(k.lower() == b"content-type" and v.startswith(b"text/event-stream") for k, v in headers):
+                    finish()
+            await send(message)
+
+        self.system.request_started()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            finish()
+
+
+class DrainingServer(uvicorn.Server):
+
+    '''
+    Uvicorn server which turns the first SIGTERM/SIGINT into ``SHUTDOWN_DELAY``
+    seconds of draining before the shutdown. The second signal skips the rest
+    of the delay, uvicorn still waits up to ``timeout_graceful_shutdown`` seconds
+    for the open requests, a third SIGINT makes it exit without waiting
+    '''
+
+    def __init__(self, config: uvicorn.Config, system: System):
+        super().__init__(config)
+        self.system = system
+        self.__timer__: threading.Timer | None = None
+
+    def handle_exit(self, sig, frame) -> None:
+        # the streams are closed before uvicorn starts waiting for the connections
+        skip_delay = self.system.draining or self.system.delay <= 0
+        self.system.begin_drain()
+        if skip_delay:
+            if self.__timer__ is not None:
+                self.__timer__.cancel()
+            super().handle_exit(sig, frame)
+            return
+        self.__timer__ = threading.Timer(self.system.delay, self.delayed_exit, (sig, frame))
+        self.__timer__.daemon = True
+        self.__timer__.start()
+
+    def delayed_exit(self, sig, frame) -> None:
+        # a second signal already started the shutdown, uvicorn would take this one for a third
+        if not self.should_exit:
+            super().handle_exit(sig, frame)
@@ -0,0 +1,84 @@
+'''
+``backend`` runs a test body on every storage backend.
+
+PostgreSQL is taken from ``POSTGRES_TEST_DSN``, or started with ``pgserver``
+when it is installed, otherwise its cases are skipped
+'''
+import os
+import sys
+import asyncio
+import tempfile
+import uuid
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from storage.base import Storage
+from storage.sqlite import SQLiteStorage
+
+
+@pytest.fixture(scope="session")
+def postgres_dsn():
+    dsn = os.getenv("POSTGRES_TEST_DSN")
+    if dsn:
+        yield dsn
+        return
+    asyncpg = pytest.importorskip("asyncpg")
+    pgserver = pytest.importorskip("pgserver")
+    server = pgserver.get_server(tempfile.mkdtemp(prefix="darky-pg-"), cleanup_mode="delete")
+    try:
+        yield server.get_uri()
+    finally:
+        server.cleanup()
+
+
+class Backend:
+
+    def __init__(self, name: str, make):
+        self.name = name
+        self.make = make
+
+    def run(self, body, tables=()) -> None:
+        async def main():
+            storage = await self.make()
+            storage.register_tables(tables)
+            try:
+                await body(storage)
+            finally:
+                await storage.close()
+        asyncio.run(main())
+
+
+@pytest.fixture(params=["sqlite", "postgres"])
+def backend(request, tmp_path):
+    if request.param == "sqlite":
+        async def make() -> Storage:
+            return SQLiteStorage(str(tmp_path / "data.db"))
+        yield Backend("sqlite", make)
+        return
+
+    dsn = request.getfixturevalue("postgres_dsn")
+    import asyncpg
+    from storage.postgres import PostgresStorage
+
+    schema = f"contract_{uuid.uuid4().hex[:12]}"
+    separator = "&" if "?" in dsn else "?"
+
+    async def make() -> Storage:
+        conn = await asyncpg.connect(dsn)
+        try:
+            await conn.execute(f"CREATE SCHEMA {schema}")
+        finally:
+            await conn.close()
+        return PostgresStorage(f"{dsn}{separator}search_path={schema}", min_size=1, max_size=4)
+
+    yield Backend("postgres", make)
+
+    async def drop():
+        conn = await asyncpg.connect(dsn)
+        try:
+            await conn.execute(f"DROP SCHEMA IF EXISTS {schema} CASCADE")
+        finally:
+            await conn.close()
+    asyncio.run(drop())
@@ -0,0 +1,59 @@
+import asyncio
+
+import pytest
+
+from storage.sqlite import SQLiteStorage
+
+
+@pytest.fixture(autouse=True)
+def workdir(tmp_path, monkeypatch):
+    # the service loggers write to data/darky.log
+    monkeypatch.chdir(tmp_path)
+    (tmp_path / "data").mkdir()
+
+
+def make_keys(storage):
+    # imported here, the module configures its loggers on import
+    from security.scoped_keys import ApiKeys
+    return ApiKeys(storage, None)
+
+
+def test_unknown_prefix_is_cached(tmp_path):
+    async def main():
+        storage = SQLiteStorage(str(tmp_path / "data.db"))
+        keys = make_keys(storage)
+        try:
+            await keys.load_index()
+            for _ in range(5):
+                assert await keys.verify("dk_deadbeef_secret") is None
+            assert keys.flight.executions == 1
+        finally:
+            await storage.close()
+    asyncio.run(main())
+
+
+def test_failed_flush_keeps_the_usage(tmp_path, monkeypatch):
+    async def main():
+        storage = SQLiteStorage(str(tmp_path / "data.db"))
+        keys = make_keys(storage)
+        try:
+            await storage.execute(
+                "INSERT INTO api_keys (name, prefix, secret_hash, scopes, created_at) VALUES (?, ?, ?, ?, ?)",
+                ("bot", "cafe0001", keys.hash_secret("secret"), "users:read", 0))
+            await keys.load_index()
+            for _ in range(3):
+                assert await keys.verify("dk_cafe0001_secret")
+
+            async def broken(query, params):
+                raise RuntimeError("database is gone")
+            monkeypatch.setattr(storage, "executemany", broken)
+            await keys.flush_usage()
+            await keys.verify("dk_cafe0001_secret")
+            monkeypatch.delattr(storage, "executemany")
+
+            await keys.flush_usage()
+            row = await storage.fetchone("SELECT uses FROM api_keys WHERE prefix = ?", ("cafe0001",))
+            assert row["uses"] == 4
+        finally:
+            await storage.close()
+    asyncio.run(main())
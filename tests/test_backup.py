@@ -0,0 +1,72 @@
+import os
+import sqlite3
+import threading
+import time
+
+from storage.backup import create_backup, list_backups, restore_backup, verify_backup
+
+
+def make_database(path: str, rows: int = 20000) -> None:
+    conn = sqlite3.connect(path)
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("CREATE TABLE users (id INTEGER PRIMARY KEY, login TEXT NOT NULL)")
+    conn.executemany("INSERT INTO users (login) VALUES (?)", ((f"user{i}" * 100,) for i in range(rows)))
+    conn.commit()
+    conn.close()
+
+
+def test_backup_finishes_while_writer_commits(tmp_path):
+    database = str(tmp_path / "data.db")
+    make_database(database)
+    stop = threading.Event()
+    commits = 0
+
+    def writer():
+        nonlocal commits
+        conn = sqlite3.connect(database)
+        while not stop.is_set():
+            conn.execute("INSERT INTO users (login) VALUES (?)", (f"burst{commits}",))
+            conn.commit()
+            commits += 1
+            time.sleep(0.005)
+        conn.close()
+
+    thread = threading.Thread(target=writer)
+    thread.start()
+    try:
+        started = time.monotonic()
+        info = create_backup(database, str(tmp_path / "backups"), chunk_size=256 * 1024, step_sleep=0.01)
+        elapsed = time.monotonic() - started
+    finally:
+        stop.set()
+        thread.join()
+
+    assert commits > 0
+    assert elapsed < 30
+    assert verify_backup(info["path"])
+    assert [backup["file"] for backup in list_backups(str(tmp_path / "backups"))] == [info["file"]]
+
+    restored = str(tmp_path / "restored.db")
+    assert restore_backup(info["path"], restored) is None
+    conn = sqlite3.connect(restored)
+    try:
+        assert conn.execute("SELECT COUNT(*) FROM users").fetchone()[0] >= 20000
+    finally:
+        conn.close()
+
+
+def test_restore_rejects_tampered_archive(tmp_path):
+    database = str(tmp_path / "data.db")
+    make_database(database, rows=10)
+    info = create_backup(database, str(tmp_path / "backups"), step_sleep=0)
+    with open(info["path"], "ab") as archive:
+        archive.write(b"garbage")
+
+    assert not verify_backup(info["path"])
+    try:
+        restore_backup(info["path"], database)
+    except ValueError:
+        pass
+    else:
+        raise AssertionError("tampered archive was restored")
+    assert os.path.exists(database)
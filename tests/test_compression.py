@@ -0,0 +1,83 @@
+import gzip
+import asyncio
+
+import brotli
+import pytest
+
+from utils.compression import CompressedPayload, CompressionMiddleware, choose_encoding
+
+
+@pytest.mark.parametrize("header, expected", [
+    (None, None),
+    ("", None),
+    ("gzip", "gzip"),
+    ("gzip, br", "br"),
+    ("br;q=0.5, gzip", "gzip"),
+    ("*", "br"),
+    ("gzip;q=0, identity", None),
+    ("deflate", None),
+])
+def test_choose_encoding(header, expected):
+    assert choose_encoding(header) == expected
+
+
+def call(app, accept_encoding: str | None) -> list[dict]:
+    headers = [(b"accept-encoding", accept_encoding.encode())] if accept_encoding else []
+    scope = {"type": "http", "method": "GET", "path": "/", "headers": headers}
+    sent = []
+
+    async def receive():
+        return {"type": "http.request", "body": b"", "more_body": False}
+
+    async def send(message):
+        sent.append(message)
+
+    asyncio.run(CompressionMiddleware(app, minimum_size=100)(scope, receive, send))
+    return sent
+
+
+def respond(*chunks: bytes, content_type: bytes = b"application/json", encoding: bytes | None = None):
+    async def app(scope, receive, send):
+        headers = [(b"content-type", content_type)]
+        if encoding:
+            headers.append((b"content-encoding", encoding))
+        await send({"type": "http.response.start", "status": 200, "headers": headers})
+        for i, chunk in enumerate(chunks):
+            await send({"type": "http.response.body", "body": chunk, "more_body": i < len(chunks) - 1})
+    return app
+
+
+def test_large_body_is_compressed():
+    body = b'{"data": "' + b"x" * 1000 + b'"}'
+    start, message = call(respond(body), "gzip")
+    headers = dict(start["headers"])
+    assert headers[b"content-encoding"] == b"gzip"
+    assert headers[b"vary"] == b"Accept-Encoding"
+    assert int(headers[b"content-length"]) == len(message["body"])
+    assert gzip.decompress(message["body"]) == body
+
+
+@pytest.mark.parametrize("chunks, options, accept_encoding", [
+    # too small, not accepted, streamed, already encoded, event stream
+    ([b"{}"], {}, "gzip"),
+    ([b"x" * 1000], {}, None),
+    ([b"x" * 1000, b"x" * 1000], {}, "gzip"),
+    ([b"x" * 1000], {"encoding": b"br"}, "gzip"),
+    ([b"x" * 1000], {"content_type": b"text/event-stream"}, "gzip"),
+])
+def test_passthrough(chunks, options, accept_encoding):
+    start, *messages = call(respond(*chunks, **options), accept_encoding)
+    assert dict(start["headers"]).get(b"content-encoding") == options.get("encoding")
+    assert [message["body"] for message in messages] == chunks
+
+
+def test_precomputed_payload():
+    body = b"x" * 2000
+    payload = CompressedPayload(body, minimum_size=1024)
+    response = payload.response("gzip, br")
+    assert response.headers["content-encoding"] == "br"
+    assert brotli.decompress(response.body) == body
+    assert payload.response(None).body == body
+
+    small = CompressedPayload(b"{}", minimum_size=1024).response("br")
+    assert "content-encoding" not in small.headers and "vary" not in small.headers
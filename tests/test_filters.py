@@ -0,0 +1,19 @@
+import logging
+
+from logger.filters import SamplingFilter
+
+
+def record(msg: str, *args) -> logging.LogRecord:
+    return logging.LogRecord("darky.test", logging.DEBUG, __file__, 1, msg, args, None)
+
+
+def test_sampling_shares_the_template_and_stays_bounded():
+    sampling = SamplingFilter(sample_rate=0.5, per_second=1000, max_keys=8)
+    passed = [sampling.filter(record("User %s", login)) for login in range(10)]
+    assert passed == [True, False] * 5
+
+    for i in range(100):
+        sampling.filter(record(f"User {i}"))
+    assert len(sampling.__seen__) == 8 and len(sampling.__windows__) == 8
+    # the recently logged messages keep their counters
+    assert ("darky.test", "User 99") in sampling.__seen__
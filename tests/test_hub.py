@@ -0,0 +1,53 @@
+import asyncio
+
+from news_service.hub import NewsHub
+
+
+def test_events_are_fanned_out():
+    async def main():
+        hub = NewsHub(buffer_size=4)
+        first, second = hub.subscribe(), hub.subscribe()
+        hub.publish("add", {"id": 1}, event_id=7)
+
+        expected = b'id: 7\nevent: add\ndata: {"id":1}\n\n'
+        assert await first.next(0.1) == expected
+        assert await second.next(0.1) == expected
+        assert await first.next(0.01) is None
+        assert hub.stats() == {"subscribers": 2, "published": 1, "evicted": 0}
+    asyncio.run(main())
+
+
+def test_waiting_subscriber_is_woken_up():
+    async def main():
+        hub = NewsHub()
+        subscriber = hub.subscribe()
+        waiting = asyncio.create_task(subscriber.next(1))
+        await asyncio.sleep(0.01)
+        hub.publish("delete", {"id": 2})
+        assert await asyncio.wait_for(waiting, 0.5) == b'event: delete\ndata: {"id":2}\n\n'
+    asyncio.run(main())
+
+
+def test_slow_subscriber_is_evicted():
+    async def main():
+        hub = NewsHub(buffer_size=2)
+        slow, fast = hub.subscribe(), hub.subscribe()
+        for post_id in range(3):
+            hub.publish("add", {"id": post_id})
+            await fast.next(0.1)
+
+        assert slow.evicted and not fast.evicted
+        assert hub.stats()["subscribers"] == 1 and hub.evicted == 1
+        # the buffered events are still delivered before the client resyncs
+        assert len(slow.buffer) == 2
+    asyncio.run(main())
+
+
+def test_close_disconnects_everyone():
+    async def main():
+        hub = NewsHub()
+        subscriber = hub.subscribe()
+        hub.close()
+        assert subscriber.evicted and not hub.subscribers
+        assert await subscriber.next(0.01) is None
+    asyncio.run(main())
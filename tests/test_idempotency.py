@@ -0,0 +1,90 @@
+import asyncio
+
+import pytest
+from fastapi import HTTPException, Response
+from pydantic import BaseModel
+
+from storage.sqlite import SQLiteStorage
+from utils.idempotency import REPLAYED_HEADER, IdempotencyStore
+
+
+class Payload(BaseModel):
+    Name: str
+
+
+def make_store(tmp_path):
+    storage = SQLiteStorage(str(tmp_path / "data.db"))
+    storage.register_tables(["CREATE TABLE IF NOT EXISTS items (name TEXT UNIQUE NOT NULL)"])
+    return storage, IdempotencyStore(storage, "test", "secret")
+
+
+def test_concurrent_retries_are_replayed(tmp_path):
+    async def main():
+        storage, store = make_store(tmp_path)
+        calls = 0
+
+        async def create(payload, idempotent):
+            nonlocal calls
+            calls += 1
+            await asyncio.sleep(0.05)
+            async with storage.transaction() as tx:
+                await tx.execute("INSERT INTO items (name) VALUES (?)", (payload.Name,))
+                result = {"Name": payload.Name}
+                await idempotent.save(tx, result)
+            return result
+
+        try:
+            responses = [Response() for _ in range(3)]
+            results = await asyncio.gather(*(store.run("add", "key", Payload(Name="a"), response, create, Payload(Name="a"))
+                                             for response in responses))
+            assert calls == 1 and results == [{"Name": "a"}] * 3
+            assert [response.headers.get(REPLAYED_HEADER) for response in responses] == [None, "true", "true"]
+            assert store.replays == 2 and store.saved == 1
+        finally:
+            await storage.close()
+    asyncio.run(main())
+
+
+def test_result_is_saved_with_the_writes(tmp_path):
+    async def main():
+        storage, store = make_store(tmp_path)
+
+        async def create(payload, idempotent):
+            async with storage.transaction() as tx:
+                await tx.execute("INSERT INTO items (name) VALUES (?)", (payload.Name,))
+                await idempotent.save(tx, {"Name": payload.Name})
+                raise RuntimeError("crash before the commit")
+
+        try:
+            with pytest.raises(RuntimeError):
+                await store.run("add", "key", Payload(Name="a"), Response(), create, Payload(Name="a"))
+            assert await storage.fetchone("SELECT COUNT(*) AS total FROM idempotency_keys") == {"total": 0}
+            assert await storage.fetchone("SELECT COUNT(*) AS total FROM items") == {"total": 0}
+        finally:
+            await storage.close()
+    asyncio.run(main())
+
+
+def test_concurrent_call_with_another_body_is_rejected(tmp_path):
+    async def main():
+        storage, store = make_store(tmp_path)
+        calls = []
+
+        async def create(payload, idempotent):
+            calls.append(payload.Name)
+            await asyncio.sleep(0.05)
+            async with storage.transaction() as tx:
+                await tx.execute("INSERT INTO items (name) VALUES (?)", (payload.Name,))
+                result = {"Name": payload.Name}
+                await idempotent.save(tx, result)
+            return result
+
+        try:
+            results = await asyncio.gather(*(store.run("add", "key", Payload(Name=name), Response(), create, Payload(Name=name))
+                                             for name in ("a", "b")), return_exceptions=True)
+            assert calls == ["a"] and results[0] == {"Name": "a"}
+            assert isinstance(results[1], HTTPException) and results[1].status_code == 422
+            assert await storage.fetchone("SELECT COUNT(*) AS total FROM items") == {"total": 1}
+        finally:
+            await storage.close()
+    asyncio.run(main())
@@ -0,0 +1,62 @@
+import os
+import gzip
+import time
+import logging
+
+from logger.handlers import DarkyRotatingFileHandler, compressor
+
+
+def record(message: str) -> logging.LogRecord:
+    return logging.LogRecord("darky.test", logging.INFO, __file__, 0, message, None, None)
+
+
+def archives(path) -> list[str]:
+    return sorted(name for name in os.listdir(path.parent) if name.endswith(".gz"))
+
+
+def test_rotates_by_size_and_gzips_in_background(tmp_path):
+    path = tmp_path / "darky.log"
+    handler = DarkyRotatingFileHandler(str(path), maxBytes=100, interval=0, backupCount=2)
+    try:
+        # two records per segment, the segments of the same second get a counter suffix
+        for i in range(8):
+            handler.emit(record(f"{i} " + "x" * 60))
+        compressor.join()
+    finally:
+        handler.close()
+
+    names = archives(path)
+    # only backupCount newest archives are kept, no raw segments are left
+    assert len(names) == 2
+    assert sorted(os.listdir(tmp_path)) == sorted(names + ["darky.log"])
+    with gzip.open(tmp_path / names[-1], "rt", encoding="utf-8") as archive:
+        assert archive.read().startswith("4 ")
+    assert path.read_text(encoding="utf-8").startswith("6 ")
+
+
+def test_rotates_by_time(tmp_path):
+    path = tmp_path / "darky.log"
+    handler = DarkyRotatingFileHandler(str(path), maxBytes=0, interval=0.05, backupCount=0)
+    try:
+        handler.emit(record("old"))
+        time.sleep(0.1)
+        handler.emit(record("new"))
+        compressor.join()
+    finally:
+        handler.close()
+
+    [name] = archives(path)
+    with gzip.open(tmp_path / name, "rt", encoding="utf-8") as archive:
+        assert archive.read() == "old\n"
+    assert path.read_text(encoding="utf-8") == "new\n"
+
+
+def test_leftover_segments_are_compressed(tmp_path):
+    path = tmp_path / "darky.log"
+    (tmp_path / "darky.log.20240131-120000").write_text("crashed\n", encoding="utf-8")
+    handler = DarkyRotatingFileHandler(str(path), maxBytes=0, interval=0)
+    try:
+        compressor.join()
+    finally:
+        handler.close()
+    assert archives(path) == ["darky.log.20240131-120000.gz"]
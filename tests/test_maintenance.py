@@ -0,0 +1,57 @@
+import asyncio
+
+from logger.darky_logger import DarkyLogger
+from storage.maintenance import Maintenance
+from storage.sqlite import SQLiteStorage
+
+
+def test_reads_and_probes_leave_database_idle(tmp_path):
+    async def main():
+        storage = SQLiteStorage(str(tmp_path / "data.db"))
+        storage.register_tables(["CREATE TABLE IF NOT EXISTS items (id INTEGER PRIMARY KEY, name TEXT)"])
+        try:
+            await storage.execute("INSERT INTO items (name) VALUES (?)", ("a",))
+            written = storage.last_activity
+            assert written > 0
+
+            # the /health/ready writer probe and plain reads
+            await storage.fetchone("SELECT 1 AS ok")
+            await storage.fetchall("SELECT name FROM items")
+            assert storage.last_activity == written
+
+            await storage.execute("UPDATE items SET name = ? WHERE id = ?", ("b", 1))
+            assert storage.last_activity > written
+        finally:
+            await storage.close()
+    asyncio.run(main())
+
+
+def test_maintenance_releases_free_pages_within_budget(tmp_path):
+    async def main():
+        storage = SQLiteStorage(str(tmp_path / "data.db"))
+        storage.register_tables(["CREATE TABLE IF NOT EXISTS items (name TEXT)"])
+        try:
+            await storage.executemany("INSERT INTO items VALUES (?)", [("x" * 1000,) for _ in range(5000)])
+            await storage.execute("DELETE FROM items")
+            maintenance = Maintenance(storage, DarkyLogger("darky.maintenance", silent=True), budget=5, vacuum_pages=100)
+            result = await maintenance.run_once()
+            assert result["auto_vacuum"] == "incremental"
+            assert result["freed_pages"] > 0 and result["free_pages"] == 0
+            assert result["size_after"] < result["size_before"]
+            assert not result["timed_out"]
+        finally:
+            await storage.close()
+    asyncio.run(main())
+
+
+def test_close_waits_for_running_reads(tmp_path):
+    async def main():
+        storage = SQLiteStorage(str(tmp_path / "data.db"))
+        storage.register_tables(["CREATE TABLE IF NOT EXISTS items (id INTEGER PRIMARY KEY)"])
+        await storage.execute("INSERT INTO items (id) VALUES (?)", (1,))
+        slow = asyncio.create_task(storage.read_fetchone(
+            "WITH RECURSIVE n(i) AS (SELECT 1 UNION ALL SELECT i + 1 FROM n WHERE i < 3000000) SELECT COUNT(*) AS total FROM n"))
+        await asyncio.sleep(0.05)
+        await storage.close()
+        assert slow.done() and (await slow)["total"] == 3000000
+    asyncio.run(main())
@@ -0,0 +1,41 @@
+import asyncio
+
+from logger.darky_logger import DarkyLogger
+from news_service.scheduler import NewsScheduler
+from storage.sqlite import SQLiteStorage
+from utils.timestamps import now_ms
+
+
+def test_moments_missed_while_stopped_are_replayed(tmp_path):
+    async def main():
+        storage = SQLiteStorage(str(tmp_path / "data.db"))
+        logger = DarkyLogger("darky.scheduler", silent=True)
+        calls = []
+
+        async def next_due(now):
+            return None
+
+        async def on_due(since, now):
+            calls.append((since, now))
+
+        try:
+            scheduler = NewsScheduler(storage, "news", next_due, on_due, logger)
+            await scheduler.start()
+            await asyncio.sleep(0.01)
+            await scheduler.stop()
+            stopped = (await storage.fetchone("SELECT watermark FROM scheduler_watermarks WHERE name = ?", ("news",)))["watermark"]
+
+            # the service is down while a post becomes due
+            await asyncio.sleep(0.05)
+            calls.clear()
+
+            restarted = NewsScheduler(storage, "news", next_due, on_due, logger)
+            await restarted.start()
+            await asyncio.sleep(0.05)
+            await restarted.stop()
+            assert calls[0][0] == stopped and calls[0][1] >= stopped + 50
+            row = await storage.fetchone("SELECT watermark FROM scheduler_watermarks WHERE name = ?", ("news",))
+            assert calls[0][1] <= row["watermark"] <= now_ms()
+        finally:
+            await storage.close()
+    asyncio.run(main())
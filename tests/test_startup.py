@@ -0,0 +1,38 @@
+import os
+import sys
+import json
+import subprocess
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# a fresh interpreter, so the imports are counted as they are in production
+SCRIPT = '''
+import sys
+import json
+import importlib.util
+
+sys.path.insert(0, ROOT)
+spec = importlib.util.spec_from_file_location("darky_app", ROOT + "/__main__.py")
+module = importlib.util.module_from_spec(spec)
+spec.loader.exec_module(module)
+
+from fastapi.testclient import TestClient
+
+with TestClient(module.app) as client:
+    assert client.get("/ping").status_code == 200
+    jwt = client.post("/admin/getJwt", json={"Login": "admin", "Password": "admin"}).json()["Jwt"]
+    print(json.dumps(client.get("/stats/startup", headers={"Authorization": f"Bearer {jwt}"}).json()))
+'''
+
+
+def test_time_to_first_request(tmp_path):
+    env = {**os.environ, "JWT_SECRET_KEY": "secret", "ADMIN_LOGIN": "admin", "ADMIN_PASSWORD": "admin",
+           "LOG_LEVEL": "INFO", "BACKUP_INTERVAL": "0", "MAINTENANCE_INTERVAL": "0"}
+    result = subprocess.run([sys.executable, "-c", f"ROOT = {ROOT!r}\n{SCRIPT}"], cwd=tmp_path, env=env,
+                            capture_output=True, text=True, timeout=120)
+    assert result.returncode == 0, result.stderr
+    profile = json.loads(result.stdout.strip().splitlines()[-1])
+
+    assert {"imports", "storage", "services", "routers"} <= set(profile["phases_ms"])
+    assert profile["time_to_first_request_ms"] >= sum(profile["phases_ms"].values()) - 1
+    print(f"\nTime to first request: {profile['time_to_first_request_ms']} ms, phases: {profile['phases_ms']}")
@@ -0,0 +1,133 @@
+'''
+Contract of the storage backends: every query the services send has to
+behave the same on SQLite and PostgreSQL.
+
+The ``backend`` fixture is defined in ``conftest.py``
+'''
+import asyncio
+
+import pytest
+
+from storage.postgres import translate
+
+EPOCH_MS = 1_735_689_600_123
+
+TABLES = ['''
+        CREATE TABLE IF NOT EXISTS items (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            name TEXT UNIQUE NOT NULL,
+            created_at INTEGER NOT NULL,
+            hidden BOOLEAN DEFAULT FALSE
+        )
+    ''']
+
+
+def test_translate_placeholders():
+    assert translate("SELECT * FROM items WHERE id = ? AND name = ?") == "SELECT * FROM items WHERE id = $1 AND name = $2"
+    assert translate("SELECT 1") == "SELECT 1"
+
+
+def test_translate_ddl():
+    ddl = translate(TABLES[0])
+    assert "BIGSERIAL PRIMARY KEY" in ddl
+    assert "created_at BIGINT NOT NULL" in ddl
+    assert "INTEGER" not in ddl
+    assert translate("ALTER TABLE news ADD COLUMN expire_at INTEGER") == "ALTER TABLE news ADD COLUMN expire_at BIGINT"
+
+
+def test_tables_are_created_lazily(backend):
+    async def body(storage):
+        assert await storage.columns("items") == {"id", "name", "created_at", "hidden"}
+        assert storage.pending_tables() == []
+    backend.run(body, TABLES)
+
+
+def test_returning_and_epoch_ms(backend):
+    async def body(storage):
+        async with storage.transaction() as tx:
+            first = await tx.fetchone("INSERT INTO items (name, created_at) VALUES (?, ?) RETURNING id", ("a", EPOCH_MS))
+            second = await tx.fetchone("INSERT INTO items (name, created_at) VALUES (?, ?) RETURNING id", ("b", EPOCH_MS + 1))
+        assert second["id"] == first["id"] + 1
+        row = await storage.fetchone("SELECT name, created_at FROM items WHERE id = ?", (first["id"],))
+        assert row == {"name": "a", "created_at": EPOCH_MS}
+        updated = await storage.fetchall("UPDATE items SET created_at = ? WHERE created_at > ? RETURNING name", (EPOCH_MS + 5, EPOCH_MS))
+        assert updated == [{"name": "b"}]
+    backend.run(body, TABLES)
+
+
+def test_execute_rowcount_and_fetch(backend):
+    async def body(storage):
+        await storage.executemany("INSERT INTO items (name, created_at) VALUES (?, ?)", [(f"item{i}", i) for i in range(5)])
+        assert await storage.execute("UPDATE items SET hidden = ? WHERE created_at < ?", (True, 2)) == 2
+        assert await storage.execute("DELETE FROM items WHERE name = ?", ("missing",)) == 0
+        assert await storage.fetchone("SELECT id FROM items WHERE name = ?", ("missing",)) is None
+        rows = await storage.fetchall("SELECT name FROM items WHERE hidden = ? ORDER BY name", (False,))
+        assert [row["name"] for row in rows] == ["item2", "item3", "item4"]
+        rows = await storage.read_fetchall("SELECT name FROM items WHERE LOWER(name) = LOWER(?)", ("ITEM1",))
+        assert rows == [{"name": "item1"}]
+        assert await storage.read_fetchone("SELECT COUNT(*) AS total FROM items") == {"total": 5}
+    backend.run(body, TABLES)
+
+
+def test_on_conflict_do_nothing(backend):
+    async def body(storage):
+        query = "INSERT INTO items (name, created_at) VALUES (?, ?) ON CONFLICT (name) DO NOTHING"
+        assert await storage.execute(query, ("dup", 1)) == 1
+        assert await storage.execute(query, ("dup", 2)) == 0
+        assert (await storage.fetchone("SELECT created_at FROM items WHERE name = ?", ("dup",)))["created_at"] == 1
+    backend.run(body, TABLES)
+
+
+def test_transaction_rolls_back_on_error(backend):
+    async def body(storage):
+        with pytest.raises(RuntimeError):
+            async with storage.transaction() as tx:
+                await tx.execute("INSERT INTO items (name, created_at) VALUES (?, ?)", ("lost", 1))
+                raise RuntimeError("abort")
+        assert await storage.fetchone("SELECT id FROM items WHERE name = ?", ("lost",)) is None
+
+        with pytest.raises(Exception):
+            async with storage.transaction() as tx:
+                await tx.execute("INSERT INTO items (name, created_at) VALUES (?, ?)", ("twice", 1))
+                await tx.execute("INSERT INTO items (name, created_at) VALUES (?, ?)", ("twice", 2))
+        assert await storage.fetchone("SELECT id FROM items WHERE name = ?", ("twice",)) is None
+    backend.run(body, TABLES)
+
+
+def test_transaction_commits_atomically(backend):
+    async def body(storage):
+        async with storage.transaction() as tx:
+            await tx.execute("INSERT INTO items (name, created_at) VALUES (?, ?)", ("x", 1))
+            assert (await tx.fetchone("SELECT COUNT(*) AS total FROM items"))["total"] == 1
+            await tx.execute("INSERT INTO items (name, created_at) VALUES (?, ?)", ("y", 2))
+        rows = await storage.fetchall("SELECT name FROM items ORDER BY name")
+        assert [row["name"] for row in rows] == ["x", "y"]
+    backend.run(body, TABLES)
+
+
+def test_concurrent_transactions_are_isolated(backend):
+    async def body(storage):
+        await storage.execute("INSERT INTO items (name, created_at) VALUES (?, ?)", ("counter", 0))
+
+        async def increment():
+            async with storage.transaction() as tx:
+                row = await tx.fetchone("UPDATE items SET created_at = created_at + 1 WHERE name = ? RETURNING created_at", ("counter",))
+                await asyncio.sleep(0)
+                return row["created_at"]
+
+        results = await asyncio.gather(*(increment() for _ in range(10)))
+        assert sorted(results) == list(range(1, 11))
+        assert (await storage.fetchone("SELECT created_at FROM items WHERE name = ?", ("counter",)))["created_at"] == 10
+    backend.run(body, TABLES)
+
+
+def test_values_join_lowers_on_both_sides(backend):
+    async def body(storage):
+        await storage.executemany("INSERT INTO items (name, created_at) VALUES (?, ?)", [("Alice", 1), ("bob", 2)])
+        rows = await storage.fetchall(
+            "SELECT requested.column1 AS requested, items.name FROM (VALUES (?), (?), (?)) AS requested "
+            "JOIN items ON LOWER(items.name) = LOWER(requested.column1) ORDER BY items.name",
+            ("ALICE", "Bob", "carol")
+        )
+        assert rows == [{"requested": "ALICE", "name": "Alice"}, {"requested": "Bob", "name": "bob"}]
+    backend.run(body, TABLES)
@@ -0,0 +1,54 @@
+import asyncio
+import signal
+import time
+
+import uvicorn
+
+from news_service.hub import NewsHub
+from security.hashing import Hasher
+from storage.sqlite import SQLiteStorage
+from system_service.system import DrainingServer, System
+
+
+def test_drain_closes_event_streams(tmp_path, monkeypatch):
+    # the service logger writes to data/darky.log
+    monkeypatch.chdir(tmp_path)
+    (tmp_path / "data").mkdir()
+
+    async def main():
+        storage = SQLiteStorage(str(tmp_path / "data.db"))
+        hub = NewsHub()
+        system = System(storage, Hasher(workers=1), writers={}, caches={}, streams={"news": hub})
+        lifespan = system.lifespan(None)
+        await anext(lifespan)
+        try:
+            subscriber = hub.subscribe()
+            waiting = asyncio.create_task(subscriber.next(30))
+            await asyncio.sleep(0)
+
+            system.begin_drain()
+            assert await asyncio.wait_for(waiting, 1) is None
+            assert subscriber.evicted and not hub.subscribers
+            # the clients reconnecting during the delay are turned away too
+            assert hub.subscribe().evicted and not hub.subscribers
+        finally:
+            await anext(lifespan, None)
+            await storage.close()
+    asyncio.run(main())
+
+
+def test_second_signal_skips_the_delay_once(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    (tmp_path / "data").mkdir()
+
+    system = System(SQLiteStorage(str(tmp_path / "data.db")), Hasher(workers=1), writers={}, caches={}, streams={})
+    system.delay = 0.1
+    server = DrainingServer(uvicorn.Config(None), system)
+
+    server.handle_exit(signal.SIGINT, None)
+    assert system.draining and not server.should_exit
+    server.handle_exit(signal.SIGINT, None)
+    assert server.should_exit
+    time.sleep(0.3)
+    # the cancelled delay doesn't count as a third SIGINT
+    assert not server.force_exit
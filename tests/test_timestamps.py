@@ -0,0 +1,36 @@
+from datetime import datetime, timezone
+
+import pytest
+
+from utils.timestamps import format_iso, parse_legacy_iso, parse_offset
+
+MSK = parse_offset("+03:00")
+
+
+def ms(*args, tz=timezone.utc) -> int:
+    return int(datetime(*args, tzinfo=tz).timestamp()) * 1000
+
+
+@pytest.mark.parametrize("text, expected", [
+    # unpadded milliseconds: ".7" is 7 ms, not 700
+    ("2024-01-31T12:00:00.7Z", ms(2024, 1, 31, 12, tz=MSK) + 7),
+    ("2024-01-31T12:00:00.070Z", ms(2024, 1, 31, 12, tz=MSK) + 70),
+    ("2024-01-31T12:00:00.123456Z", ms(2024, 1, 31, 12, tz=MSK) + 123),
+    # "Z" and missing offsets are the local wall clock
+    ("2024-01-31T12:00:00", ms(2024, 1, 31, 12, tz=MSK)),
+    ("2024-01-31T12:00:00+00:00", ms(2024, 1, 31, 12)),
+    ("2024-01-31T12:00:00.5-05:30", ms(2024, 1, 31, 17, 30) + 5),
+    (" 2024-01-31T12:00:00Z ", ms(2024, 1, 31, 12, tz=MSK)),
+])
+def test_parse_legacy_iso(text, expected):
+    assert parse_legacy_iso(text, MSK) == expected
+
+
+@pytest.mark.parametrize("text", ["", "yesterday", "2024-01-31", "2024-01-31 12:00:00", "2024-01-31T12:00:00+3"])
+def test_parse_legacy_iso_rejects(text):
+    with pytest.raises(ValueError):
+        parse_legacy_iso(text, MSK)
+
+
+def test_format_iso_pads_milliseconds():
+    assert format_iso(ms(2024, 1, 31, 9) + 7, MSK) == "2024-01-31T12:00:00.007+03:00"
@@ -1,49 +1,59 @@
 import os
+import string
 from typing import Annotated
 
-import sqlite3
 import dotenv
-from fastapi import APIRouter, HTTPException, status, Depends
-from passlib.context import CryptContext
+from fastapi import APIRouter, HTTPException, status, Depends, Header, Query, Response
 import uuid
 
 from models.models import *
 from logger.darky_logger import DarkyLogger
 from configs.logger import config
-from security.admin import AdminSecurity
+from security.auth import Principal, require_admin, require_scope
+from security.hashing import hasher
+from storage.base import Storage
+from utils.cache import LRUCache
+from utils.idempotency import IdempotencyStore, IdempotentCall
+from utils.responses import FastJSONResponse
+from utils.singleflight import SingleFlight
 
 dotenv.load_dotenv()
 
-# Конфигурация для хеширования паролей
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
-security = AdminSecurity(os.getenv("JWT_SECRET_KEY"))
+ASCII_LOWER = str.maketrans(string.ascii_uppercase, string.ascii_lowercase)
+
+
+def login_key(login: str) -> str:
+    '''
+    Lowers only the ASCII letters like SQLite's LOWER. The logins with the same key
+    are equal for the LOWER of every backend, so it is safe for the cache keys
+    '''
+    return login.translate(ASCII_LOWER)
+
 
 class Users:
 
 
     def __init__(self,
-                 admin):
+                 admin,
+                 storage: Storage,
+                 audit):
         self.logger = DarkyLogger("darky.users", configuration=config.LOGGER)
 
         self.logger.info(f"Initializing Users service...")
 
-        self.logger.debug(f"Initializing database...")
-        conn = self.__db__()
-        cursor = conn.cursor()
-        cursor.execute('''
-                CREATE TABLE IF NOT EXISTS users (
-                    uuid TEXT PRIMARY KEY,
-                    login TEXT UNIQUE NOT NULL,
-                    password TEXT NOT NULL,
-                    is_blocked BOOLEAN DEFAULT FALSE,
-                    block_reason TEXT
-                )
-            ''')
-        conn.commit()
-        conn.close()
-        self.logger.debug(f"Successful")
-
-        self.logger.debug(f"Inititalizing routers...")
+        self.storage = storage
+        self.audit = audit
+        self.init_database()
+        self.flight = SingleFlight("users")
+        self.cache = LRUCache(int(os.getenv("USERS_CACHE_SIZE", 1024)), float(os.getenv("USERS_CACHE_TTL", 30)))
+        self.resolve_limit = int(os.getenv("USERS_RESOLVE_LIMIT", 500))
+        self.status_cache = LRUCache(256, float(os.getenv("USERS_STATUS_CACHE_TTL", 5)))
+        self.idempotency = IdempotencyStore(storage, "users", os.getenv("JWT_SECRET_KEY", ""),
+                                            ttl=float(os.getenv("IDEMPOTENCY_TTL", 86400)),
+                                            cache_size=int(os.getenv("IDEMPOTENCY_CACHE_SIZE", 1024)),
+                                            max_rows=int(os.getenv("IDEMPOTENCY_MAX_ROWS", 100000)))
+
+        self.logger.debug("Inititalizing routers...")
         self.router = APIRouter(
             prefix="/users",
             tags=["Users"],
@@ -68,8 +78,22 @@ class Users:
         self.router.add_api_route("/getAll", self.get_users, methods=["GET"],
                                   name="Get Users",
                                   description="Getting all existing users in database",
-                                  response_model=UserListResponse)
-        self.logger.debug(f"Successful")
+                                  response_model=UserListResponse,
+                                  response_class=FastJSONResponse)
+        self.router.add_api_route("/byUuid", self.get_by_uuid, methods=["GET"],
+                                  name="Get User By Uuid",
+                                  description="Getting user's login and block status by uuid",
+                                  response_model=UserInfoResponse)
+        self.router.add_api_route("/resolve", self.resolve_users, methods=["POST"],
+                                  name="Resolve Users",
+                                  description="Resolving a batch of uuids and logins in one query",
+                                  response_model=UsersResolveResponse)
+        self.router.add_api_route("/status", self.get_statuses, methods=["POST"],
+                                  name="Get Users Status",
+                                  description="Checking existence, uuid and block status of many players at once",
+                                  response_model=UsersStatusResponse,
+                                  response_class=FastJSONResponse)
+        self.logger.debug("Successful")
 
         self.admin = admin
 
@@ -84,13 +108,109 @@ class Users:
 
 
 
-    def __db__(self):
-        conn = sqlite3.connect("data/data.db")
-        conn.row_factory = sqlite3.Row
-        return conn
+    def init_database(self):
+        self.logger.debug("Registering database tables...")
+        self.storage.register_tables(['''
+                CREATE TABLE IF NOT EXISTS users (
+                    uuid TEXT PRIMARY KEY,
+                    login TEXT UNIQUE NOT NULL,
+                    password TEXT NOT NULL,
+                    is_blocked BOOLEAN DEFAULT FALSE,
+                    block_reason TEXT
+                )
+            ''', '''
+                CREATE INDEX IF NOT EXISTS users_login_lower ON users (LOWER(login))
+            '''])
+        self.logger.debug("Successful")
     
 
 
+    async def find_user(self, login: str) -> dict | None:
+        return await self.flight.do(("login", login_key(login)), self.storage.fetchone,
+                                    "SELECT uuid, login, password, is_blocked, block_reason FROM users WHERE LOWER(login) = LOWER(?)", (login,))
+
+
+
+    async def resolve(self, uuids: list[str], logins: list[str]) -> tuple[dict[str, dict], dict[str, dict]]:
+        '''
+        Finds the users by uuids and logins (case-insensitive).
+        The hot users come from the LRU, the rest is selected with indexed queries.
+        Returns the found users keyed by uuid and by the login as it was requested,
+        the logins are matched by the database's LOWER
+        '''
+        by_uuid, by_login = {}, {}
+        missing_uuids, missing_logins = [], []
+
+        for user_uuid in dict.fromkeys(uuids):
+            user = self.cache.get(("uuid", user_uuid))
+            if user:
+                by_uuid[user_uuid] = user
+            else:
+                missing_uuids.append(user_uuid)
+        for login in dict.fromkeys(logins):
+            user = self.cache.get(("login", login_key(login)))
+            if user:
+                by_login[login] = user
+            else:
+                missing_logins.append(login)
+
+        if missing_uuids:
+            self.logger.debug("Selecting %s users by uuid from the database...", len(missing_uuids))
+            rows = await self.storage.fetchall(
+                f"SELECT uuid, login, is_blocked, block_reason FROM users WHERE uuid IN ({', '.join('?' * len(missing_uuids))})",
+                missing_uuids)
+            for row in rows:
+                self.remember(row)
+                by_uuid[row["uuid"]] = row
+        if missing_logins:
+            self.logger.debug("Selecting %s users by login from the database...", len(missing_logins))
+            # every requested login comes back next to its user, so no lowering is done in Python
+            rows = await self.storage.fetchall(
+                f"SELECT requested.column1 AS requested, users.uuid, users.login, users.is_blocked, users.block_reason "
+                f"FROM (VALUES {', '.join(['(?)'] * len(missing_logins))}) AS requested "
+                f"JOIN users ON LOWER(users.login) = LOWER(requested.column1)",
+                missing_logins)
+            for row in rows:
+                requested = row.pop("requested")
+                self.remember(row)
+                by_login[requested] = row
+
+        return by_uuid, by_login
+
+
+
+    def remember(self, user: dict) -> None:
+        self.cache.set(("uuid", user["uuid"]), user)
+        self.cache.set(("login", login_key(user["login"])), user)
+
+    def forget(self, user: dict) -> None:
+        self.cache.pop(("uuid", user["uuid"]))
+        self.cache.pop(("login", login_key(user["login"])))
+        self.status_cache.clear()
+
+
+
+    def check_resolve_limit(self, data: UsersResolveRequest) -> None:
+        if len(data.Uuids) + len(data.Logins) > self.resolve_limit:
+            self.logger.error(f"Too many users to resolve: {len(data.Uuids) + len(data.Logins)}")
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail={"Message": f"За один запрос можно получить не более {self.resolve_limit} пользователей"}
+            )
+
+
+
+    @staticmethod
+    def user_info(user: dict) -> dict:
+        return {
+            "Login": user["login"],
+            "Uuid": user["uuid"],
+            "IsBlocked": bool(user["is_blocked"]),
+            "BlockReason": user["block_reason"]
+        }
+
+
+
     async def auth_user(self, data: UserAuthRequest):
         
         if not data.Login or not data.Password:
@@ -101,13 +221,9 @@ class Users:
             )
         self.logger.info(f"Authorizing user {data.Login}...")
 
-        self.logger.debug(f"Accessing to the database and selecting user...")
-        conn = self.__db__()
-        cursor = conn.cursor()
-        cursor.execute("SELECT uuid, login, password, is_blocked, block_reason FROM users WHERE LOWER(login) = LOWER(?)", (data.Login,))
-        user = cursor.fetchone()
-        conn.close()
-        self.logger.debug(f"Success")
+        self.logger.debug("Accessing to the database and selecting user...")
+        user = await self.find_user(data.Login)
+        self.logger.debug("Success")
 
         if not user:
             self.logger.error(f"User {data.Login} not found")
@@ -123,7 +239,7 @@ class Users:
                 detail={"Message": f"Пользователь заблокирован. Причина: {user['block_reason'] or 'Не указана'}"}
             )
 
-        if not pwd_context.verify(data.Password.strip(), user["password"]):
+        if not await hasher.verify(data.Password.strip(), user["password"]):
             self.logger.error(f"Incorrect login or password")
             raise HTTPException(
                 status_code=status.HTTP_401_UNAUTHORIZED,
@@ -139,7 +255,19 @@ class Users:
     
 
 
-    async def register_user(self, data: UserAuthRequest):
+    async def register_user(self,
+                            data: UserAuthRequest,
+                            response: Response,
+                            idempotency_key: Annotated[str | None, Header()] = None):
+        # the password isn't stored with the idempotent result, it's the one from the request
+        result = await self.idempotency.run("register", idempotency_key, data, response, self.create_user, data)
+        return {
+            "Login": result["Login"],
+            "Password": data.Password,
+            "Message": result["Message"]
+        }
+
+    async def create_user(self, data: UserAuthRequest, idempotent: IdempotentCall | None):
 
         if not data.Login or not data.Password:
             self.logger.error(f"Login and password are required!")
@@ -149,59 +277,46 @@ class Users:
             )
         self.logger.info(f"Registrating user {data.Login}...")
 
-        self.logger.debug(f"Accesssing to the database...")
-        conn = self.__db__()
-        cursor = conn.cursor()
-
-        self.logger.debug(f"Selecting {data.Login}...")
-        cursor.execute("SELECT login FROM users WHERE LOWER(login) = LOWER(?)", (data.Login,))
-        if cursor.fetchone():
-            conn.close()
+        self.logger.debug("Selecting %s...", data.Login)
+        if await self.storage.fetchone("SELECT login FROM users WHERE LOWER(login) = LOWER(?)", (data.Login,)):
             self.logger.error(f"This user is already exists")
             raise HTTPException(
                 status_code=status.HTTP_409_CONFLICT,
                 detail={"Message": "Пользователь с таким логином уже существует"}
             )
 
-        self.logger.debug(f"Generating UUID for {data.Login}...")
+        self.logger.debug("Generating UUID for %s...", data.Login)
         user_uuid = str(uuid.uuid4())
-        self.logger.debug(f"Hashing password for {data.Login}...")
-        hashed_password = pwd_context.hash(data.Password.strip())
+        self.logger.debug("Hashing password for %s...", data.Login)
+        hashed_password = await hasher.hash(data.Password.strip())
 
-        self.logger.debug(f"Inserting new user \"{data.Login}\" to the database...")
+        self.logger.debug("Inserting new user \"%s\" to the database...", data.Login)
+        result = {
+            "Login": data.Login,
+            "Message": "Пользователь успешно зарегистрирован"
+        }
         try:
-            cursor.execute(
-                "INSERT INTO users (uuid, login, password) VALUES (?, ?, ?)",
-                (user_uuid, data.Login, hashed_password)
-            )
-            conn.commit()
+            async with self.storage.transaction() as tx:
+                await tx.execute(
+                    "INSERT INTO users (uuid, login, password) VALUES (?, ?, ?)",
+                    (user_uuid, data.Login, hashed_password)
+                )
+                if idempotent is not None:
+                    await idempotent.save(tx, result)
+            self.status_cache.clear()
         except Exception as e:
-            conn.close()
             self.logger.error(f"Error while registrating", exc_info=True)
             raise HTTPException(
                 status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
                 detail={"Message": "Ошибка при регистрации пользователя"}
             )
-        finally:
-            conn.close()
 
         self.logger.info(f"User {data.Login} is succesfully registrated!")
-        return {
-            "Login": data.Login,
-            "Password": data.Password,
-            "Message": "Пользователь успешно зарегистрирован"
-        }
+        return result
     
 
 
-    async def delete_user(self, data: UserDeleteRequest, authorized: Annotated[str, Depends(security.get_user)]):
-
-        if authorized["type"] != "admin" or not await self.admin.key_is_valid(authorized["data"]["login"], authorized["data"]["secret_key"]):
-            self.logger.error(f"You're not authorized or not an admin")
-            raise HTTPException(
-                status_code=status.HTTP_401_UNAUTHORIZED,
-                detail={"Message": "Вы не авторизованы или не являетесь администратором!"}
-            )
+    async def delete_user(self, data: UserDeleteRequest, principal: Annotated[Principal, Depends(require_admin)]):
 
         if not data.Login:
             self.logger.error(f"Login is required!")
@@ -211,40 +326,34 @@ class Users:
             )
         self.logger.info(f"Deleting user {data.Login}...")
         
-        self.logger.debug(f"Accessing to the database...")
-        conn = self.__db__()
-        cursor = conn.cursor()
-        self.logger.debug(f"Selecting {data.Login} in database...")
-        cursor.execute("SELECT uuid, login FROM users WHERE LOWER(login) = LOWER(?)", (data.Login,))
-        existing_user = cursor.fetchone()
+        self.logger.debug("Selecting %s in database...", data.Login)
+        existing_user = await self.storage.fetchone("SELECT uuid, login FROM users WHERE LOWER(login) = LOWER(?)", (data.Login,))
 
         if not existing_user:
-            conn.close()
             self.logger.error(f"User {data.Login} not found!")
             raise HTTPException(
                 status_code=status.HTTP_404_NOT_FOUND,
                 detail={"Message": "Пользователь не найден"}
             )
         
-        self.logger.debug(f"Deleting {data.Login} from database...")
+        self.logger.debug("Deleting %s from database...", data.Login)
         try:
-            cursor.execute("DELETE FROM users WHERE LOWER(login) = LOWER(?)", (data.Login,))
-            conn.commit()
+            rowcount = await self.storage.execute("DELETE FROM users WHERE LOWER(login) = LOWER(?)", (data.Login,))
+            self.forget(existing_user)
+            self.audit.record(principal, "users.delete", existing_user["login"],
+                              before={"login": existing_user["login"], "uuid": existing_user["uuid"]})
             
-            if cursor.rowcount == 0:
-                conn.close()
+            if rowcount == 0:
                 self.logger.error(f"Error while deleting", exc_info=True)
                 raise HTTPException(
                     status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
                     detail={"Message": "Ошибка при удалении пользователя"}
                 )
                 
-            conn.close()
             self.logger.info(f"User {data.Login} succesfully deleted!")
             return {"Message": "Пользователь успешно удален"}
             
         except Exception as e:
-            conn.close()
             self.logger.error(f"Error while deleting", exc_info=True)
             raise HTTPException(
                 status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
@@ -253,15 +362,8 @@ class Users:
         
 
 
-    async def edit_uuid(self, data: EditUuidRequest, authorized: Annotated[str, Depends(security.get_user)]):
+    async def edit_uuid(self, data: EditUuidRequest, principal: Annotated[Principal, Depends(require_admin)]):
 
-        if authorized["type"] != "admin" or not await self.admin.key_is_valid(authorized["data"]["login"], authorized["data"]["secret_key"]):
-            self.logger.error(f"You're not authorized or not an admin")
-            raise HTTPException(
-                status_code=status.HTTP_401_UNAUTHORIZED,
-                detail={"Message": "Вы не авторизованы или не являетесь администратором!"}
-            )
-        
         if not data.Login:
             self.logger.error(f"Login is required!")
             raise HTTPException(
@@ -271,12 +373,8 @@ class Users:
         
         self.logger.info(f"Editing user uuid manually {data.Login}...")
 
-        self.logger.debug(f"Accessing to the database...")
-        conn = self.__db__()
-        cursor = conn.cursor()
-        self.logger.debug(f"Selecting {data.Login} in database...")
-        cursor.execute("SELECT uuid, login FROM users WHERE LOWER(login) = LOWER(?)", (data.Login,))
-        user = cursor.fetchone()
+        self.logger.debug("Selecting %s in database...", data.Login)
+        user = await self.storage.fetchone("SELECT uuid, login FROM users WHERE LOWER(login) = LOWER(?)", (data.Login,))
 
         if not user:
             self.logger.error(f"User {data.Login} not found")
@@ -292,31 +390,30 @@ class Users:
                 detail={"Message": "Новый UUID обязателен"}
             )
         
-        self.logger.debug(f"Setting new UUID for {data.Login}...")
+        self.logger.debug("Setting new UUID for %s...", data.Login)
         new_uuid = str(data.NewUuid)
 
-        self.logger.debug(f"Updating UUID for user {data.Login} in database...")
+        self.logger.debug("Updating UUID for user %s in database...", data.Login)
         try:
-            cursor.execute(
+            rowcount = await self.storage.execute(
                 "UPDATE users SET uuid = ? WHERE LOWER(login) = LOWER(?)",
                 (new_uuid, data.Login)
             )
-            conn.commit()
-            if cursor.rowcount == 0:
+            self.forget(user)
+            self.audit.record(principal, "users.edit_uuid", user["login"],
+                              before={"uuid": user["uuid"]}, after={"uuid": new_uuid})
+            if rowcount == 0:
                 self.logger.error(f"Failed to update UUID for user {data.Login}")
                 raise HTTPException(
                     status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
                     detail={"Message": "Ошибка при обновлении UUID"}
                 )
         except Exception as e:
-            conn.rollback()
             self.logger.error(f"Error while updating UUID", exc_info=True)
             raise HTTPException(
                 status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
                 detail={"Message": f"Ошибка при обновлении UUID: {str(e)}"}
             )
-        finally:
-            conn.close()
 
         self.logger.info(f"UUID for user {data.Login} successfully updated to {new_uuid}")
         return {
@@ -328,45 +425,111 @@ class Users:
         
 
 
-    async def get_users(self, authorized: Annotated[str, Depends(security.get_user)]):
-
-        if authorized["type"] != "admin" or not await self.admin.key_is_valid(authorized["data"]["login"], authorized["data"]["secret_key"]):
-            self.logger.error(f"You're not authorized or not an admin")
-            raise HTTPException(
-                status_code=status.HTTP_401_UNAUTHORIZED,
-                detail={"Message": "Вы не авторизованы или не являетесь администратором!"}
-            )
-        
-        self.logger.debug(f"Accessing to the database...")
-        conn = self.__db__()
-        cursor = conn.cursor()
+    async def get_users(self, principal: Annotated[Principal, Depends(require_admin)]):
 
-        self.logger.debug(f"Preparing user list...")
+        self.logger.debug("Preparing user list...")
         try:
-            cursor.execute("SELECT login, uuid FROM users ORDER BY login")
-            users = cursor.fetchall()
+            users = await self.storage.read_fetchall("SELECT login, uuid FROM users ORDER BY login")
             
             logins = [f"{user["login"]}: {user["uuid"]}" for user in users]
             
-            conn.close()
-            
             if not logins:
                 self.logger.info(f"User list is empty")
-                return {
+                return FastJSONResponse({
                     "Logins": [],
                     "Message": "Список пользователей пуст"
-                }
+                })
                 
             self.logger.info(f"User list is ready. Total: {len(logins)} users")
-            return {
+            return FastJSONResponse({
                 "Logins": logins,
                 "Message": f"Найдено {len(logins)} пользователей"
-            }
+            })
             
         except Exception as e:
-            conn.close()
             self.logger.error(f"Error with getting user list", exc_info=True)
             raise HTTPException(
                 status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
                 detail={"Message": f"Ошибка при получении списка пользователей: {str(e)}"}
-            )
\ No newline at end of file
+            )
+
+
+    async def get_by_uuid(self, user_uuid: Annotated[str, Query(alias="uuid")], principal: Annotated[Principal, Depends(require_scope("users:read"))]):
+
+        self.logger.debug("Resolving user %s...", user_uuid)
+        by_uuid, _ = await self.resolve([user_uuid], [])
+        user = by_uuid.get(user_uuid)
+
+        if not user:
+            self.logger.error(f"User {user_uuid} not found")
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND,
+                detail={"Message": "Пользователь не найден"}
+            )
+
+        return {
+            "User": self.user_info(user),
+            "Message": "Пользователь найден"
+        }
+
+
+
+    async def resolve_users(self, data: UsersResolveRequest, principal: Annotated[Principal, Depends(require_scope("users:read"))]):
+
+        self.check_resolve_limit(data)
+
+        self.logger.debug("Resolving %s uuids and %s logins...", len(data.Uuids), len(data.Logins))
+        by_uuid, by_login = await self.resolve(data.Uuids, data.Logins)
+
+        users, seen = [], set()
+        for user in [*by_uuid.values(), *by_login.values()]:
+            if user["uuid"] not in seen:
+                seen.add(user["uuid"])
+                users.append(self.user_info(user))
+        missing = [user_uuid for user_uuid in dict.fromkeys(data.Uuids) if user_uuid not in by_uuid]
+        missing += [login for login in dict.fromkeys(data.Logins) if login not in by_login]
+
+        self.logger.info(f"Resolved {len(users)} users, {len(missing)} not found")
+        return {
+            "Users": users,
+            "Missing": missing,
+            "Message": f"Найдено {len(users)} пользователей"
+        }
+
+
+
+    async def get_statuses(self, data: UsersStatusRequest, principal: Annotated[Principal, Depends(require_scope("users:read"))]):
+
+        self.check_resolve_limit(data)
+
+        key = (tuple(data.Uuids), tuple(data.Logins))
+        cached = self.status_cache.get(key)
+        if cached is not None:
+            return FastJSONResponse(cached)
+
+        self.logger.debug("Checking status of %s players...", len(data.Uuids) + len(data.Logins))
+        by_uuid, by_login = await self.resolve(data.Uuids, data.Logins)
+
+        statuses = [self.user_status(user_uuid, by_uuid.get(user_uuid)) for user_uuid in data.Uuids]
+        statuses += [self.user_status(login, by_login.get(login)) for login in data.Logins]
+
+        content = {
+            "Statuses": statuses,
+            "Message": f"Найдено {sum(user['Exists'] for user in statuses)} из {len(statuses)} игроков"
+        }
+        self.status_cache.set(key, content)
+        return FastJSONResponse(content)
+
+
+
+    @staticmethod
+    def user_status(query: str, user: dict | None) -> dict:
+        if not user:
+            return {"Query": query, "Exists": False, "Uuid": None, "IsBlocked": False, "BlockReason": None}
+        return {
+            "Query": query,
+            "Exists": True,
+            "Uuid": user["uuid"],
+            "IsBlocked": bool(user["is_blocked"]),
+            "BlockReason": user["block_reason"]
+        }
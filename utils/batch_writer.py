@@ -0,0 +1,102 @@
+import asyncio
+from typing import Any, Sequence
+
+from logger.darky_logger import DarkyLogger
+from storage.base import Storage
+
+
+class BatchWriter:
+
+    '''
+    Buffered writer inserting the queued rows in batched transactions.
+
+    ``add`` only appends to the in-memory buffer, the background task writes
+    the buffer with one ``executemany`` when ``batch_size`` rows are queued or
+    ``interval`` seconds passed. ``stop`` writes what is left. When the database
+    is unavailable the rows are kept, the oldest ones are dropped only above
+    ``max_pending``
+    '''
+
+    def __init__(self,
+                 storage: Storage,
+                 query: str,
+                 logger: DarkyLogger,
+                 batch_size: int = 100,
+                 interval: float = 1.0,
+                 max_pending: int = 10000):
+        self.storage = storage
+        self.query = query
+        self.logger = logger
+        self.batch_size = batch_size
+        self.interval = interval
+        self.max_pending = max_pending
+
+        self.written = 0
+        self.batches = 0
+        self.dropped = 0
+        self.__pending__: list[Sequence[Any]] = []
+        self.__wakeup__ = asyncio.Event()
+        self.__lock__ = asyncio.Lock()
+        self.__task__: asyncio.Task | None = None
+
+    @property
+    def pending(self) -> int:
+        return len(self.__pending__)
+
+    def add(self, row: Sequence[Any]) -> None:
+        self.__pending__.append(row)
+        if len(self.__pending__) > self.max_pending:
+            overflow = len(self.__pending__) - self.max_pending
+            del self.__pending__[:overflow]
+            self.dropped += overflow
+        if len(self.__pending__) >= self.batch_size:
+            self.__wakeup__.set()
+
+    def start(self) -> None:
+        if self.__task__ is None:
+            self.__task__ = asyncio.create_task(self.run())
+
+    async def stop(self) -> None:
+        if self.__task__ is not None:
+            task, self.__task__ = self.__task__, None
+            task.cancel()
+            try:
+                await task
+            except asyncio.CancelledError:
+                pass
+        await self.flush()
+
+    async def flush(self) -> None:
+        async with self.__lock__:
+            while self.__pending__:
+                batch = self.__pending__[:self.batch_size]
+                del self.__pending__[:len(batch)]
+                try:
+                    await self.storage.executemany(self.query, batch)
+                except BaseException:
+                    self.__pending__[:0] = batch
+                    raise
+                self.written += len(batch)
+                self.batches += 1
+
+    async def run(self) -> None:
+        while True:
+            try:
+                await asyncio.wait_for(self.__wakeup__.wait(), self.interval)
+            except asyncio.TimeoutError:
+                pass
+            self.__wakeup__.clear()
+            try:
+                await self.flush()
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                self.logger.error(f"Error while writing {self.pending} buffered rows", exc_info=True)
+
+    def stats(self) -> dict:
+        return {
+            "pending": self.pending,
+            "written": self.written,
+            "batches": self.batches,
+            "dropped": self.dropped
+        }
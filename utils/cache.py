@@ -0,0 +1,55 @@
+import time
+from collections import OrderedDict
+from typing import Any, Hashable
+
+
+class LRUCache:
+
+    '''
+    Small least-recently-used cache for the hot rows.
+
+    Entries older than ``ttl`` seconds are treated as missing, so the rows
+    changed directly in the database are picked up eventually. Only the found
+    rows should be stored, so a row created later is never hidden behind a
+    cached miss
+    '''
+
+    def __init__(self, maxsize: int = 1024, ttl: float | None = None):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self.__data__: OrderedDict[Hashable, tuple[float, Any]] = OrderedDict()
+
+    def get(self, key: Hashable) -> Any | None:
+        entry = self.__data__.get(key)
+        if entry is None or (self.ttl is not None and time.monotonic() - entry[0] > self.ttl):
+            if entry is not None:
+                del self.__data__[key]
+            self.misses += 1
+            return None
+        self.hits += 1
+        self.__data__.move_to_end(key)
+        return entry[1]
+
+    def set(self, key: Hashable, value: Any) -> None:
+        if self.maxsize <= 0:
+            return
+        self.__data__[key] = (time.monotonic(), value)
+        self.__data__.move_to_end(key)
+        while len(self.__data__) > self.maxsize:
+            self.__data__.popitem(last=False)
+
+    def pop(self, key: Hashable) -> None:
+        self.__data__.pop(key, None)
+
+    def clear(self) -> None:
+        self.__data__.clear()
+
+    def stats(self) -> dict:
+        return {
+            "size": len(self.__data__),
+            "maxsize": self.maxsize,
+            "hits": self.hits,
+            "misses": self.misses
+        }
@@ -0,0 +1,146 @@
+import gzip
+
+from starlette.datastructures import Headers, MutableHeaders
+from starlette.responses import Response
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+
+def supported_encodings() -> tuple[str, ...]:
+    return ("br", "gzip") if brotli is not None else ("gzip",)
+
+
+def choose_encoding(accept_encoding: str | None) -> str | None:
+    '''
+    Picks the best supported encoding from the ``Accept-Encoding`` header.
+    Brotli is preferred over gzip for equal weights
+
+    :returns: ``"br"``, ``"gzip"`` or None for identity
+    '''
+    if not accept_encoding:
+        return None
+
+    weights = {}
+    for item in accept_encoding.split(","):
+        name, _, params = item.strip().partition(";")
+        quality = 1.0
+        params = params.strip()
+        if params.startswith("q="):
+            try:
+                quality = float(params[2:])
+            except ValueError:
+                quality = 0.0
+        weights[name.strip().lower()] = quality
+
+    best, best_quality = None, 0.0
+    for encoding in supported_encodings():
+        quality = weights.get(encoding, weights.get("*", 0.0))
+        if quality > best_quality:
+            best, best_quality = encoding, quality
+    return best
+
+
+def compress(body: bytes, encoding: str, level: int | None = None) -> bytes:
+    '''
+    Compresses the body with the given encoding
+
+    :param level: gzip level (1-9) or brotli quality (0-11).
+    Defaults favour speed, suited for dynamic responses
+    '''
+    if encoding == "br":
+        return brotli.compress(body, quality=4 if level is None else level)
+    if encoding == "gzip":
+        return gzip.compress(body, compresslevel=6 if level is None else level, mtime=0)
+    raise ValueError(f"Unsupported encoding: {encoding}")
+
+
+class CompressedPayload:
+
+    '''
+    Serialized response body with its compressed variants computed once.
+    Used for the cached responses which are served many times between changes
+    '''
+
+    def __init__(self, body: bytes, media_type: str = "application/json", minimum_size: int = 1024):
+        self.body = body
+        self.media_type = media_type
+        self.variants: dict[str, bytes] = {}
+        if len(body) >= minimum_size:
+            for encoding in supported_encodings():
+                self.variants[encoding] = compress(body, encoding, level=11 if encoding == "br" else 9)
+
+    def response(self, accept_encoding: str | None, status_code: int = 200) -> Response:
+        encoding = choose_encoding(accept_encoding) if self.variants else None
+        if encoding is None:
+            response = Response(self.body, status_code=status_code, media_type=self.media_type)
+        else:
+            response = Response(self.variants[encoding], status_code=status_code, media_type=self.media_type)
+            response.headers["Content-Encoding"] = encoding
+        if self.variants:
+            response.headers["Vary"] = "Accept-Encoding"
+        return response
+
+
+class CompressionMiddleware:
+
+    '''
+    ASGI middleware compressing responses with brotli or gzip.
+
+    Only complete bodies of at least ``minimum_size`` bytes are compressed.
+    Streaming responses (SSE etc.) and responses which are already encoded
+    are passed through untouched
+    '''
+
+    def __init__(self, app, minimum_size: int = 1024):
+        self.app = app
+        self.minimum_size = minimum_size
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        encoding = choose_encoding(Headers(scope=scope).get("accept-encoding"))
+        if encoding is None:
+            await self.app(scope, receive, send)
+            return
+
+        start_message = None
+        passthrough = False
+
+        async def send_wrapper(message):
+            nonlocal start_message, passthrough
+
+            if message["type"] == "http.response.start":
+                headers = Headers(raw=message["headers"])
+                if "content-encoding" in headers or headers.get("content-type", "").startswith("text/event-stream"):
+                    passthrough = True
+                    await send(message)
+                else:
+                    start_message = message
+                return
+
+            if passthrough or message["type"] != "http.response.body":
+                await send(message)
+                return
+
+            body = message.get("body", b"")
+            more_body = message.get("more_body", False)
+            if more_body or len(body) < self.minimum_size:
+                passthrough = True
+                await send(start_message)
+                await send(message)
+                return
+
+            compressed = compress(body, encoding)
+            headers = MutableHeaders(scope=start_message)
+            headers["Content-Encoding"] = encoding
+            headers["Content-Length"] = str(len(compressed))
+            headers.add_vary_header("Accept-Encoding")
+            await send(start_message)
+            await send({"type": "http.response.body", "body": compressed})
+
+        await self.app(scope, receive, send_wrapper)
@@ -0,0 +1,199 @@
+import hmac
+import hashlib
+import json
+from typing import Any, Awaitable, Callable
+
+from fastapi import HTTPException, Response, status
+from pydantic import BaseModel
+
+from storage.base import Storage, Transaction
+from utils.cache import LRUCache
+from utils.responses import dumps
+from utils.singleflight import SingleFlight
+from utils.timestamps import now_ms
+
+REPLAYED_HEADER = "Idempotent-Replayed"
+MAX_KEY_LENGTH = 255
+
+
+class IdempotentCall:
+
+    '''
+    Key of the running call, the handler saves its result with ``save``
+    in the transaction of its writes, so they are committed together
+    '''
+
+    __slots__ = ("store", "scope", "key", "fingerprint", "stored")
+
+    def __init__(self, store: "IdempotencyStore", scope: str, key: str, fingerprint: str):
+        self.store = store
+        self.scope = scope
+        self.key = key
+        self.fingerprint = fingerprint
+        self.stored: tuple[str, int, Any] | None = None
+
+    async def save(self, tx: Transaction, body: dict) -> None:
+        stored = (self.fingerprint, status.HTTP_200_OK, body)
+        await self.store.write(tx, self.scope, self.key, stored)
+        self.stored = stored
+
+
+class IdempotencyStore:
+
+    '''
+    Results of the write requests stored by their ``Idempotency-Key`` header.
+
+    A retry with the same key and the same body gets the original response
+    (or the original 4xx error) without running the handler again, the
+    concurrent retries wait for the first one. The results are kept for ``ttl``
+    seconds in the ``idempotency_keys`` table, at most ``max_rows`` of them,
+    with the hot ones in an in-memory LRU. Server errors are not stored, so
+    they can be retried. The request bodies are compared by their HMAC with
+    ``secret``, so the stored fingerprints don't reveal the passwords.
+
+    ``func`` gets the ``idempotent`` keyword argument, an ``IdempotentCall``
+    or None without the key, and saves its successful result through it
+    '''
+
+    def __init__(self,
+                 storage: Storage,
+                 name: str,
+                 secret: str,
+                 ttl: float = 24 * 60 * 60,
+                 cache_size: int = 1024,
+                 max_rows: int = 100000):
+        self.storage = storage
+        self.name = name
+        self.ttl = ttl
+        self.max_rows = max_rows
+        self.__secret__ = secret.encode("utf-8")
+        self.replays = 0
+        self.saved = 0
+        self.cache = LRUCache(cache_size, ttl)
+        self.flight = SingleFlight(f"{name}.idempotency")
+        self.storage.register_tables(['''
+                CREATE TABLE IF NOT EXISTS idempotency_keys (
+                    scope TEXT NOT NULL,
+                    key TEXT NOT NULL,
+                    fingerprint TEXT NOT NULL,
+                    status INTEGER NOT NULL,
+                    body TEXT NOT NULL,
+                    created_at INTEGER NOT NULL,
+                    PRIMARY KEY (scope, key)
+                )
+            ''',
+            "CREATE INDEX IF NOT EXISTS idempotency_keys_created_at ON idempotency_keys (created_at)"])
+
+    def fingerprint(self, payload: BaseModel) -> str:
+        return hmac.new(self.__secret__, dumps(payload.model_dump(mode="json")), hashlib.sha256).hexdigest()
+
+    async def run(self,
+                  action: str,
+                  key: str | None,
+                  payload: BaseModel,
+                  response: Response,
+                  func: Callable[..., Awaitable[dict]],
+                  *args) -> dict:
+        '''
+        Runs ``func(*args, idempotent=...)`` once per ``key`` of the ``action`` and returns its result.
+        Without the key the call is not tracked
+        '''
+        if key is None:
+            return await func(*args, idempotent=None)
+        if not key or len(key) > MAX_KEY_LENGTH:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail={"Message": f"Idempotency-Key должен содержать от 1 до {MAX_KEY_LENGTH} символов"}
+            )
+
+        scope = f"{self.name}.{action}"
+        fingerprint = self.fingerprint(payload)
+        stored = self.cache.get((scope, key)) or await self.load(scope, key)
+        if stored is None:
+            caller = object()
+            # keyed without the fingerprint, a concurrent call with another body
+            # waits for the first one and is rejected below
+            stored, replayed, leader = await self.flight.do((scope, key), self.execute,
+                                                            caller, scope, key, fingerprint, func, *args)
+            # the concurrent retries get the result of the first call
+            replayed = replayed or leader is not caller
+            if replayed:
+                self.replays += 1
+        else:
+            replayed = True
+            self.replays += 1
+
+        stored_fingerprint, code, body = stored
+        if stored_fingerprint != fingerprint:
+            raise HTTPException(
+                status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+                detail={"Message": "Idempotency-Key уже использован для другого запроса"}
+            )
+        headers = {REPLAYED_HEADER: "true"} if replayed else None
+        if code >= 400:
+            raise HTTPException(status_code=code, detail=body, headers=headers)
+        if replayed:
+            response.headers[REPLAYED_HEADER] = "true"
+        return body
+
+    async def execute(self, caller: object, scope: str, key: str, fingerprint: str, func, *args) -> tuple[tuple[str, int, Any], bool, object]:
+        # the key could be stored by another node or a call which just finished
+        stored = await self.load(scope, key)
+        if stored is not None:
+            return stored, True, caller
+        call = IdempotentCall(self, scope, key, fingerprint)
+        try:
+            body = await func(*args, idempotent=call)
+        except HTTPException as e:
+            if e.status_code >= 500:
+                raise
+            # the rejected request wrote nothing, its answer is saved on its own
+            stored = (fingerprint, e.status_code, e.detail)
+            await self.save(scope, key, stored)
+            return stored, False, caller
+        if call.stored is None:
+            await self.save(scope, key, (fingerprint, status.HTTP_200_OK, body))
+        else:
+            self.cache.set((scope, key), call.stored)
+        return (fingerprint, status.HTTP_200_OK, body), False, caller
+
+    async def load(self, scope: str, key: str) -> tuple[str, int, Any] | None:
+        row = await self.storage.fetchone(
+            "SELECT fingerprint, status, body FROM idempotency_keys WHERE scope = ? AND key = ? AND created_at > ?",
+            (scope, key, now_ms() - int(self.ttl * 1000))
+        )
+        if row is None:
+            return None
+        stored = (row["fingerprint"], row["status"], json.loads(row["body"]))
+        self.cache.set((scope, key), stored)
+        return stored
+
+    async def save(self, scope: str, key: str, stored: tuple[str, int, Any]) -> None:
+        async with self.storage.transaction() as tx:
+            await self.write(tx, scope, key, stored)
+        self.cache.set((scope, key), stored)
+
+    async def write(self, tx: Transaction, scope: str, key: str, stored: tuple[str, int, Any]) -> None:
+        fingerprint, code, body = stored
+        now = now_ms()
+        # an expired row with the same key is replaced
+        await tx.execute("DELETE FROM idempotency_keys WHERE scope = ? AND key = ?", (scope, key))
+        await tx.execute(
+            "INSERT INTO idempotency_keys (scope, key, fingerprint, status, body, created_at) VALUES (?, ?, ?, ?, ?, ?)",
+            (scope, key, fingerprint, code, dumps(body).decode("utf-8"), now)
+        )
+        self.saved += 1
+        if self.saved % 100 == 0:
+            await tx.execute("DELETE FROM idempotency_keys WHERE created_at <= ?", (now - int(self.ttl * 1000),))
+            await tx.execute(
+                "DELETE FROM idempotency_keys WHERE created_at < "
+                "(SELECT created_at FROM idempotency_keys ORDER BY created_at DESC LIMIT 1 OFFSET ?)",
+                (self.max_rows,)
+            )
+
+    def stats(self) -> dict:
+        return {
+            "replays": self.replays,
+            "saved": self.saved,
+            "cache": self.cache.stats()
+        }
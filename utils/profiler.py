@@ -0,0 +1,80 @@
+import time
+from contextlib import contextmanager
+
+from logger.darky_logger import DarkyLogger
+from configs.logger import config
+
+
+class StartupProfiler:
+
+    '''
+    Measures the duration of the startup phases and the time to the first served request.
+    Time is counted from the creation of the profiler (the import of this module)
+    '''
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.phases: dict[str, float] = {}
+        self.time_to_first_request: float | None = None
+        self.__logger__ = None
+
+    @property
+    def logger(self) -> DarkyLogger:
+        if self.__logger__ is None:
+            self.__logger__ = DarkyLogger("darky.startup", configuration=config.LOGGER, silent=True)
+        return self.__logger__
+
+    @contextmanager
+    def phase(self, name: str):
+        '''
+        Measures the phase of the startup
+        '''
+        phase_start = time.perf_counter()
+        try:
+            yield
+        finally:
+            elapsed = (time.perf_counter() - phase_start) * 1000
+            self.phases[name] = self.phases.get(name, 0.0) + elapsed
+            self.logger.debug(f"Startup phase '{name}' took {elapsed:.1f} ms")
+
+    def first_request(self) -> None:
+        '''
+        Marks the first served request and reports the startup profile
+        '''
+        if self.time_to_first_request is not None:
+            return
+        self.time_to_first_request = (time.perf_counter() - self.started) * 1000
+        self.report()
+
+    def profile(self) -> dict:
+        return {
+            "phases_ms": {name: round(elapsed, 1) for name, elapsed in self.phases.items()},
+            "time_to_first_request_ms": round(self.time_to_first_request, 1) if self.time_to_first_request is not None else None
+        }
+
+    def report(self) -> dict:
+        profile = self.profile()
+        phases = ", ".join(f"{name}: {elapsed} ms" for name, elapsed in profile["phases_ms"].items())
+        self.logger.info(f"Startup profile: {phases}")
+        if self.time_to_first_request is not None:
+            self.logger.info(f"Time to first request: {profile['time_to_first_request_ms']} ms")
+        return profile
+
+
+class FirstRequestMiddleware:
+
+    '''
+    ASGI middleware marking the first served HTTP request in the profiler
+    '''
+
+    def __init__(self, app, profiler: StartupProfiler):
+        self.app = app
+        self.profiler = profiler
+
+    async def __call__(self, scope, receive, send):
+        await self.app(scope, receive, send)
+        if scope["type"] == "http" and self.profiler.time_to_first_request is None:
+            self.profiler.first_request()
+
+
+startup = StartupProfiler()
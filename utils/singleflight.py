@@ -0,0 +1,53 @@
+import asyncio
+from typing import Any, Awaitable, Callable, Hashable
+
+
+class SingleFlight:
+
+    '''
+    Collapses concurrent identical reads into one in-flight computation.
+
+    The first caller for a key starts the computation, every caller arriving
+    while it is still running awaits the same result. Cancelling one of the
+    callers doesn't cancel the shared computation
+    '''
+
+    instances: list["SingleFlight"] = []
+
+    def __init__(self, name: str):
+        self.name = name
+        self.calls = 0
+        self.executions = 0
+        self.coalesced = 0
+        self.__flights__: dict[Hashable, asyncio.Task] = {}
+        SingleFlight.instances.append(self)
+
+    async def do(self, key: Hashable, func: Callable[..., Awaitable[Any]], *args) -> Any:
+        self.calls += 1
+        task = self.__flights__.get(key)
+        if task is None:
+            self.executions += 1
+            task = asyncio.ensure_future(func(*args))
+            self.__flights__[key] = task
+            task.add_done_callback(lambda done: self.__forget__(key, done))
+        else:
+            self.coalesced += 1
+        return await asyncio.shield(task)
+
+    def __forget__(self, key: Hashable, task: asyncio.Task) -> None:
+        if self.__flights__.get(key) is task:
+            del self.__flights__[key]
+        if not task.cancelled():
+            task.exception()
+
+    def stats(self) -> dict:
+        return {
+            "calls": self.calls,
+            "executions": self.executions,
+            "coalesced": self.coalesced,
+            "in_flight": len(self.__flights__)
+        }
+
+    @classmethod
+    def all_stats(cls) -> dict:
+        return {flight.name: flight.stats() for flight in cls.instances}
@@ -0,0 +1,64 @@
+import re
+import time
+from datetime import datetime, timedelta, timezone
+
+_LEGACY_ISO = re.compile(r"^(\d{4}-\d\d-\d\dT\d\d:\d\d:\d\d)(?:\.(\d+))?(Z|[+-]\d\d:\d\d)?$")
+
+
+def now_ms() -> int:
+    '''
+    Current UTC time as epoch milliseconds
+    '''
+    return time.time_ns() // 1_000_000
+
+
+def to_epoch_ms(value: datetime) -> int:
+    '''
+    Converts the datetime to UTC epoch milliseconds.
+    Naive datetimes are treated as UTC
+    '''
+    if value.tzinfo is None:
+        value = value.replace(tzinfo=timezone.utc)
+    return int(value.timestamp() * 1000)
+
+
+def parse_offset(offset: str) -> timezone:
+    '''
+    Converts the ``+HH:MM``/``-HH:MM`` offset to a timezone
+    '''
+    sign = -1 if offset.startswith("-") else 1
+    hours, _, minutes = offset.lstrip("+-").partition(":")
+    return timezone(sign * timedelta(hours=int(hours), minutes=int(minutes or 0)))
+
+
+def format_iso(ms: int, tz: timezone = timezone.utc) -> str:
+    '''
+    Formats epoch milliseconds for presentation: ``2024-01-31T12:00:00.007+03:00``
+    '''
+    value = datetime.fromtimestamp(ms // 1000, tz).replace(microsecond=ms % 1000 * 1000)
+    return value.isoformat(timespec="milliseconds")
+
+
+def parse_legacy_iso(text: str, default_tz: timezone = timezone.utc) -> int:
+    '''
+    Parses the dates stored by the old versions to epoch milliseconds.
+
+    Old versions wrote the milliseconds without zero padding (``.7`` is 7 ms)
+    and used ``Z`` for the local wall clock time, so ``Z`` and missing offsets
+    are treated as ``default_tz``
+    '''
+    match = _LEGACY_ISO.match(text.strip())
+    if not match:
+        raise ValueError(f"Invalid date: {text}")
+    base, fraction, offset = match.groups()
+
+    tz = default_tz if offset in (None, "Z") else parse_offset(offset)
+    value = datetime.strptime(base, "%Y-%m-%dT%H:%M:%S").replace(tzinfo=tz)
+
+    if not fraction:
+        millis = 0
+    elif len(fraction) <= 3:
+        millis = int(fraction)
+    else:
+        millis = int(fraction[:3])
+    return int(value.timestamp()) * 1000 + millis